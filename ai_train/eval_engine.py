@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+import librosa
+from tqdm import tqdm
+from feature_cache import load_jsonlines, resolve_audio_path, CachedFeatureDataset
+
+# 批量评测引擎: 音频解码/特征提取在 DataLoader worker 进程中并行执行，特征按 batch 送入 generate，
+# 每条结果写入 JSONL 并立即 flush，CER/WER 按累计编辑距离增量计算，中断后可从 JSONL 续跑。
+SAMPLING_RATE = 16000
+EVAL_BATCH_SIZE = 16
+EVAL_NUM_WORKERS = min(4, os.cpu_count() or 1)
+
+def edit_distance(ref, hyp):
+    """Levenshtein 距离 (替换/删除/插入各计 1)，ref 和 hyp 为字符串或 token 列表"""
+    if len(ref) < len(hyp):
+        ref, hyp = hyp, ref
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1]
+
+def score_pair(ref, hyp):
+    """
+    单条样本的错误数与参考长度。CER 按去掉空白后的字符计算 (thchs30 的标注以空格分词，模型输出不带空格)，
+    WER 按空白切分的词计算。整体 CER/WER = 错误总数 / 参考长度总和，可逐条累加。
+    """
+    ref_chars, hyp_chars = "".join(ref.split()), "".join(hyp.split())
+    ref_words, hyp_words = ref.split(), hyp.split()
+    return {
+        "char_errors": edit_distance(ref_chars, hyp_chars),
+        "chars": len(ref_chars),
+        "word_errors": edit_distance(ref_words, hyp_words),
+        "words": len(ref_words)
+    }
+
+class RunningScore:
+    """累计编辑距离，随时给出当前的 CER/WER"""
+    def __init__(self):
+        self.samples = 0
+        self.char_errors = self.chars = 0
+        self.word_errors = self.words = 0
+
+    def add(self, record):
+        self.samples += 1
+        self.char_errors += record["char_errors"]
+        self.chars += record["chars"]
+        self.word_errors += record["word_errors"]
+        self.words += record["words"]
+
+    @property
+    def cer(self):
+        return self.char_errors / self.chars if self.chars else None
+
+    @property
+    def wer(self):
+        return self.word_errors / self.words if self.words else None
+
+class _PendingFeatures(Dataset):
+    """待评测样本的特征: 有缓存时读取内存映射的特征，否则解码音频并提取特征"""
+    def __init__(self, items, audio_dir, feature_extractor, cache):
+        self.items = items
+        self.audio_dir = audio_dir
+        self.feature_extractor = feature_extractor
+        self.cache = cache
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, position):
+        source_index, sample = self.items[position]
+        if self.cache is not None:
+            return position, self.cache[source_index]["input_features"]
+        audio_path = resolve_audio_path(sample, self.audio_dir)
+        try:
+            speech_array, _ = librosa.load(audio_path, sr=SAMPLING_RATE)
+        except Exception as e:
+            print(f"Error loading audio file {audio_path}: {e}. Skipping.")
+            return position, None
+        features = self.feature_extractor(speech_array, sampling_rate=SAMPLING_RATE, return_tensors="np").input_features[0]
+        return position, torch.from_numpy(np.ascontiguousarray(features))
+
+def _keep_item(item):
+    return item
+
+def _read_previous(output_path, run_id):
+    """读取已有结果；首行记录的 run_id 不一致 (模型或数据已变) 时返回 None，重新评测"""
+    if not output_path or not os.path.exists(output_path):
+        return None
+    records = []
+    with open(output_path, 'r', encoding='utf-8') as f:
+        header = f.readline()
+        try:
+            if json.loads(header).get("run_id") != run_id:
+                return None
+        except ValueError:
+            return None
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # 中断时写了一半的最后一行
+                break
+    return records
+
+def evaluate(model, processor, device, json_path=None, audio_dir=None, cache_dir=None, output_path=None,
+             batch_size=EVAL_BATCH_SIZE, num_workers=EVAL_NUM_WORKERS, resume=True, run_id=None,
+             limit=None, language="zh", verbose=False):
+    """
+    在测试集上批量评测，返回 {"samples", "cer", "wer", "seconds", "samples_per_second"}。
+
+    样本来自 cache_dir 中的特征缓存 (见 feature_cache.py)，或 json_path + audio_dir 中的原始音频。
+    output_path 为 JSONL 结果文件: 首行为 {"run_id": ...}，之后每条样本一行 (参考、识别结果和编辑距离)。
+    resume 为 True 且 run_id 与已有文件一致时跳过已评测的样本，并把它们计入总分。
+    """
+    if cache_dir is not None:
+        cache = CachedFeatureDataset(cache_dir)
+        samples = [{"audio": {"path": entry["audio"]}, "sentence": entry["sentence"]} for entry in cache.samples]
+    else:
+        cache = None
+        samples = load_jsonlines(json_path)
+    if limit:
+        samples = samples[:limit]
+
+    score = RunningScore()
+    done = set()
+    previous = _read_previous(output_path, run_id) if resume else None
+    if previous:
+        for record in previous:
+            done.add(record["audio"])
+            score.add(record)
+        print(f"Resuming evaluation: {len(done)}/{len(samples)} samples already done")
+    pending = [(i, sample) for i, sample in enumerate(samples) if sample['audio']['path'] not in done]
+
+    writer = None
+    if output_path:
+        if previous:
+            # 按已读入的完整记录重写文件，去掉可能写了一半的最后一行
+            writer = open(output_path, 'w', encoding='utf-8')
+            writer.write(json.dumps({"run_id": run_id}, ensure_ascii=False) + "\n")
+            for record in previous:
+                writer.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            writer = open(output_path, 'w', encoding='utf-8')
+            writer.write(json.dumps({"run_id": run_id}, ensure_ascii=False) + "\n")
+        writer.flush()
+
+    loader_kwargs = {"batch_size": None, "collate_fn": _keep_item, "num_workers": num_workers}
+    if num_workers > 0:
+        loader_kwargs["prefetch_factor"] = max(2, batch_size // num_workers + 1)
+    loader = DataLoader(_PendingFeatures(pending, audio_dir, processor.feature_extractor, cache), **loader_kwargs)
+
+    was_training = model.training
+    model.eval()
+    model_dtype = next(model.parameters()).dtype
+    forced_decoder_ids = processor.get_decoder_prompt_ids(language=language, task="transcribe")
+    start = time.perf_counter()
+    evaluated = 0
+
+    def _flush_batch(positions, features):
+        nonlocal evaluated
+        batch = torch.stack(features).to(device, dtype=model_dtype)
+        batch_start = time.perf_counter()
+        with torch.inference_mode():
+            predicted_ids = model.generate(batch, forced_decoder_ids=forced_decoder_ids)
+        batch_time = time.perf_counter() - batch_start
+        hyps = processor.tokenizer.batch_decode(predicted_ids, skip_special_tokens=True)
+        for position, hyp in zip(positions, hyps):
+            sample = pending[position][1]
+            record = {"audio": sample['audio']['path'], "ref": sample['sentence'], "hyp": hyp.strip()}
+            record.update(score_pair(record["ref"], record["hyp"]))
+            record["generate_seconds"] = round(batch_time / len(positions), 4)
+            score.add(record)
+            if writer is not None:
+                writer.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if verbose:
+                print(f"REF: {record['ref']}")
+                print(f"HYP: {record['hyp']}")
+                print('-' * 30)
+        if writer is not None:
+            writer.flush()
+        evaluated += len(positions)
+
+    try:
+        positions, features = [], []
+        progress_bar = tqdm(loader, total=len(pending), desc="Evaluating")
+        for position, input_features in progress_bar:
+            if input_features is None:
+                continue
+            positions.append(position)
+            features.append(input_features)
+            if len(positions) == batch_size:
+                _flush_batch(positions, features)
+                positions, features = [], []
+                progress_bar.set_postfix({"CER": f"{score.cer or 0:.4f}", "WER": f"{score.wer or 0:.4f}"})
+        if positions:
+            _flush_batch(positions, features)
+    finally:
+        if writer is not None:
+            writer.close()
+        model.train(was_training)
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "samples": score.samples,
+        "cer": score.cer,
+        "wer": score.wer,
+        "seconds": elapsed,
+        "samples_per_second": evaluated / elapsed if elapsed > 0 else None
+    }
+    cer = f"{score.cer:.4f}" if score.cer is not None else "-"
+    wer = f"{score.wer:.4f}" if score.wer is not None else "-"
+    print(f"Test CER: {cer}")
+    print(f"Test WER: {wer}")
+    print(f"Evaluated {evaluated} samples in {elapsed:.1f}s ({summary['samples_per_second'] or 0:.1f} samples/s)"
+          + (f", results in {output_path}" if output_path else ""))
+    return summary
@@ -1,10 +1,14 @@
 import os
+import io
 import json
+import time
+import argparse
 import torch
 from transformers import WhisperProcessor, WhisperForConditionalGeneration, WhisperConfig
 import librosa
 from tqdm import tqdm
 import jiwer
+from eval_engine import evaluate, EVAL_BATCH_SIZE, EVAL_NUM_WORKERS
 
 # 配置
 CONFIG_DIR = "whisper_small_finetuned_config"
@@ -13,6 +17,8 @@ TEST_JSON = "dataset/test.json"
 AUDIO_DIR = "dataset/audio"
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 SAMPLING_RATE = 16000
+PRECISION_REPORT_JSON = "precision_report.json"
+EVAL_RESULTS_JSONL = "eval_results.jsonl"
 
 def load_jsonlines(file_path):
     data = []
@@ -22,42 +28,163 @@ def load_jsonlines(file_path):
                 data.append(json.loads(line))
     return data
 
-def main():
-    processor = WhisperProcessor.from_pretrained(CONFIG_DIR)
+def load_model(precision="fp32"):
+    """按精度加载微调模型: fp32 / int8 (Linear 层动态量化，仅 CPU) / bf16"""
     config = WhisperConfig.from_pretrained(CONFIG_DIR)
     model = WhisperForConditionalGeneration(config)
-    model.load_state_dict(torch.load(MODEL_WEIGHTS, map_location=DEVICE))
-    model.to(DEVICE)
+    device = DEVICE
+    if precision == "int8":
+        device = torch.device("cpu")
+    model.load_state_dict(torch.load(MODEL_WEIGHTS, map_location=device))
     model.eval()
+    if precision == "int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif precision == "bf16":
+        model = model.to(torch.bfloat16)
+    model.to(device)
+    return model, device
 
-    samples = load_jsonlines(TEST_JSON)
-    refs, hyps = [], []
+def model_size_mb(model):
+    """序列化后的 state_dict 大小，量化后的权重也能正确统计"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1024 / 1024
+
+def current_rss_mb():
+    """当前进程的常驻内存 (仅 Linux 可用，其他平台返回 None)"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def resolve_audio_path(sample):
+    audio_path = sample['audio']['path']
+    if not os.path.isabs(audio_path):
+        audio_path = os.path.join(AUDIO_DIR, os.path.basename(audio_path))
+    return audio_path
 
+def transcribe_samples(model, processor, samples, device, verbose=True):
+    """逐条转录，返回 (参考文本, 识别文本, 每条 generate 耗时)"""
+    refs, hyps, latencies = [], [], []
+    model_dtype = next(model.parameters()).dtype
+    forced_decoder_ids = processor.get_decoder_prompt_ids(language="zh", task="transcribe")
     for sample in tqdm(samples, desc="Evaluating"):
-        audio_path = sample['audio']['path']
-        if not os.path.isabs(audio_path):
-            audio_path = os.path.join(AUDIO_DIR, os.path.basename(audio_path))
+        audio_path = resolve_audio_path(sample)
         if not os.path.exists(audio_path):
             print(f"Audio file not found: {audio_path}")
             continue
         speech_array, sr = librosa.load(audio_path, sr=SAMPLING_RATE)
-        input_features = processor.feature_extractor(speech_array, sampling_rate=SAMPLING_RATE, return_tensors="pt").input_features.to(DEVICE)
-        with torch.no_grad():
-            predicted_ids = model.generate(
-                input_features,
-                forced_decoder_ids=processor.get_decoder_prompt_ids(language="zh", task="transcribe")
-            )
+        input_features = processor.feature_extractor(speech_array, sampling_rate=SAMPLING_RATE, return_tensors="pt").input_features.to(device, dtype=model_dtype)
+        with torch.inference_mode():
+            start = time.perf_counter()
+            predicted_ids = model.generate(input_features, forced_decoder_ids=forced_decoder_ids)
+            latencies.append(time.perf_counter() - start)
             transcription = processor.tokenizer.batch_decode(predicted_ids, skip_special_tokens=True)[0]
         refs.append(sample['sentence'])
         hyps.append(transcription)
-        print(f"REF: {sample['sentence']}")
-        print(f"HYP: {transcription}")
-        print('-' * 30)
+        if verbose:
+            print(f"REF: {sample['sentence']}")
+            print(f"HYP: {transcription}")
+            print('-' * 30)
+    return refs, hyps, latencies
+
+def compare_precisions(precisions, limit=None, report_path=PRECISION_REPORT_JSON):
+    """
+    在同一测试集上对比不同推理精度的 CER、generate 延迟和模型内存占用，
+    结果打印为表格并写入 report_path。fp32 作为基准计算相对变化。
+    """
+    processor = WhisperProcessor.from_pretrained(CONFIG_DIR)
+    samples = load_jsonlines(TEST_JSON)
+    if limit:
+        samples = samples[:limit]
+
+    report = []
+    for precision in precisions:
+        rss_before = current_rss_mb()
+        load_start = time.perf_counter()
+        model, device = load_model(precision)
+        load_time = time.perf_counter() - load_start
+        rss_after = current_rss_mb()
+
+        refs, hyps, latencies = transcribe_samples(model, processor, samples, device, verbose=False)
+        sorted_latencies = sorted(latencies)
+        entry = {
+            "precision": precision,
+            "device": str(device),
+            "samples": len(refs),
+            "cer": jiwer.cer(refs, hyps) if refs else None,
+            "wer": jiwer.wer(refs, hyps) if refs else None,
+            "latency_mean_s": sum(latencies) / len(latencies) if latencies else None,
+            "latency_p50_s": sorted_latencies[len(sorted_latencies) // 2] if latencies else None,
+            "latency_p90_s": sorted_latencies[int(len(sorted_latencies) * 0.9)] if latencies else None,
+            "load_time_s": load_time,
+            "model_size_mb": model_size_mb(model),
+            "rss_delta_mb": (rss_after - rss_before) if rss_before is not None and rss_after is not None else None
+        }
+        report.append(entry)
+        del model
+
+    baseline = next((e for e in report if e["precision"] == "fp32"), None)
+    if baseline is not None:
+        for entry in report:
+            if entry["latency_mean_s"] and baseline["latency_mean_s"]:
+                entry["speedup_vs_fp32"] = baseline["latency_mean_s"] / entry["latency_mean_s"]
+            if entry["cer"] is not None and baseline["cer"] is not None:
+                entry["cer_delta_vs_fp32"] = entry["cer"] - baseline["cer"]
+
+    print(f"{'precision':<10}{'CER':>8}{'mean(s)':>10}{'p90(s)':>10}{'speedup':>10}{'size(MB)':>10}")
+    for entry in report:
+        cer = f"{entry['cer']:.4f}" if entry["cer"] is not None else "-"
+        mean = f"{entry['latency_mean_s']:.3f}" if entry["latency_mean_s"] else "-"
+        p90 = f"{entry['latency_p90_s']:.3f}" if entry["latency_p90_s"] else "-"
+        speedup = f"{entry.get('speedup_vs_fp32', 0):.2f}x" if entry.get("speedup_vs_fp32") else "-"
+        print(f"{entry['precision']:<10}{cer:>8}{mean:>10}{p90:>10}{speedup:>10}{entry['model_size_mb']:>10.1f}")
+
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Precision report saved to {report_path}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="评估微调后的 Whisper 模型")
+    parser.add_argument("--compare-precision", nargs="+", choices=["fp32", "int8", "bf16"],
+                        help="对比不同推理精度的 CER、延迟和内存，例如 --compare-precision fp32 int8")
+    parser.add_argument("--limit", type=int, default=None, help="只评估前 N 条样本")
+    parser.add_argument("--report", default=PRECISION_REPORT_JSON, help="精度对比报告的输出路径")
+    parser.add_argument("--precision", choices=["fp32", "int8", "bf16"], default="fp32", help="评测使用的推理精度")
+    parser.add_argument("--batch-size", type=int, default=EVAL_BATCH_SIZE, help="每次 generate 的样本数")
+    parser.add_argument("--workers", type=int, default=EVAL_NUM_WORKERS, help="并行解码音频的进程数")
+    parser.add_argument("--output", default=EVAL_RESULTS_JSONL, help="逐条结果的 JSONL 输出路径")
+    parser.add_argument("--no-resume", action="store_true", help="忽略已有结果，从头评测")
+    parser.add_argument("--feature-cache", default=None,
+                        help="使用 feature_cache.py 生成的测试集特征缓存目录 (例如 dataset/features/test)，跳过音频解码")
+    parser.add_argument("--verbose", action="store_true", help="逐条打印参考文本和识别结果")
+    args = parser.parse_args()
+
+    if args.compare_precision:
+        compare_precisions(args.compare_precision, limit=args.limit, report_path=args.report)
+        return
+
+    processor = WhisperProcessor.from_pretrained(CONFIG_DIR)
+    model, device = load_model(args.precision)
 
-    cer = jiwer.cer(refs, hyps)
-    wer = jiwer.wer(refs, hyps)
-    print(f"Test CER: {cer:.4f}")
-    print(f"Test WER: {wer:.4f}")
+    # 模型权重、精度或测试集变化后，已有的结果文件不再续用
+    source = args.feature_cache or TEST_JSON
+    run_id = json.dumps({
+        "weights": os.path.abspath(MODEL_WEIGHTS),
+        "weights_mtime": os.path.getmtime(MODEL_WEIGHTS),
+        "precision": args.precision,
+        "source": os.path.abspath(source),
+        "source_mtime": os.path.getmtime(source)
+    }, sort_keys=True)
+    evaluate(
+        model, processor, device,
+        json_path=TEST_JSON, audio_dir=AUDIO_DIR, cache_dir=args.feature_cache,
+        output_path=args.output, batch_size=args.batch_size, num_workers=args.workers,
+        resume=not args.no_resume, run_id=run_id, limit=args.limit, verbose=args.verbose
+    )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,257 @@
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+import librosa
+from tqdm import tqdm
+
+# 预计算特征缓存:
+# 每条样本的 log-mel 特征 (80x3000) 写入分片 features_XXXXX.npy，标签 token 拼接后写入 labels_XXXXX.npy，
+# index.json 记录每条样本所在的分片、行号和标签偏移。训练/评测时以内存映射方式读取，不再解码音频。
+FEATURE_CACHE_DIR = "dataset/features"
+SHARD_SIZE = 1024
+SAMPLING_RATE = 16000
+CACHE_FORMAT_VERSION = 1
+INDEX_FILE = "index.json"
+
+def load_jsonlines(file_path):
+    data = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                data.append(json.loads(line))
+    return data
+
+def resolve_audio_path(sample, audio_dir):
+    audio_path = sample['audio']['path']
+    if not os.path.isabs(audio_path):
+        audio_path = os.path.join(audio_dir, os.path.basename(audio_path))
+    return audio_path
+
+def split_cache_dir(json_path, cache_root=FEATURE_CACHE_DIR):
+    """每个标注文件对应一个缓存子目录，例如 dataset/train.json -> dataset/features/train"""
+    return os.path.join(cache_root, os.path.splitext(os.path.basename(json_path))[0])
+
+def _fingerprint(json_path, feature_extractor, tokenizer, dtype):
+    """标注文件内容 + 特征提取参数 + 分词器 + 存储精度，任何一项变化都需要重建缓存"""
+    digest = hashlib.sha256()
+    with open(json_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(json.dumps({
+        "version": CACHE_FORMAT_VERSION,
+        "feature_extractor": feature_extractor.to_dict(),
+        "tokenizer": tokenizer.name_or_path,
+        "prefix_tokens": tokenizer.prefix_tokens,
+        "dtype": np.dtype(dtype).name
+    }, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def load_index(cache_dir):
+    path = os.path.join(cache_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def is_cache_valid(cache_dir, json_path, feature_extractor, tokenizer, dtype=None):
+    """dtype 为 None 时沿用已有缓存的存储精度"""
+    index = load_index(cache_dir)
+    if index is None:
+        return False
+    dtype = dtype or index.get("dtype", "float32")
+    return index.get("fingerprint") == _fingerprint(json_path, feature_extractor, tokenizer, dtype)
+
+class _AudioFeatureDataset(Dataset):
+    """构建缓存时使用: 解码音频并提取特征，由 DataLoader 的多个 worker 并行执行"""
+    def __init__(self, samples, audio_dir, feature_extractor, tokenizer):
+        self.samples = samples
+        self.audio_dir = audio_dir
+        self.feature_extractor = feature_extractor
+        self.tokenizer = tokenizer
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        sample = self.samples[idx]
+        audio_path = resolve_audio_path(sample, self.audio_dir)
+        try:
+            speech_array, _ = librosa.load(audio_path, sr=SAMPLING_RATE)
+        except Exception as e:
+            print(f"Error loading audio file {audio_path}: {e}. Skipping.")
+            return idx, None, None, 0.0
+        features = self.feature_extractor(speech_array, sampling_rate=SAMPLING_RATE, return_tensors="np").input_features[0]
+        labels = np.asarray(self.tokenizer(sample['sentence']).input_ids, dtype=np.int64)
+        return idx, features, labels, len(speech_array) / SAMPLING_RATE
+
+def _keep_numpy(item):
+    # 默认的 collate 会把 numpy 数组转成张量，这里原样返回
+    return item
+
+def build_feature_cache(json_path, audio_dir, feature_extractor, tokenizer, cache_dir=None,
+                        shard_size=SHARD_SIZE, dtype=None, num_workers=None, force=False):
+    """
+    为 json_path 中的样本预计算 log-mel 特征和标签 token，写入 cache_dir。
+    缓存指纹与当前标注文件和特征参数一致时直接返回已有索引；先写入临时目录，完成后再替换，
+    中途失败不会留下不完整的缓存。dtype 为 None 时沿用已有缓存的存储精度，没有缓存时为 float32。
+    """
+    cache_dir = cache_dir or split_cache_dir(json_path)
+    if not force and is_cache_valid(cache_dir, json_path, feature_extractor, tokenizer, dtype):
+        print(f"Feature cache is up to date: {cache_dir}")
+        return load_index(cache_dir)
+
+    if dtype is None:
+        existing = load_index(cache_dir)
+        dtype = existing["dtype"] if existing else np.float32
+    samples = load_jsonlines(json_path)
+    n_mels, n_frames = feature_extractor.feature_size, feature_extractor.nb_max_frames
+    tmp_dir = cache_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    if num_workers is None:
+        num_workers = min(8, os.cpu_count() or 1)
+    loader = DataLoader(
+        _AudioFeatureDataset(samples, audio_dir, feature_extractor, tokenizer),
+        batch_size=None, shuffle=False, num_workers=num_workers, collate_fn=_keep_numpy
+    )
+
+    entries, shards = [], []
+    features_mm, label_chunks, label_offset, row = None, [], 0, 0
+
+    def _close_shard():
+        shard_id = len(shards)
+        features_mm.flush()
+        labels = np.concatenate(label_chunks) if label_chunks else np.zeros(0, dtype=np.int64)
+        np.save(os.path.join(tmp_dir, f"labels_{shard_id:05d}.npy"), labels)
+        shards.append({"features": f"features_{shard_id:05d}.npy", "labels": f"labels_{shard_id:05d}.npy", "rows": row})
+
+    print(f"Precomputing features for {len(samples)} samples from {json_path} -> {cache_dir}")
+    for idx, features, labels, duration in tqdm(loader, total=len(samples), desc="Extracting features"):
+        if features is None:
+            continue
+        if features_mm is None:
+            # 最后一个分片按剩余样本数分配，读取时只使用 index 中记录的行
+            capacity = min(shard_size, len(samples) - idx)
+            features_mm = np.lib.format.open_memmap(
+                os.path.join(tmp_dir, f"features_{len(shards):05d}.npy"), mode="w+",
+                dtype=dtype, shape=(capacity, n_mels, n_frames)
+            )
+        features_mm[row] = features
+        label_chunks.append(labels)
+        entries.append({
+            "shard": len(shards),
+            "row": row,
+            "label_offset": label_offset,
+            "label_length": len(labels),
+            "duration": round(float(duration), 3),
+            "audio": samples[idx]['audio']['path'],
+            "sentence": samples[idx]['sentence']
+        })
+        row += 1
+        label_offset += len(labels)
+        if row == features_mm.shape[0]:
+            _close_shard()
+            del features_mm
+            features_mm, label_chunks, label_offset, row = None, [], 0, 0
+    if features_mm is not None:
+        _close_shard()
+        del features_mm
+
+    index = {
+        "version": CACHE_FORMAT_VERSION,
+        "fingerprint": _fingerprint(json_path, feature_extractor, tokenizer, dtype),
+        "source": os.path.abspath(json_path),
+        "dtype": np.dtype(dtype).name,
+        "n_mels": n_mels,
+        "n_frames": n_frames,
+        "shards": shards,
+        "samples": entries
+    }
+    with open(os.path.join(tmp_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    print(f"Cached {len(entries)}/{len(samples)} samples in {len(shards)} shard(s): {cache_dir}")
+    return index
+
+class CachedFeatureDataset(Dataset):
+    """
+    从预计算缓存读取样本。分片以写时复制 (mmap_mode="c") 的内存映射打开，
+    __getitem__ 返回的张量直接指向映射内存，不解码音频也不复制特征；
+    各 DataLoader worker 共享操作系统的页缓存。
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.index = load_index(cache_dir)
+        if self.index is None:
+            raise FileNotFoundError(f"Feature cache index not found in {cache_dir}")
+        self.samples = self.index["samples"]
+        # 分片在首次访问时才打开，使 fork 出的 DataLoader worker 各自持有自己的映射
+        self._features = {}
+        self._labels = {}
+        print(f"Loaded {len(self.samples)} cached samples from {cache_dir}")
+
+    def __len__(self):
+        return len(self.samples)
+
+    def _shard(self, shard_id):
+        if shard_id not in self._features:
+            shard = self.index["shards"][shard_id]
+            self._features[shard_id] = np.load(os.path.join(self.cache_dir, shard["features"]), mmap_mode="c")
+            self._labels[shard_id] = np.load(os.path.join(self.cache_dir, shard["labels"]), mmap_mode="c")
+        return self._features[shard_id], self._labels[shard_id]
+
+    def __getstate__(self):
+        # spawn 方式启动 worker 时不序列化已打开的映射
+        state = self.__dict__.copy()
+        state["_features"], state["_labels"] = {}, {}
+        return state
+
+    def __getitem__(self, idx):
+        entry = self.samples[idx]
+        features, labels = self._shard(entry["shard"])
+        start = entry["label_offset"]
+        input_features = torch.from_numpy(features[entry["row"]])
+        if input_features.dtype != torch.float32:
+            input_features = input_features.float()
+        return {
+            "input_features": input_features,
+            "labels": torch.from_numpy(labels[start:start + entry["label_length"]])
+        }
+
+    def sentence(self, idx):
+        return self.samples[idx]["sentence"]
+
+def main():
+    from transformers import WhisperFeatureExtractor, WhisperTokenizer
+    parser = argparse.ArgumentParser(description="预计算 Whisper 训练/评测用的 log-mel 特征缓存")
+    parser.add_argument("json_files", nargs="*", default=["dataset/train.json", "dataset/test.json"])
+    parser.add_argument("--audio-dir", default="dataset/audio")
+    parser.add_argument("--cache-root", default=FEATURE_CACHE_DIR)
+    parser.add_argument("--model", default="openai/whisper-small", help="特征提取器和分词器的来源")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--float16", action="store_true", help="以 float16 存储特征，缓存大小减半")
+    parser.add_argument("--workers", type=int, default=None, help="并行提取特征的进程数")
+    parser.add_argument("--force", action="store_true", help="忽略已有缓存，强制重建")
+    args = parser.parse_args()
+
+    feature_extractor = WhisperFeatureExtractor.from_pretrained(args.model)
+    tokenizer = WhisperTokenizer.from_pretrained(args.model, language="Chinese", task="transcribe")
+    for json_path in args.json_files:
+        if not os.path.exists(json_path):
+            print(f"{json_path} not found, skipping.")
+            continue
+        build_feature_cache(
+            json_path, args.audio_dir, feature_extractor, tokenizer,
+            cache_dir=split_cache_dir(json_path, args.cache_root), shard_size=args.shard_size,
+            dtype=np.float16 if args.float16 else None, num_workers=args.workers, force=args.force
+        )
+
+if __name__ == "__main__":
+    main()
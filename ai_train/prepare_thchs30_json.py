@@ -1,7 +1,11 @@
 import os
 import json
-import random
+import wave
 import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 # 源数据目录
 SRC_DIR = "data_thchs30/data"
@@ -9,52 +13,136 @@ SRC_DIR = "data_thchs30/data"
 DST_AUDIO_DIR = "dataset/audio"
 # 目标标注目录
 DST_LABEL_DIR = "dataset"
-os.makedirs(DST_AUDIO_DIR, exist_ok=True)
-os.makedirs(DST_LABEL_DIR, exist_ok=True)
-
-# 收集所有.wav文件
-wav_files = [f for f in os.listdir(SRC_DIR) if f.endswith('.wav')]
-wav_files = sorted(wav_files)  # 保证顺序一致
-random.seed(42)
-random.shuffle(wav_files)
-wav_files = wav_files[:500]  # 修改点：只取500条
-
-samples = []
-for wav in wav_files:
-    wav_path = os.path.join(SRC_DIR, wav)
+# 训练时使用的采样率，音频在准备阶段统一转换为 16kHz 单声道 16 位 PCM
+SAMPLING_RATE = 16000
+TEST_RATIO = 0.1
+SEED = 42
+
+def _is_normalized_wav(path):
+    """已是 16kHz 单声道 16 位 PCM 时返回时长 (秒)，否则返回 None"""
+    try:
+        with wave.open(path, 'rb') as wf:
+            if wf.getframerate() == SAMPLING_RATE and wf.getnchannels() == 1 and wf.getsampwidth() == 2:
+                return wf.getnframes() / SAMPLING_RATE
+    except (wave.Error, EOFError):
+        # 非 PCM 编码 (如浮点 WAV) 交给 librosa 处理
+        pass
+    return None
+
+def _link_or_copy(src, dst):
+    """优先创建硬链接，不在同一文件系统或不支持硬链接时复制"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def _write_pcm16(path, audio):
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLING_RATE)
+        wf.writeframes(pcm.tobytes())
+
+def _is_test(wav, test_ratio, seed):
+    """按文件名的哈希划分训练/测试，与处理顺序和样本数量无关，重新运行或增加样本时划分保持不变"""
+    digest = hashlib.md5(f"{seed}:{wav}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64 < test_ratio
+
+def process_one(wav, src_dir, dst_audio_dir):
+    """
+    处理单条样本，返回 (样本, 状态)；状态为 linked / converted / skipped (目标已是最新)，
+    缺少标注时样本为 None，状态为跳过原因。
+    """
+    wav_path = os.path.join(src_dir, wav)
     trn_path = wav_path + ".trn"
     if not os.path.exists(trn_path):
-        print(f"缺少标注文件，跳过: {trn_path}")
-        continue
+        return None, f"缺少标注文件，跳过: {trn_path}"
     # 读取标注文件的第一行
     with open(trn_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-        if not lines:
-            print(f"标注文件为空，跳过: {trn_path}")
-            continue
-        sentence = lines[0].strip()
-    # 复制音频到目标目录
-    dst_wav_path = os.path.join(DST_AUDIO_DIR, wav)
-    if not os.path.exists(dst_wav_path):
-        shutil.copy(wav_path, dst_wav_path)
-    # 构造样本
-    samples.append({
+        sentence = f.readline().strip()
+    if not sentence:
+        return None, f"标注文件为空，跳过: {trn_path}"
+
+    dst_wav_path = os.path.join(dst_audio_dir, wav)
+    status = "skipped"
+    duration = None
+    if os.path.exists(dst_wav_path) and os.path.getmtime(dst_wav_path) >= os.path.getmtime(wav_path):
+        duration = _is_normalized_wav(dst_wav_path)
+    if duration is None:
+        duration = _is_normalized_wav(wav_path)
+        tmp_path = dst_wav_path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if duration is not None:
+            _link_or_copy(wav_path, tmp_path)
+            status = "linked"
+        else:
+            import librosa
+            try:
+                audio, _ = librosa.load(wav_path, sr=SAMPLING_RATE, mono=True)
+            except Exception as e:
+                return None, f"音频无法读取，跳过: {wav_path} ({e})"
+            _write_pcm16(tmp_path, audio)
+            duration = len(audio) / SAMPLING_RATE
+            status = "converted"
+        os.replace(tmp_path, dst_wav_path)
+
+    sample = {
         "audio": {"path": f"audio/{wav}"},
-        "sentence": sentence
-    })
-
-# 划分训练/测试（90/10）
-random.shuffle(samples)
-n_train = int(len(samples) * 0.9)
-train_samples = samples[:n_train]
-test_samples = samples[n_train:]
-
-with open(os.path.join(DST_LABEL_DIR, "train.json"), "w", encoding="utf-8") as f:
-    for s in train_samples:
-        f.write(json.dumps(s, ensure_ascii=False) + "\n")
-with open(os.path.join(DST_LABEL_DIR, "test.json"), "w", encoding="utf-8") as f:
-    for s in test_samples:
-        f.write(json.dumps(s, ensure_ascii=False) + "\n")
-
-print(f"已生成 {len(train_samples)} 条训练数据，{len(test_samples)} 条测试数据。")
-print("数据已准备好，可直接用于 train_whisper_finetune.py 训练。")
\ No newline at end of file
+        "sentence": sentence,
+        "duration": round(duration, 3)
+    }
+    return sample, status
+
+def _process_star(task):
+    return process_one(*task)
+
+def main():
+    parser = argparse.ArgumentParser(description="把 thchs30 数据集整理为训练用的音频目录和 JSONL 标注")
+    parser.add_argument("--src", default=SRC_DIR, help="包含 .wav 和 .wav.trn 的源数据目录")
+    parser.add_argument("--dst-audio", default=DST_AUDIO_DIR)
+    parser.add_argument("--dst-labels", default=DST_LABEL_DIR)
+    parser.add_argument("--limit", type=int, default=None, help="只取随机打乱后的前 N 条 (默认使用全部数据)")
+    parser.add_argument("--test-ratio", type=float, default=TEST_RATIO)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行处理的进程数")
+    args = parser.parse_args()
+
+    os.makedirs(args.dst_audio, exist_ok=True)
+    os.makedirs(args.dst_labels, exist_ok=True)
+
+    # 收集所有.wav文件
+    wav_files = sorted(entry.name for entry in os.scandir(args.src) if entry.name.endswith('.wav'))  # 保证顺序一致
+    if args.limit:
+        rng = np.random.default_rng(args.seed)
+        wav_files = [wav_files[i] for i in sorted(rng.permutation(len(wav_files))[:args.limit])]
+    print(f"Found {len(wav_files)} wav files in {args.src}, processing with {args.workers} workers")
+
+    # 标注先写入临时文件，全部完成后再替换，中断时不会留下只有一半的标注文件
+    train_path = os.path.join(args.dst_labels, "train.json")
+    test_path = os.path.join(args.dst_labels, "test.json")
+    counts = {"train": 0, "test": 0, "linked": 0, "converted": 0, "skipped": 0, "missing": 0}
+    tasks = [(wav, args.src, args.dst_audio) for wav in wav_files]
+    with open(train_path + ".tmp", "w", encoding="utf-8") as train_f, \
+            open(test_path + ".tmp", "w", encoding="utf-8") as test_f, \
+            ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for wav, (sample, status) in zip(wav_files, executor.map(_process_star, tasks, chunksize=64)):
+            if sample is None:
+                print(status)
+                counts["missing"] += 1
+                continue
+            counts[status] += 1
+            split = "test" if _is_test(wav, args.test_ratio, args.seed) else "train"
+            counts[split] += 1
+            (test_f if split == "test" else train_f).write(json.dumps(sample, ensure_ascii=False) + "\n")
+    os.replace(train_path + ".tmp", train_path)
+    os.replace(test_path + ".tmp", test_path)
+
+    print(f"音频: 硬链接/复制 {counts['linked']} 条，转换为 16kHz 单声道 {counts['converted']} 条，"
+          f"已是最新跳过 {counts['skipped']} 条，缺少标注或无法读取 {counts['missing']} 条。")
+    print(f"已生成 {counts['train']} 条训练数据，{counts['test']} 条测试数据。")
+    print("数据已准备好，可直接用于 train_whisper_finetune.py 训练。")
+
+if __name__ == "__main__":
+    main()
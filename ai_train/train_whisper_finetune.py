@@ -6,32 +6,50 @@ os.environ['TRANSFORMERS_CACHE'] = os.path.abspath('hf_cache/transformers')
 os.environ['HUGGINGFACE_HUB_CACHE'] = os.path.abspath('hf_cache/hub')
 os.environ['HF_DATASETS_CACHE'] = os.path.abspath('hf_cache/datasets')
 import json
+import time
+import random
+import argparse
+import contextlib
+from functools import partial
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Sampler
 from transformers import WhisperProcessor, WhisperForConditionalGeneration, WhisperFeatureExtractor, WhisperTokenizer
 import librosa
 import numpy as np
 from tqdm import tqdm
-import jiwer
+from feature_cache import FEATURE_CACHE_DIR, build_feature_cache, split_cache_dir, CachedFeatureDataset
+from eval_engine import evaluate
 
 # 配置参数
 # MODEL_PATH = "../ai_model/small.pt"  # 不再使用本地pt权重
+BASE_MODEL = "openai/whisper-small"
 FINETUNED_MODEL_SAVE_PATH = "small_finetuned.pt"
 MODEL_CONFIG_SAVE_DIR = "whisper_small_finetuned_config"
 AUDIO_DIR = "dataset/audio"
 TRAIN_JSON = "dataset/train.json"
 TEST_JSON = "dataset/test.json"
+EVAL_OUTPUT_DIR = "eval_results"  # 每次评测的逐条结果 (JSONL)
 LEARNING_RATE = 5e-6
-BATCH_SIZE = 2
+BATCH_SIZE = 8
+GRAD_ACCUM_STEPS = 2            # 每累积 N 个 batch 的梯度更新一次参数，有效 batch 为 BATCH_SIZE * GRAD_ACCUM_STEPS
 NUM_EPOCHS = 2
+NUM_WORKERS = min(4, os.cpu_count() or 1)  # DataLoader 预取进程数，0 表示在主进程中加载
+BUCKET_MULTIPLIER = 50          # 长度分桶: 每 BATCH_SIZE * BUCKET_MULTIPLIER 条样本内按标签长度排序后组 batch
+MIXED_PRECISION = "auto"        # auto / bf16 / fp16 / fp32；auto 在 GPU 上优先 bf16，不支持时用 fp16，CPU 上用 fp32
+LOG_EVERY_STEPS = 20            # 每隔多少次参数更新打印一次吞吐量
+SEED = 42
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 SAMPLING_RATE = 16000
+# 训练前先把 log-mel 特征和标签预计算到 FEATURE_CACHE_DIR (见 feature_cache.py)，
+# 训练和评测从内存映射的缓存读取，不再每个 epoch 重复解码音频；标注文件变化时自动重建
+USE_FEATURE_CACHE = True
 
 print(f"Using device: {DEVICE}")
 print(f"Audio dir: {AUDIO_DIR}")
 print(f"Train json: {TRAIN_JSON}")
 print(f"Test json: {TEST_JSON}")
 print(f"Huggingface cache dir: {os.environ['HF_HOME']}")
+print(f"Feature cache: {FEATURE_CACHE_DIR if USE_FEATURE_CACHE else 'disabled'}")
 
 # 数据集类
 def load_jsonlines(file_path):
@@ -72,98 +90,226 @@ class AudioTranscriptionDataset(Dataset):
             "labels": labels.squeeze(0)
         }
 
-def dynamic_collate_fn(batch):
+def dynamic_collate_fn(batch, decoder_start_token_id=None):
     batch = [item for item in batch if item is not None]
     if not batch:
         return None
     input_features = [item["input_features"] for item in batch]
     labels = [item["labels"] for item in batch]
     padded_input_features = torch.nn.utils.rnn.pad_sequence(input_features, batch_first=True, padding_value=0.0)
-    pad_token_id = 50257
-    padded_labels = torch.nn.utils.rnn.pad_sequence(labels, batch_first=True, padding_value=pad_token_id)
+    # 标签直接用 -100 填充 (不参与 loss)。Whisper 的 pad_token_id 与 <|endoftext|> 相同，
+    # 若先按 pad_token_id 填充再替换为 -100，会把每条标签末尾的 <|endoftext|> 也一起屏蔽
+    padded_labels = torch.nn.utils.rnn.pad_sequence(labels, batch_first=True, padding_value=-100)
+    # 模型会自动在解码器输入前加 decoder_start_token，标签中已有的需要去掉
+    if decoder_start_token_id is not None and (padded_labels[:, 0] == decoder_start_token_id).all():
+        padded_labels = padded_labels[:, 1:]
     return {
         "input_features": padded_input_features,
         "labels": padded_labels
     }
 
-def evaluate_on_testset(model, processor, test_json_path, audio_dir, device):
+def label_lengths(dataset, tokenizer):
+    """每条样本的标签 token 数，用于长度分桶；缓存数据集直接读索引，否则对参考文本分词"""
+    if isinstance(dataset, CachedFeatureDataset):
+        return [entry["label_length"] for entry in dataset.samples]
+    return [len(tokenizer(sample['sentence']).input_ids) for sample in dataset.samples]
+
+class LengthBucketBatchSampler(Sampler):
+    """
+    按标签长度分桶组 batch: 每个 epoch 打乱样本后，按 batch_size * bucket_multiplier 条切块，
+    块内按长度排序再切成 batch，最后打乱 batch 顺序。同一 batch 内的标签长度接近，
+    减少解码器上的填充计算，同时保留足够的随机性。
+    """
+    def __init__(self, lengths, batch_size, bucket_multiplier=BUCKET_MULTIPLIER, seed=SEED):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.bucket_size = batch_size * bucket_multiplier
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = random.Random(self.seed + self.epoch)
+        indices = list(range(len(self.lengths)))
+        rng.shuffle(indices)
+        batches = []
+        for start in range(0, len(indices), self.bucket_size):
+            bucket = sorted(indices[start:start + self.bucket_size], key=lambda i: self.lengths[i])
+            batches.extend(bucket[i:i + self.batch_size] for i in range(0, len(bucket), self.batch_size))
+        rng.shuffle(batches)
+        return iter(batches)
+
+    def __len__(self):
+        # 每个分桶的最后一个 batch 可能不满
+        n = len(self.lengths)
+        full_buckets, remainder = divmod(n, self.bucket_size)
+        per_bucket = (self.bucket_size + self.batch_size - 1) // self.batch_size
+        return full_buckets * per_bucket + (remainder + self.batch_size - 1) // self.batch_size
+
+def resolve_precision(precision, device):
+    """返回 (autocast 的 dtype，None 表示 fp32；是否需要 GradScaler)"""
+    if precision == "auto":
+        if device.type != "cuda":
+            return None, False
+        precision = "bf16" if torch.cuda.is_bf16_supported() else "fp16"
+    if precision == "bf16":
+        return torch.bfloat16, False
+    if precision == "fp16":
+        if device.type != "cuda":
+            print("fp16 autocast requires CUDA, falling back to fp32.")
+            return None, False
+        return torch.float16, True
+    return None, False
+
+def evaluate_on_testset(model, processor, test_json_path, audio_dir, device, cache_dir=None, output_path=None):
+    """在测试集上批量评测 (见 eval_engine.py)，返回包含 CER/WER 的摘要"""
     print(f"Evaluating on test set: {test_json_path}")
-    refs, hyps = [], []
-    samples = load_jsonlines(test_json_path)
-    for sample in tqdm(samples, desc="Evaluating"):
-        audio_path = sample['audio']['path']
-        if not os.path.isabs(audio_path):
-            audio_path = os.path.join(audio_dir, os.path.basename(audio_path))
-        if not os.path.exists(audio_path):
-            print(f"Audio file not found: {audio_path}")
-            continue
-        speech_array, sr = librosa.load(audio_path, sr=SAMPLING_RATE)
-        input_features = processor.feature_extractor(speech_array, sampling_rate=SAMPLING_RATE, return_tensors="pt").input_features.to(device)
-        with torch.no_grad():
-            predicted_ids = model.generate(
-                input_features,
-                forced_decoder_ids=processor.get_decoder_prompt_ids(language="zh", task="transcribe")
-            )
-            transcription = processor.tokenizer.batch_decode(predicted_ids, skip_special_tokens=True)[0]
-        refs.append(sample['sentence'])
-        hyps.append(transcription)
-        print(f"REF: {sample['sentence']}")
-        print(f"HYP: {transcription}")
-        print('-' * 30)
-    cer = jiwer.cer(refs, hyps)
-    wer = jiwer.wer(refs, hyps)
-    print(f"Test CER: {cer:.4f}")
-    print(f"Test WER: {wer:.4f}")
+    return evaluate(
+        model, processor, device, json_path=test_json_path, audio_dir=audio_dir, cache_dir=cache_dir,
+        output_path=output_path, resume=False
+    )
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="微调 Whisper small (或用 --base-model 指定的其他尺寸)")
+    parser.add_argument("--base-model", default=BASE_MODEL,
+                        help="起始检查点，例如 openai/whisper-tiny (作为服务端辅助解码的草稿模型)")
+    parser.add_argument("--epochs", type=int, default=NUM_EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--grad-accum", type=int, default=GRAD_ACCUM_STEPS, help="梯度累积步数")
+    parser.add_argument("--lr", type=float, default=LEARNING_RATE)
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="DataLoader 预取进程数")
+    parser.add_argument("--precision", choices=["auto", "bf16", "fp16", "fp32"], default=MIXED_PRECISION)
+    parser.add_argument("--no-bucketing", action="store_true", help="关闭按标签长度分桶，完全随机组 batch")
+    parser.add_argument("--eval-every-epoch", action="store_true", help="每个 epoch 结束后在测试集上评测")
+    return parser.parse_args()
+
+def output_paths(base_model):
+    """
+    保存的权重文件和配置目录: small 为 small_finetuned.pt / whisper_small_finetuned_config，
+    其他尺寸按同样规则命名，例如 openai/whisper-tiny -> tiny_finetuned.pt / whisper_tiny_finetuned_config
+    """
+    if base_model == BASE_MODEL:
+        return FINETUNED_MODEL_SAVE_PATH, MODEL_CONFIG_SAVE_DIR
+    size = base_model.rsplit("/", 1)[-1].replace("whisper-", "").replace("-", "_")
+    return f"{size}_finetuned.pt", f"whisper_{size}_finetuned_config"
 
 def main():
+    args = parse_args()
+    weights_save_path, config_save_dir = output_paths(args.base_model)
     # 直接用 transformers 官方权重和配置
-    feature_extractor = WhisperFeatureExtractor.from_pretrained("openai/whisper-small")
-    tokenizer = WhisperTokenizer.from_pretrained("openai/whisper-small", language="Chinese", task="transcribe")
-    processor = WhisperProcessor.from_pretrained("openai/whisper-small")
-    pad_token_id = processor.tokenizer.pad_token_id
+    feature_extractor = WhisperFeatureExtractor.from_pretrained(args.base_model)
+    tokenizer = WhisperTokenizer.from_pretrained(args.base_model, language="Chinese", task="transcribe")
+    processor = WhisperProcessor.from_pretrained(args.base_model)
+
+    if USE_FEATURE_CACHE:
+        build_feature_cache(TRAIN_JSON, AUDIO_DIR, feature_extractor, tokenizer)
+        train_dataset = CachedFeatureDataset(split_cache_dir(TRAIN_JSON))
+    else:
+        train_dataset = AudioTranscriptionDataset(TRAIN_JSON, AUDIO_DIR, feature_extractor, tokenizer)
 
-    train_dataset = AudioTranscriptionDataset(TRAIN_JSON, AUDIO_DIR, feature_extractor, tokenizer)
-    dataloader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True, collate_fn=dynamic_collate_fn)
+    has_test_set = os.path.exists(TEST_JSON)
+    test_cache_dir = None
+    if has_test_set and USE_FEATURE_CACHE:
+        build_feature_cache(TEST_JSON, AUDIO_DIR, feature_extractor, tokenizer)
+        test_cache_dir = split_cache_dir(TEST_JSON)
 
-    model = WhisperForConditionalGeneration.from_pretrained("openai/whisper-small")
+    model = WhisperForConditionalGeneration.from_pretrained(args.base_model)
     model.to(DEVICE)
-    optimizer = torch.optim.AdamW(model.parameters(), lr=LEARNING_RATE)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr)
+
+    collate_fn = partial(dynamic_collate_fn, decoder_start_token_id=model.config.decoder_start_token_id)
+    loader_kwargs = {"collate_fn": collate_fn, "num_workers": args.workers, "pin_memory": DEVICE.type == "cuda"}
+    if args.workers > 0:
+        loader_kwargs.update(persistent_workers=True, prefetch_factor=4)
+    batch_sampler = None
+    if args.no_bucketing:
+        dataloader = DataLoader(train_dataset, batch_size=args.batch_size, shuffle=True, **loader_kwargs)
+    else:
+        batch_sampler = LengthBucketBatchSampler(label_lengths(train_dataset, tokenizer), args.batch_size)
+        dataloader = DataLoader(train_dataset, batch_sampler=batch_sampler, **loader_kwargs)
+
+    amp_dtype, use_scaler = resolve_precision(args.precision, DEVICE)
+    scaler = torch.cuda.amp.GradScaler(enabled=use_scaler)
+    autocast = (lambda: torch.autocast(device_type=DEVICE.type, dtype=amp_dtype)) if amp_dtype else contextlib.nullcontext
+    num_batches = len(dataloader)
+    print(f"Batch size {args.batch_size} x {args.grad_accum} accumulation steps "
+          f"(effective {args.batch_size * args.grad_accum}), workers {args.workers}, "
+          f"precision {amp_dtype or torch.float32}, bucketing {'off' if args.no_bucketing else 'on'}")
 
     print("Starting training...")
     model.train()
-    for epoch in range(NUM_EPOCHS):
-        print(f"--- Epoch {epoch+1}/{NUM_EPOCHS} ---")
-        total_loss = 0
+    total_updates = 0
+    train_start = time.perf_counter()
+    for epoch in range(args.epochs):
+        print(f"--- Epoch {epoch+1}/{args.epochs} ---")
+        if batch_sampler is not None:
+            batch_sampler.set_epoch(epoch)
+        epoch_start = time.perf_counter()
+        epoch_loss = torch.zeros((), device=DEVICE)
+        epoch_batches = epoch_samples = 0
+        # 吞吐量统计窗口: 样本数、有效标签 token 数和填充后的标签位置数
+        window_start, window_samples, window_tokens, window_slots = time.perf_counter(), 0, 0, 0
+        optimizer.zero_grad(set_to_none=True)
         progress_bar = tqdm(dataloader, desc=f"Epoch {epoch+1}")
-        for batch in progress_bar:
-            if batch is None:
-                continue
-            input_features = batch["input_features"].to(DEVICE)
-            labels = batch["labels"].to(DEVICE)
-            labels[labels == pad_token_id] = -100
-            optimizer.zero_grad()
-            outputs = model(input_features=input_features, labels=labels)
-            loss = outputs.loss
-            if loss is None:
-                continue
-            loss.backward()
-            optimizer.step()
-            total_loss += loss.item()
-            progress_bar.set_postfix({"loss": f"{loss.item():.4f}"})
-        avg_loss = total_loss / (len(dataloader) or 1)
-        print(f"Epoch {epoch+1} - Avg Loss: {avg_loss:.4f}")
+        pending = False
+        for batch_index, batch in enumerate(progress_bar):
+            # 最后一组可能不足 grad_accum 个 batch，按实际个数取平均
+            group_start = batch_index - batch_index % args.grad_accum
+            group_size = min(args.grad_accum, num_batches - group_start)
+            if batch is not None:
+                window_tokens += int((batch["labels"] != -100).sum())
+                window_slots += batch["labels"].numel()
+                input_features = batch["input_features"].to(DEVICE, non_blocking=True)
+                labels = batch["labels"].to(DEVICE, non_blocking=True)
+                with autocast():
+                    outputs = model(input_features=input_features, labels=labels)
+                loss = outputs.loss
+                if loss is not None:
+                    scaler.scale(loss / group_size).backward()
+                    pending = True
+                    epoch_loss += loss.detach()
+                    epoch_batches += 1
+                    epoch_samples += input_features.size(0)
+                    window_samples += input_features.size(0)
+
+            if pending and batch_index + 1 == group_start + group_size:
+                scaler.step(optimizer)
+                scaler.update()
+                optimizer.zero_grad(set_to_none=True)
+                pending = False
+                total_updates += 1
+                if total_updates % LOG_EVERY_STEPS == 0:
+                    elapsed = time.perf_counter() - window_start
+                    progress_bar.set_postfix({
+                        "loss": f"{loss.item():.4f}",
+                        "samples/s": f"{window_samples / elapsed:.1f}",
+                        "steps/s": f"{LOG_EVERY_STEPS / elapsed:.2f}",
+                        "pad": f"{1 - window_tokens / max(window_slots, 1):.0%}"
+                    })
+                    window_start, window_samples, window_tokens, window_slots = time.perf_counter(), 0, 0, 0
+        epoch_time = time.perf_counter() - epoch_start
+        avg_loss = epoch_loss.item() / (epoch_batches or 1)
+        print(f"Epoch {epoch+1} - Avg Loss: {avg_loss:.4f} - {epoch_samples} samples in {epoch_time:.1f}s "
+              f"({epoch_samples / epoch_time:.1f} samples/s)")
+        if args.eval_every_epoch and has_test_set and epoch + 1 < args.epochs:
+            evaluate_on_testset(model, processor, TEST_JSON, AUDIO_DIR, DEVICE, cache_dir=test_cache_dir,
+                                output_path=os.path.join(EVAL_OUTPUT_DIR, f"epoch{epoch+1}.jsonl"))
+    print(f"Trained {total_updates} steps in {time.perf_counter() - train_start:.1f}s")
 
     print("Training finished. Saving model...")
-    torch.save(model.state_dict(), FINETUNED_MODEL_SAVE_PATH)
-    if not os.path.exists(MODEL_CONFIG_SAVE_DIR):
-        os.makedirs(MODEL_CONFIG_SAVE_DIR)
-    model.config.save_pretrained(MODEL_CONFIG_SAVE_DIR)
-    processor.save_pretrained(MODEL_CONFIG_SAVE_DIR)
-    print(f"Model and processor configs saved to {MODEL_CONFIG_SAVE_DIR}")
+    torch.save(model.state_dict(), weights_save_path)
+    if not os.path.exists(config_save_dir):
+        os.makedirs(config_save_dir)
+    model.config.save_pretrained(config_save_dir)
+    processor.save_pretrained(config_save_dir)
+    print(f"Model saved to {weights_save_path}, model and processor configs saved to {config_save_dir}")
 
     # 自动评测
-    if os.path.exists(TEST_JSON):
-        evaluate_on_testset(model, processor, TEST_JSON, AUDIO_DIR, DEVICE)
+    if has_test_set:
+        evaluate_on_testset(model, processor, TEST_JSON, AUDIO_DIR, DEVICE, cache_dir=test_cache_dir,
+                            output_path=os.path.join(EVAL_OUTPUT_DIR, "final.jsonl"))
     else:
         print(f"Test set {TEST_JSON} not found, skipping evaluation.")
 
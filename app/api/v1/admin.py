@@ -0,0 +1,45 @@
+import hmac
+from fastapi import APIRouter, HTTPException, Request, Depends, Body
+from app.core.config import ADMIN_TOKEN, ADMIN_LOCAL_HOSTS
+from app.core.keyword_engine import keyword_engine, KeywordConfigError
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, Dict, Any
+
+def require_admin(request: Request):
+    """设置了 ADMIN_TOKEN 时校验请求头 X-Admin-Token，否则只允许本机访问"""
+    if ADMIN_TOKEN:
+        token = request.headers.get("X-Admin-Token", "")
+        if not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+            raise HTTPException(status_code=403, detail="管理令牌无效")
+        return
+    client_host: Optional[str] = request.client.host if request.client else None
+    if client_host not in ADMIN_LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="未设置 WHISPER_ADMIN_TOKEN 时管理端点只允许本机访问")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/keywords")
+async def keywords_info():
+    """当前生效的词库: 版本、来源 (文件路径或 builtin)、加载时间、场景和词条数量，以及最近一次加载错误"""
+    return keyword_engine.info()
+
+@router.post("/keywords/reload")
+async def reload_keywords():
+    """立即重新读取词库文件 (不等待自动检查)；文件有错误时返回 400，继续使用当前词库"""
+    try:
+        await run_in_threadpool(keyword_engine.reload)
+    except KeywordConfigError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return keyword_engine.info()
+
+@router.put("/keywords")
+async def replace_keywords(config: Dict[str, Any] = Body(...)):
+    """
+    用请求体中的词库 (结构同 app/core/keywords.py 中的 KEYWORDS_CONFIG) 替换词库文件并立即生效。
+    多进程推理池的子进程在 KEYWORDS_RELOAD_INTERVAL 秒内跟随文件更新。
+    """
+    try:
+        await run_in_threadpool(keyword_engine.update, config)
+    except KeywordConfigError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return keyword_engine.info()
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, UploadFile, HTTPException, Form, Query
+from app.core.config import ALLOWED_AUDIO_TYPES, MAX_AUDIO_SIZE
+from app.core.whisper_handler import whisper_handler
+from app.core.upload import spool_upload, UploadTooLarge
+from app.core.model_registry import UnknownModelError
+from app.core.job_queue import job_manager, STATUS_SUCCEEDED
+from app.core.export import EXPORT_FORMATS, export_response
+from starlette.concurrency import run_in_threadpool
+from pathlib import PurePath
+from typing import Optional
+
+router = APIRouter()
+
+@router.post("/jobs", status_code=202)
+async def create_job(
+    file: UploadFile,
+    scene: Optional[str] = Form(None),
+    model: Optional[str] = Form(None),
+    callback_url: Optional[str] = Form(None)
+):
+    """
+    提交异步转录任务，立即返回任务 ID，适合较长的音频。
+
+    参数:
+        - file: 音频文件 (必需)
+        - scene: 应用场景 (可选，同 POST /transcribe/)
+        - model: 使用的模型 (可选，同 POST /transcribe/)
+        - callback_url: 任务结束后接收任务信息 (POST JSON) 的地址 (可选，仅允许本机地址)
+
+    返回:
+        - job_id 以及查询地址，通过 GET /api/v1/jobs/{job_id} 查询状态、进度和结果。
+    """
+    try:
+        whisper_handler.registry.resolve(model)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if file.content_type not in ALLOWED_AUDIO_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的文件类型: {file.content_type}. 支持的类型: {ALLOWED_AUDIO_TYPES}"
+        )
+
+    try:
+        upload = await spool_upload(file)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=400,
+            detail=f"文件大小超过限制: {MAX_AUDIO_SIZE/1024/1024:.2f}MB"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"读取上传文件出错: {str(e)}")
+    finally:
+        await file.close()
+
+    scene_to_process = scene if scene and scene.lower() != "auto" else None
+    try:
+        job_id = await run_in_threadpool(job_manager.submit, upload, scene_to_process, model, callback_url)
+    except ValueError as e:
+        upload.cleanup()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        upload.cleanup()
+        print(f"API Error while creating job: {e}")
+        raise HTTPException(status_code=500, detail=f"创建任务出错: {str(e)}")
+
+    return {"job_id": job_id, "status": "queued", "status_url": f"/api/v1/jobs/{job_id}"}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """查询任务状态 (queued/running/succeeded/failed)、进度 (已解码的音频秒数) 以及结果或失败原因"""
+    job = await run_in_threadpool(job_manager.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return job
+
+@router.get("/jobs/{job_id}/export")
+async def export_job(
+    job_id: str,
+    format: str = Query("srt"),
+    filename: Optional[str] = Query(None)
+):
+    """
+    导出已完成任务的转录结果 (SRT / VTT / TXT / DOCX)，以分块传输返回，不需要先取回完整的 JSON 结果。
+    filename 默认为上传时的文件名 (不含扩展名)。
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {format}. 支持的格式: {list(EXPORT_FORMATS)}")
+    job = await run_in_threadpool(job_manager.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    if job["status"] != STATUS_SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"任务尚未成功完成 (当前状态: {job['status']})")
+    return export_response(job["result"], format, filename or PurePath(job["filename"] or "").stem or None)
@@ -0,0 +1,116 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+from app.core.config import SAMPLING_RATE
+from app.core.whisper_handler import whisper_handler
+from app.core.inference_pool import inference_executor, InferenceQueueFull, InferenceTimeout
+from app.core.model_registry import UnknownModelError
+from app.core.streaming import StreamingSession, FORMAT_PCM
+from typing import Optional
+import asyncio
+import json
+
+router = APIRouter()
+
+async def _send_all(websocket: WebSocket, messages):
+    for message in messages:
+        await websocket.send_json(message)
+
+async def _decode_step(websocket: WebSocket, session: StreamingSession):
+    """在本进程的推理线程池中解码一次并推送结果 (会话状态无法跨进程传递)；推理队列已满时跳过本次 partial，等待下一次"""
+    try:
+        messages = await inference_executor.run_local(session.step)
+        await _send_all(websocket, messages)
+    except InferenceQueueFull as e:
+        await websocket.send_json({"type": "busy", "retry_after": e.retry_after})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        # 单次解码失败不结束会话，缓冲区保留到下一次解码
+        print(f"WebSocket streaming decode error: {e}")
+        await websocket.send_json({"type": "error", "detail": f"解码出错: {str(e)}"})
+
+@router.websocket("/transcribe/stream")
+async def transcribe_stream(
+    websocket: WebSocket,
+    format: str = FORMAT_PCM,
+    sample_rate: int = SAMPLING_RATE,
+    scene: Optional[str] = None,
+    model: Optional[str] = None,
+    assisted: Optional[bool] = None
+):
+    """
+    实时流式转录 (WebSocket)。
+
+    查询参数:
+        - format: 音频块格式。"pcm_s16le" (默认，16 位小端单声道 PCM)，或 "opus" / "ogg" / "webm" 编码流
+        - sample_rate: PCM 的采样率 (默认 16000，其他采样率会在服务端重采样)
+        - scene: 应用场景 (可选，不提供或为 "auto" 时自动判断)
+        - model: 使用的模型 (可选，同 POST /transcribe/)
+        - assisted: 是否用草稿模型辅助解码 (可选，同 POST /transcribe/)
+
+    协议:
+        - 客户端以二进制帧发送录音过程中的音频块，录音结束时发送文本帧 {"type": "end"}；
+        - 服务端推送 {"type": "partial", ...} (当前未确定部分的转录)、
+          {"type": "final", "segment": {...}, "scene", "keywords", "semantics", ...} (确定分段)，
+          结束时推送 {"type": "done", ...} (完整文本、分段、场景和关键字汇总) 后关闭连接。
+    """
+    await websocket.accept()
+    try:
+        model_name = whisper_handler.registry.resolve(model) if model else None
+        session = StreamingSession(
+            sample_format=format,
+            sample_rate=sample_rate,
+            scene=scene if scene and scene.lower() != "auto" else None,
+            model_name=model_name,
+            assisted=assisted
+        )
+    except (UnknownModelError, ValueError, RuntimeError) as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1003)
+        return
+
+    decode_task: Optional[asyncio.Task] = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                if format == FORMAT_PCM:
+                    session.add_audio(message["bytes"])
+                else:
+                    await run_in_threadpool(session.add_audio, message["bytes"])
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = {}
+                if control.get("type") == "end":
+                    break
+
+            # 同一会话同时只进行一次解码；解码期间到达的音频留到下一次
+            if (decode_task is None or decode_task.done()) and session.should_decode():
+                decode_task = asyncio.create_task(_decode_step(websocket, session))
+
+        if decode_task is not None:
+            await decode_task
+        messages = await inference_executor.run_local(session.flush)
+        await _send_all(websocket, messages)
+        await websocket.send_json(session.summary())
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except (InferenceQueueFull, InferenceTimeout) as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1013)
+    except Exception as e:
+        print(f"WebSocket streaming error: {e}")
+        try:
+            await websocket.send_json({"type": "error", "detail": f"流式转录出错: {str(e)}"})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        if decode_task is not None and not decode_task.done():
+            decode_task.cancel()
+        session.close()
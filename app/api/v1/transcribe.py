@@ -1,103 +1,421 @@
-from fastapi import APIRouter, UploadFile, HTTPException, Form
+import re
+from pathlib import PurePath
+from fastapi import APIRouter, UploadFile, HTTPException, Form, File, Query
 from fastapi.responses import JSONResponse
-from app.core.config import UPLOAD_DIR, ALLOWED_AUDIO_TYPES, MAX_AUDIO_SIZE
+from app.core.config import (
+    ALLOWED_AUDIO_TYPES,
+    MAX_AUDIO_SIZE,
+    BATCH_MAX_FILES,
+    BATCH_MAX_TOTAL_SIZE,
+    DECODING_PRESETS,
+    MODEL_SPECS,
+    ZIP_CONTENT_TYPES
+)
 from app.core.whisper_handler import whisper_handler
-import shutil
-from pathlib import Path
-import os
-import asyncio
-from typing import Optional # 导入 Optional
+from app.core.inference_pool import inference_executor, InferenceQueueFull, InferenceTimeout
+from app.core.upload import spool_upload, extract_zip, SpooledAudio, UploadTooLarge
+from app.core.result_cache import result_cache, make_cache_key
+from app.core.export import EXPORT_FORMATS, export_response
+from app.core.model_registry import UnknownModelError, KIND_FINETUNED, model_type_for, produced_by
+from app.core.decoding import (
+    DecodingOptions,
+    DEFAULT_DECODING_OPTIONS,
+    resolve_decoding_options,
+    generate_supports_temperature_fallback
+)
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, Dict, Any, List, Tuple, Union # 导入 Optional
 
 router = APIRouter()
 
+_CACHE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+def _decoding_options(model_name: str, preset: Optional[str], language: Optional[str], task: Optional[str],
+                      beam_size: Optional[int], temperature: Optional[str],
+                      max_new_tokens: Optional[int]) -> DecodingOptions:
+    try:
+        options = resolve_decoding_options(preset, language, task, beam_size, temperature, max_new_tokens)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 微调模型用 transformers 的 generate 解码，较早的 transformers 版本不支持温度回退
+    if (options.uses_temperature_fallback and MODEL_SPECS[model_name]["kind"] == KIND_FINETUNED
+            and not generate_supports_temperature_fallback()):
+        raise HTTPException(
+            status_code=400,
+            detail=f"当前安装的 transformers 版本不支持模型 '{model_name}' 的温度回退 "
+                   f"(preset 'balanced' / 'accurate' 或多个 temperature)，请使用 preset='fast' 或单个 temperature"
+        )
+    return options
+
+def _transcribe_and_cleanup(upload: SpooledAudio, requested_scene: Optional[str],
+                            model_name: Optional[str] = None,
+                            assisted: Optional[bool] = None,
+                            options: DecodingOptions = DEFAULT_DECODING_OPTIONS) -> Dict[str, Any]:
+    """
+    在推理线程或推理子进程中执行转录，结束后释放上传的音频 (即使请求已超时返回)。
+    只负责推理；查缓存和合并相同音频的并发请求在主进程中完成 (_cached_transcribe)。
+    """
+    try:
+        return whisper_handler.transcribe(upload.source, requested_scene=requested_scene, model_name=model_name,
+                                          assisted=assisted, options=options)
+    finally:
+        upload.cleanup()
+
+def _transcribe_batch_and_cleanup(uploads: List[SpooledAudio], requested_scene: Optional[str],
+                                  model_name: Optional[str] = None,
+                                  assisted: Optional[bool] = None,
+                                  options: DecodingOptions = DEFAULT_DECODING_OPTIONS) -> List[Union[Dict[str, Any], Exception]]:
+    """在推理线程或推理子进程中批量转录多段音频，返回与输入顺序一致的结果或异常，结束后释放所有音频"""
+    try:
+        return whisper_handler.transcribe_many([upload.source for upload in uploads], requested_scene=requested_scene,
+                                               model_name=model_name, assisted=assisted, options=options)
+    finally:
+        for upload in uploads:
+            upload.cleanup()
+
+def _cache_key(upload: SpooledAudio, model_name: str, requested_scene: Optional[str], options: DecodingOptions) -> str:
+    # 辅助解码的输出与普通解码相同，因此 assisted 不参与缓存键
+    return make_cache_key(upload.sha256, model_type_for(model_name), requested_scene, options.cache_options())
+
+async def _cached_transcribe(upload: SpooledAudio, requested_scene: Optional[str], model_name: str,
+                             model: Optional[str], assisted: Optional[bool], options: DecodingOptions) -> Dict[str, Any]:
+    """
+    在主进程中查缓存并合并相同音频的并发请求，只有需要推理时才把音频交给推理池。
+    交给推理池的音频由 _transcribe_and_cleanup 释放，其余情况在这里释放。
+    """
+    key = _cache_key(upload, model_name, requested_scene, options)
+    submitted = False
+
+    async def compute():
+        nonlocal submitted
+        submitted = True
+        return await inference_executor.run(_transcribe_and_cleanup, upload, requested_scene, model, assisted, options)
+
+    try:
+        result, cached = await result_cache.get_or_compute_async(key, compute, produced_by(model_name))
+    except InferenceQueueFull:
+        upload.cleanup()  # 未被接纳，推理池不会释放它
+        raise
+    finally:
+        if not submitted:
+            upload.cleanup()
+    if cached:
+        # 词库更新后只重新分析缓存结果的文本，不重新转录
+        result = whisper_handler.refresh_analysis(result, requested_scene)
+    return dict(result, cached=cached, cache_id=key)
+
+async def _cached_transcribe_batch(uploads: List[SpooledAudio], requested_scene: Optional[str], model_name: str,
+                                   model: Optional[str], assisted: Optional[bool],
+                                   options: DecodingOptions) -> List[Union[Dict[str, Any], Exception]]:
+    """批量版本: 已缓存或正在被其他请求转录的音频不再推理，内容相同的音频只转录一次"""
+    keys = [_cache_key(upload, model_name, requested_scene, options) for upload in uploads]
+    submitted: List[SpooledAudio] = []
+
+    async def compute_many(indices: List[int]):
+        submitted.extend(uploads[i] for i in indices)
+        return await inference_executor.run(
+            _transcribe_batch_and_cleanup, [uploads[i] for i in indices], requested_scene, model, assisted, options
+        )
+
+    try:
+        outcomes = await result_cache.get_or_compute_many_async(keys, compute_many, produced_by(model_name))
+    except InferenceQueueFull:
+        submitted.clear()
+        raise
+    finally:
+        for upload in uploads:
+            if not any(upload is item for item in submitted):
+                upload.cleanup()
+
+    results: List[Union[Dict[str, Any], Exception]] = []
+    for key, (result, cached) in zip(keys, outcomes):
+        if isinstance(result, Exception):
+            results.append(result)
+            continue
+        if cached:
+            result = whisper_handler.refresh_analysis(result, requested_scene)
+        results.append(dict(result, cached=cached, cache_id=key))
+    return results
+
+def _respond(result: Dict[str, Any], return_type: str, filename: Optional[str]):
+    if return_type in EXPORT_FORMATS:
+        return export_response(result, return_type, filename)
+    return _format_result(result, return_type)
+
+def _format_result(result: Dict[str, Any], return_type: str) -> Dict[str, Any]:
+    if return_type == "text":
+        return {"text": result.get("text", "")}
+    return {
+        "text": result.get("text", ""),
+        "segments": result.get("segments", []),
+        "processing_time": result.get("processing_time", 0.0),
+        "model_type": result.get("model_type", "unknown"),
+        "device": result.get("device", "unknown"),
+        "language": result.get("language", "unknown"),
+        "detected_scene": result.get("detected_scene", "通用"),
+        "found_keywords": result.get("found_keywords", []),
+        "found_semantics": result.get("found_semantics", {}),
+        "keyword_matches": result.get("keyword_matches", []),
+        "scene_timeline": result.get("scene_timeline", []),
+        "keywords_version": result.get("keywords_version"),
+        "cached": result.get("cached", False),
+        "cache_id": result.get("cache_id")
+    }
+
+@router.get("/transcribe/{cache_id}/export")
+async def export_cached(
+    cache_id: str,
+    format: str = Query("srt"),
+    filename: Optional[str] = Query(None)
+):
+    """
+    按缓存键 (转录响应中的 cache_id) 重新导出已有的转录结果，不重新转录。
+
+    参数:
+        - format: 'srt' / 'vtt' / 'txt' / 'docx' (默认 'srt')
+        - filename: 下载文件名 (不含扩展名，可选)
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {format}. 支持的格式: {list(EXPORT_FORMATS)}")
+    if not _CACHE_ID_PATTERN.match(cache_id):
+        raise HTTPException(status_code=404, detail=f"缓存结果不存在: {cache_id}")
+    result = await run_in_threadpool(result_cache.get, cache_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"缓存结果不存在或已被淘汰: {cache_id}")
+    return export_response(dict(result, cache_id=cache_id), format, filename)
+
+@router.get("/models")
+async def list_models():
+    """列出可选模型、默认模型、当前常驻内存的模型以及解码预设"""
+    registry = whisper_handler.registry
+    return {
+        "available": registry.available(),
+        "default": registry.resolve(),
+        "resident": registry.resident(),
+        "memory_budget_bytes": registry.memory_budget,
+        "decoding_presets": DECODING_PRESETS
+    }
+
 @router.post("/transcribe/")
 async def transcribe_audio(
     file: UploadFile,
     return_type: str = Form("json"),
     # scene 参数现在是可选的，如果未提供或为 "auto"，则后端自动判断
-    scene: Optional[str] = Form(None) 
+    scene: Optional[str] = Form(None),
+    # model 参数可选，未提供或为 "auto" 时使用默认模型
+    model: Optional[str] = Form(None),
+    # assisted 参数可选，未提供时按服务端默认 (ASSISTED_DECODING_DEFAULT)
+    assisted: Optional[bool] = Form(None),
+    # 解码参数均可选，未提供时沿用模型的默认值
+    preset: Optional[str] = Form(None),
+    language: Optional[str] = Form(None),
+    task: Optional[str] = Form(None),
+    beam_size: Optional[int] = Form(None),
+    temperature: Optional[str] = Form(None),
+    max_new_tokens: Optional[int] = Form(None)
 ):
     """
     上传音频文件并进行转录，可自动判断场景或由用户指定场景。
 
     参数:
         - file: 音频文件 (必需)
-        - return_type: 返回类型 (可选, 'json' 或 'text', 默认 'json')
+        - return_type: 返回类型 (可选, 默认 'json')。'json' 或 'text'，
+                 或导出格式 'srt' / 'vtt' / 'txt' / 'docx' (以附件形式分块返回，关键字高亮)
         - scene: 应用场景 (可选)。
                  可为 "课堂", "会议", "备忘录", "通用"。
                  如果提供 "auto" 或不提供此参数，则系统会尝试自动检测场景。
                  如果自动检测失败或无明显特征，则默认为 "通用"。
+        - model: 使用的模型 (可选)。可为 GET /api/v1/models 中列出的任一模型，
+                 例如 "small_finetuned", "small", "base", "tiny"。默认使用微调模型。
+        - assisted: 是否用草稿模型辅助解码 (可选)。true 时由配置的小模型 (如微调 tiny) 提出候选 token、
+                 所选模型一次验证，转录结果与普通解码完全相同，只影响速度；模型未配置草稿模型时忽略。
+        - preset: 解码预设 (可选)。"fast" (单次贪心)、"balanced" (贪心 + 温度回退)、"accurate" (束搜索 + 温度回退)，
+                 以下单独指定的参数优先于预设。
+        - language: 音频语言 (可选)，例如 "zh"、"en"，或 "auto" 自动检测。指定后原始 Whisper 模型跳过语言检测；
+                 微调模型未指定时按中文解码。
+        - task: "transcribe" (默认) 或 "translate" (翻译为英文)
+        - beam_size: 束搜索宽度 (可选，1 为贪心解码)
+        - temperature: 温度 (可选)，单个数值或逗号分隔的回退序列，例如 "0,0.2,0.4,0.6,0.8,1.0"
+        - max_new_tokens: 每个 30 秒窗口最多生成的 token 数 (可选)
 
     返回:
         - json格式：包含转录文本、识别到的关键字、语义连接词、检测到的场景、时间戳等信息。
         - text格式：只包含转录文本 (不含关键字、语义和场景信息)。
+        - 导出格式：对应格式的文件；响应头 X-Cache-Id 为缓存键，可用于 GET /transcribe/{cache_id}/export 重新导出。
     """
+    filename = PurePath(file.filename).stem if file.filename else None
+    try:
+        model_name = whisper_handler.registry.resolve(model)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    options = _decoding_options(model_name, preset, language, task, beam_size, temperature, max_new_tokens)
+
     if file.content_type not in ALLOWED_AUDIO_TYPES:
         raise HTTPException(
             status_code=400,
             detail=f"不支持的文件类型: {file.content_type}. 支持的类型: {ALLOWED_AUDIO_TYPES}"
         )
     
-    # 验证文件大小 - 改回使用 await file.read(chunk_size)
+    # 单次流式读取: 同时校验大小、计算内容摘要，小文件留在内存中不落盘
     try:
-        file_size = 0
-        chunk_size = 8192 # 8KB per chunk
-        while True:
-            chunk = await file.read(chunk_size)
-            if not chunk:
-                break
-            file_size += len(chunk)
-            if file_size > MAX_AUDIO_SIZE:
-                await file.close()
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"文件大小超过限制: {MAX_AUDIO_SIZE/1024/1024:.2f}MB"
-                )
-        await file.seek(0) # 重置文件指针到开头，以便后续 shutil.copyfileobj 读取
-    except HTTPException:
-        raise
+        upload = await spool_upload(file)
+    except UploadTooLarge:
+        await file.close()
+        raise HTTPException(
+            status_code=400,
+            detail=f"文件大小超过限制: {MAX_AUDIO_SIZE/1024/1024:.2f}MB"
+        )
     except Exception as e:
         await file.close()
-        raise HTTPException(status_code=400, detail=f"读取文件大小出错: {str(e)}")
-    
-    file_id = str(abs(hash(file.filename + str(os.urandom(4)))))
-    audio_path = UPLOAD_DIR / f"{file_id}_audio{Path(file.filename).suffix}"
+        raise HTTPException(status_code=400, detail=f"读取上传文件出错: {str(e)}")
     
     try:
-        # 保存上传的文件
-        # 确保在 shutil.copyfileobj 之前，文件指针在开头
-        await file.seek(0) 
-        with open(audio_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer) # file.file 是同步文件对象
-        
         # 如果 scene 为 None (未提供) 或 "auto"，则传递 None 给 handler，让其自动判断
         scene_to_process = scene if scene and scene.lower() != "auto" else None
-        result = whisper_handler.transcribe(audio_path, requested_scene=scene_to_process)
-        
-        audio_path.unlink(missing_ok=True)
-        
-        if return_type == "text":
-            return {"text": result.get("text", "")}
-        else:
-            return {
-                "text": result.get("text", ""),
-                "segments": result.get("segments", []),
-                "processing_time": result.get("processing_time", 0.0),
-                "model_type": result.get("model_type", "unknown"),
-                "device": result.get("device", "unknown"),
-                "language": result.get("language", "unknown"),
-                "detected_scene": result.get("detected_scene", "通用"),
-                "found_keywords": result.get("found_keywords", []),
-                "found_semantics": result.get("found_semantics", {})
-            }
+        # 缓存命中或相同音频正在转录时不占用推理池；推理在专用线程池或推理子进程中执行，不阻塞事件循环
+        result = await _cached_transcribe(upload, scene_to_process, model_name, model, assisted, options)
+        return _respond(result, return_type, filename)
             
+    except InferenceQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail="服务繁忙，推理队列已满，请稍后重试",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except InferenceTimeout as e:
+        # 音频仍被推理池使用，由 _transcribe_and_cleanup 在推理结束后释放
+        print(f"API Error: transcription timed out after {e.timeout:.0f}s")
+        raise HTTPException(
+            status_code=504,
+            detail=f"转录超时 (超过 {e.timeout:.0f} 秒)"
+        )
     except Exception as e:
-        if audio_path.exists():
-            audio_path.unlink(missing_ok=True)
+        upload.cleanup()
         print(f"API Error during transcription: {e}") 
         raise HTTPException(
             status_code=500,
             detail=f"转录过程中出错: {str(e)}"
         )
     finally:
-        await file.close() 
\ No newline at end of file
+        await file.close() 
+
+async def _spool_batch_file(file: UploadFile) -> List[Tuple[str, Union[SpooledAudio, Exception]]]:
+    """读取批量请求中的一个文件: zip 压缩包展开为其中的各个音频，普通音频原样返回；单个文件的错误不抛出"""
+    filename = file.filename or "audio"
+    is_zip = file.content_type in ZIP_CONTENT_TYPES or filename.lower().endswith(".zip")
+    if not is_zip and file.content_type not in ALLOWED_AUDIO_TYPES:
+        return [(filename, ValueError(f"不支持的文件类型: {file.content_type}. 支持的类型: {ALLOWED_AUDIO_TYPES}"))]
+    try:
+        upload = await spool_upload(file, max_size=BATCH_MAX_TOTAL_SIZE if is_zip else MAX_AUDIO_SIZE)
+    except UploadTooLarge as e:
+        return [(filename, ValueError(f"文件大小超过限制: {e.max_size/1024/1024:.2f}MB"))]
+    except Exception as e:
+        return [(filename, ValueError(f"读取上传文件出错: {str(e)}"))]
+    finally:
+        await file.close()
+    if not is_zip:
+        return [(filename, upload)]
+    try:
+        members = await run_in_threadpool(extract_zip, upload)
+    except ValueError as e:
+        return [(filename, e)]
+    finally:
+        upload.cleanup()
+    return [(f"{filename}/{name}", item) for name, item in members]
+
+@router.post("/transcribe/batch")
+async def transcribe_batch(
+    files: List[UploadFile] = File(...),
+    return_type: str = Form("json"),
+    scene: Optional[str] = Form(None),
+    model: Optional[str] = Form(None),
+    assisted: Optional[bool] = Form(None),
+    preset: Optional[str] = Form(None),
+    language: Optional[str] = Form(None),
+    task: Optional[str] = Form(None),
+    beam_size: Optional[int] = Form(None),
+    temperature: Optional[str] = Form(None),
+    max_new_tokens: Optional[int] = Form(None)
+):
+    """
+    批量转录: 一次上传多个音频文件，或包含音频的 zip 压缩包 (可混合)。
+
+    所有音频并行解码，微调模型会把各音频的 30 秒窗口合并成大批次送入 generate，
+    比逐个调用 /transcribe/ 更充分地利用模型。单个文件出错不影响其他文件。
+
+    参数:
+        - files: 音频文件或 zip 压缩包 (必需，可多个)
+        - return_type: 'json' 或 'text'。不支持导出格式 ('srt' / 'vtt' / 'txt' / 'docx')，
+          需要导出时用各项的 cache_id 调用 GET /transcribe/{cache_id}/export
+        - scene / model / assisted 以及解码参数 (preset / language / task / beam_size /
+          temperature / max_new_tokens): 同 POST /transcribe/，对所有文件生效
+
+    返回:
+        - results: 按上传顺序 (zip 内按压缩包中的顺序) 排列，每项包含 filename、status ("ok" 或 "error")，
+          以及 cache_id 和 result (格式同 /transcribe/)，或 error。
+    """
+    if return_type in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"批量转录不支持导出格式 '{return_type}'，请使用 return_type='json'，"
+                   f"再以各项的 cache_id 调用 /api/v1/transcribe/{{cache_id}}/export"
+        )
+    try:
+        model_name = whisper_handler.registry.resolve(model)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    options = _decoding_options(model_name, preset, language, task, beam_size, temperature, max_new_tokens)
+
+    items: List[Tuple[str, Union[SpooledAudio, Exception]]] = []
+    try:
+        for file in files:
+            items.extend(await _spool_batch_file(file))
+    except BaseException:
+        for _, item in items:
+            if isinstance(item, SpooledAudio):
+                item.cleanup()
+        raise
+    uploads = [item for _, item in items if isinstance(item, SpooledAudio)]
+    if len(uploads) > BATCH_MAX_FILES:
+        for upload in uploads:
+            upload.cleanup()
+        raise HTTPException(status_code=400, detail=f"音频数量 ({len(uploads)}) 超过单次批量上限 {BATCH_MAX_FILES}")
+    if sum(upload.size for upload in uploads) > BATCH_MAX_TOTAL_SIZE:
+        for upload in uploads:
+            upload.cleanup()
+        raise HTTPException(status_code=400, detail=f"音频总大小超过限制: {BATCH_MAX_TOTAL_SIZE/1024/1024:.2f}MB")
+
+    scene_to_process = scene if scene and scene.lower() != "auto" else None
+    outcomes: List[Union[Dict[str, Any], Exception]] = []
+    if uploads:
+        try:
+            outcomes = await _cached_transcribe_batch(uploads, scene_to_process, model_name, model, assisted, options)
+        except InferenceQueueFull as e:
+            raise HTTPException(
+                status_code=503,
+                detail="服务繁忙，推理队列已满，请稍后重试",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except InferenceTimeout as e:
+            print(f"API Error: batch transcription timed out after {e.timeout:.0f}s")
+            raise HTTPException(status_code=504, detail=f"转录超时 (超过 {e.timeout:.0f} 秒)")
+        except Exception as e:
+            for upload in uploads:
+                upload.cleanup()
+            print(f"API Error during batch transcription: {e}")
+            raise HTTPException(status_code=500, detail=f"转录过程中出错: {str(e)}")
+
+    results = []
+    outcome_iter = iter(outcomes)
+    for filename, item in items:
+        outcome = next(outcome_iter) if isinstance(item, SpooledAudio) else item
+        if isinstance(outcome, Exception):
+            results.append({"filename": filename, "status": "error", "error": str(outcome)})
+        else:
+            results.append({"filename": filename, "status": "ok", "cache_id": outcome.get("cache_id"),
+                            "result": _format_result(outcome, return_type)})
+    return {
+        "results": results,
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] == "error")
+    }
@@ -0,0 +1,152 @@
+import subprocess
+import threading
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+from app.core.config import SAMPLING_RATE
+from app.core.metrics import stage_timer
+
+
+def load_audio(source: Union[str, Path, bytes], sr: int = SAMPLING_RATE) -> np.ndarray:
+    """
+    使用 FFmpeg 把音频解码并重采样为单声道 float32 波形。
+
+    source 可以是文件路径，也可以是内存中的完整音频字节 (通过标准输入传给 FFmpeg，不落盘)。
+    与 whisper.load_audio 的处理方式一致，两种模型分支共用同一份解码结果。
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        input_arg, stdin_data = "pipe:0", bytes(source)
+    else:
+        input_arg, stdin_data = str(source), None
+
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-threads", "0",
+        "-i", input_arg,
+        "-f", "s16le",
+        "-ac", "1",
+        "-acodec", "pcm_s16le",
+        "-ar", str(sr),
+        "-"
+    ]
+    try:
+        with stage_timer("audio_decode"):
+            out = subprocess.run(cmd, input=stdin_data, capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg executable not found. Please ensure FFmpeg is installed and in system PATH.")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio with ffmpeg: {e.stderr.decode(errors='ignore')}") from e
+
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def pcm16_to_float32(data: bytes) -> np.ndarray:
+    """16 位小端 PCM 字节转换为 [-1, 1) 的 float32 波形"""
+    if len(data) % 2:
+        data = data[:-1]
+    return np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+
+
+class StreamResampler:
+    """
+    实时流中 PCM 数据块的重采样 (纯 NumPy)。
+
+    降采样时先用加 Hamming 窗的 sinc 低通 FIR 滤除目标奈奎斯特频率以上的成分 (否则 44.1/48kHz 音频中的
+    高频会混叠进语音频带)，再线性插值到目标采样率。滤波器历史和插值位置在数据块之间延续，
+    分块处理的结果与整段处理相同；输出相对输入延迟半个滤波器长度 (48kHz 时约 1ms)。
+    """
+    _CUTOFF = 0.9      # 截止频率 / 目标奈奎斯特频率
+    _TRANSITION = 0.2  # 过渡带宽度 / 目标奈奎斯特频率
+
+    def __init__(self, orig_sr: int, target_sr: int = SAMPLING_RATE):
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self._step = orig_sr / target_sr  # 相邻输出采样之间的输入采样数
+        if target_sr < orig_sr:
+            nyquist = 0.5 * target_sr / orig_sr  # 以输入采样率为单位 (周期/采样)
+            half = int(np.ceil(3.3 / (self._TRANSITION * nyquist) / 2))
+            n = np.arange(-half, half + 1)
+            taps = 2 * self._CUTOFF * nyquist * np.sinc(2 * self._CUTOFF * nyquist * n) * np.hamming(len(n))
+            self._taps = (taps / taps.sum()).astype(np.float32)
+        else:
+            self._taps = np.ones(1, dtype=np.float32)
+        self._history = np.zeros(len(self._taps) - 1, dtype=np.float32)
+        self._last = 0.0      # 上一块滤波结果的最后一个采样，使插值跨块连续
+        self._consumed = 0    # 已滤波的输入采样数
+        self._next = 0.0      # 下一个输出采样在滤波结果中的位置
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        if self.orig_sr == self.target_sr or len(audio) == 0:
+            return audio
+        x = np.concatenate([self._history, audio])
+        if len(self._history):
+            self._history = x[-len(self._history):]
+        filtered = np.concatenate([[self._last], np.convolve(x, self._taps, mode="valid")])
+        base = self._consumed - 1  # filtered[0] 在整个滤波结果中的位置
+        self._consumed += len(audio)
+        self._last = filtered[-1]
+        end = self._consumed - 1
+        if self._next > end:
+            return np.zeros(0, dtype=np.float32)
+        count = int(np.floor((end - self._next) / self._step)) + 1
+        positions = self._next + np.arange(count) * self._step
+        self._next += count * self._step
+        return np.interp(positions - base, np.arange(len(filtered)), filtered).astype(np.float32)
+
+
+class FFmpegStreamDecoder:
+    """
+    常驻的 FFmpeg 解码进程，用于实时流中的 opus/webm/ogg 等编码数据。
+
+    feed() 写入编码数据，read() 取出目前已解码的 16kHz float32 采样。
+    FFmpeg 的输出由后台线程持续读取，避免管道写满导致死锁。
+    """
+    def __init__(self, sr: int = SAMPLING_RATE, input_format: str = None):
+        cmd = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+        if input_format:
+            cmd += ["-f", input_format]
+        cmd += ["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sr), "pipe:1"]
+        try:
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            raise RuntimeError("ffmpeg executable not found. Please ensure FFmpeg is installed and in system PATH.")
+        self._lock = threading.Lock()
+        self._decoded = bytearray()
+        self._reader = threading.Thread(target=self._read_loop, name="ffmpeg-stream-reader", daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        while True:
+            chunk = self._proc.stdout.read1(65536) if hasattr(self._proc.stdout, "read1") else self._proc.stdout.read(4096)
+            if not chunk:
+                break
+            with self._lock:
+                self._decoded.extend(chunk)
+
+    def feed(self, data: bytes):
+        try:
+            self._proc.stdin.write(data)
+            self._proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise RuntimeError(f"ffmpeg stream decoder stopped: {e}") from e
+
+    def read(self) -> np.ndarray:
+        with self._lock:
+            usable = len(self._decoded) - len(self._decoded) % 2
+            data = bytes(self._decoded[:usable])
+            del self._decoded[:usable]
+        return pcm16_to_float32(data)
+
+    def close(self, timeout: float = 5.0) -> np.ndarray:
+        """结束输入并返回剩余的解码数据"""
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        self._reader.join(timeout=timeout)
+        if self._proc.poll() is None:
+            self._proc.kill()
+        return self.read()
@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class MicroBatcher:
+    """
+    跨请求的动态微批处理调度器。
+
+    各推理线程调用 submit() 提交单个样本并阻塞等待结果；调度线程从第一个样本到达起
+    最多等待 max_wait 秒 (或凑满 max_batch_size 个样本)，然后把同一 key 的样本合并成
+    一次 process_fn(key, payloads) 调用，再把返回列表按顺序分发回各个调用者。
+
+    key 用来区分不能放在同一批里的样本 (例如解码参数不同)。
+    """
+    def __init__(self, process_fn: Callable[[Hashable, List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait: float = 0.01, name: str = "micro-batcher"):
+        self.process_fn = process_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Tuple[Hashable, Any, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, payload: Any, key: Hashable = None, timeout: Optional[float] = None) -> Any:
+        """提交一个样本并阻塞等待它所在批次的处理结果"""
+        future: Future = Future()
+        self._queue.put((key, payload, future))
+        return future.result(timeout=timeout)
+
+    def submit_many(self, payloads: List[Any], key: Hashable = None, timeout: Optional[float] = None) -> List[Any]:
+        """一次提交多个样本 (例如同一音频的多个窗口)，它们可能与其他请求的样本拼在同一批"""
+        return [f.result(timeout=timeout) for f in self.submit_many_nowait(payloads, key=key)]
+
+    def submit_many_nowait(self, payloads: List[Any], key: Hashable = None) -> List[Future]:
+        """同 submit_many，但不等待结果，返回各样本的 Future；调用方可以在解码期间做其他工作"""
+        futures = []
+        for payload in payloads:
+            future: Future = Future()
+            self._queue.put((key, payload, future))
+            futures.append(future)
+        return futures
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _collect(self) -> List[Tuple[Hashable, Any, Future]]:
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # 等待时间已到，只取已经在队列中的样本
+                    items.append(self._queue.get_nowait())
+                else:
+                    items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _loop(self):
+        while True:
+            items = self._collect()
+            groups: Dict[Hashable, List[Tuple[Any, Future]]] = {}
+            for key, payload, future in items:
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(key, []).append((payload, future))
+
+            for key, group in groups.items():
+                self._process_group(key, group)
+
+    def _process_group(self, key: Hashable, group: List[Tuple[Any, Future]]):
+        try:
+            results = self.process_fn(key, [payload for payload, _ in group])
+            if len(results) != len(group):
+                raise RuntimeError(f"Batch function returned {len(results)} results for {len(group)} inputs")
+        except BaseException as e:
+            # 任何异常都只让本批次失败，调度线程继续运行，否则之后的请求会一直等到超时；
+            # Exception 以外的异常 (例如 SystemExit) 不在调用方的线程中原样抛出
+            error = e if isinstance(e, Exception) else RuntimeError(f"Batch processing aborted: {e!r}")
+            for _, future in group:
+                future.set_exception(error)
+            return
+        for (_, future), result in zip(group, results):
+            future.set_result(result)
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # 项目根目录
@@ -21,6 +22,90 @@ FINETUNED_WHISPER_MODEL_NAME = "small_finetuned"
 FINETUNED_WHISPER_WEIGHTS_PATH = AI_MODEL_DIR / f"{FINETUNED_WHISPER_MODEL_NAME}.pt" # 指向 ai_model/small_finetuned.pt
 FINETUNED_WHISPER_CONFIG_DIR = AI_MODEL_DIR / "whisper_small_finetuned_config"    # 指向 ai_model/whisper_small_finetuned_config/
 
+# 微调模型的推理精度: "fp32" (默认), "int8" (Linear 层动态量化，仅 CPU), "bf16"
+# MODEL_SPECS 中的条目可以用 "precision" 单独指定
+FINETUNED_INFERENCE_PRECISION = "fp32"
+QUANTIZED_MODEL_CACHE_DIR = AI_MODEL_DIR / "quantized"  # 量化后模型的缓存目录，避免每次启动重新量化
+
+# 辅助解码的草稿模型: train_whisper_finetune.py --base-model openai/whisper-tiny 训练得到的微调 tiny 模型
+DRAFT_WHISPER_MODEL_NAME = "tiny_finetuned"
+DRAFT_WHISPER_WEIGHTS_PATH = AI_MODEL_DIR / f"{DRAFT_WHISPER_MODEL_NAME}.pt"
+DRAFT_WHISPER_CONFIG_DIR = AI_MODEL_DIR / "whisper_tiny_finetuned_config"
+
+# 多模型注册表配置
+# 同一进程内可同时常驻多个模型，每个请求可通过 model 参数选择其中之一。
+# "finetuned" 条目也可以不给 config_dir / weights_path，而用 "pretrained" 指定 Hugging Face 上的检查点；
+# "draft_model" 为该模型辅助解码时使用的草稿模型 (须为同一词表的 "finetuned" 条目)
+MODEL_SPECS = {
+    FINETUNED_WHISPER_MODEL_NAME: {
+        "kind": "finetuned",
+        "config_dir": FINETUNED_WHISPER_CONFIG_DIR,
+        "weights_path": FINETUNED_WHISPER_WEIGHTS_PATH,
+        "draft_model": DRAFT_WHISPER_MODEL_NAME,
+    },
+    f"{FINETUNED_WHISPER_MODEL_NAME}_int8": {
+        "kind": "finetuned",
+        "config_dir": FINETUNED_WHISPER_CONFIG_DIR,
+        "weights_path": FINETUNED_WHISPER_WEIGHTS_PATH,
+        "precision": "int8",
+        "draft_model": f"{DRAFT_WHISPER_MODEL_NAME}_int8",
+    },
+    DRAFT_WHISPER_MODEL_NAME: {
+        "kind": "finetuned",
+        "config_dir": DRAFT_WHISPER_CONFIG_DIR,
+        "weights_path": DRAFT_WHISPER_WEIGHTS_PATH,
+    },
+    f"{DRAFT_WHISPER_MODEL_NAME}_int8": {
+        "kind": "finetuned",
+        "config_dir": DRAFT_WHISPER_CONFIG_DIR,
+        "weights_path": DRAFT_WHISPER_WEIGHTS_PATH,
+        "precision": "int8",
+    },
+    "tiny_hf": {"kind": "finetuned", "pretrained": "openai/whisper-tiny"},
+    "base_hf": {"kind": "finetuned", "pretrained": "openai/whisper-base"},
+    "small": {"kind": "original", "whisper_name": "small"},
+    "base": {"kind": "original", "whisper_name": "base"},
+    "tiny": {"kind": "original", "whisper_name": "tiny"},
+}
+DEFAULT_MODEL = FINETUNED_WHISPER_MODEL_NAME   # 请求未指定模型 (或为 "auto") 时使用
+FALLBACK_MODEL = WHISPER_MODEL_NAME            # 默认模型加载失败时回退使用的模型
+MODEL_MEMORY_BUDGET_BYTES = 4 * 1024 * 1024 * 1024  # 常驻模型参数总大小上限 (4GB)，超出时淘汰最久未使用的空闲模型
+
+# 基准测试用的桩模型: 设置环境变量 WHISPER_STUB_MODEL=1 后注册 "stub" 模型并设为默认模型。
+# 桩模型不加载任何权重，按音频时长生成含关键字的固定文本，用于离线测量 HTTP、解码和关键字分析的开销。
+# WHISPER_STUB_RTF 为模拟的实时率 (每秒音频休眠的秒数)，默认为 0。
+STUB_MODEL_ENABLED = os.getenv("WHISPER_STUB_MODEL", "") not in ("", "0")
+STUB_MODEL_RTF = float(os.getenv("WHISPER_STUB_RTF", "0"))
+if STUB_MODEL_ENABLED:
+    MODEL_SPECS["stub"] = {"kind": "stub"}
+    DEFAULT_MODEL = "stub"
+    FALLBACK_MODEL = None
+
+# 辅助解码 (speculative decoding) 配置
+# 草稿模型逐个提出候选 token，主模型一次前向验证整段候选，只接受与自己贪心结果一致的部分，
+# 输出与普通贪心解码完全相同。请求可通过 assisted 参数选择，未指定时按 ASSISTED_DECODING_DEFAULT；
+# 主模型没有配置 draft_model 或草稿模型无法加载时按普通贪心解码
+ASSISTED_DECODING_DEFAULT = os.getenv("WHISPER_ASSISTED_DECODING", "") not in ("", "0")
+ASSISTED_NUM_TOKENS = 5   # 草稿模型每轮最多提出的候选 token 数 (生成过程中按接受情况自动调整)
+
+# 解码参数配置
+# 请求可以用 preset 选择一组预设，再用 language / task / beam_size / temperature / max_new_tokens 单独覆盖。
+# 未指定的参数使用各模型原来的默认值: 微调模型为单次贪心解码，原始 Whisper 模型为贪心解码加温度回退；
+# 原始 Whisper 模型未指定语言时先在第一个 30 秒窗口上做一次语言检测 (一次编码器和解码器前向)
+DECODING_PRESETS = {
+    "fast": {"beam_size": 1, "temperature": [0.0]},                                    # 单次贪心，无回退
+    "balanced": {"beam_size": 1, "temperature": [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]},      # 贪心，质量差时升温重试
+    "accurate": {"beam_size": 5, "temperature": [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]},      # 束搜索 + 温度回退
+}
+DECODING_DEFAULT_LANGUAGE = "zh"         # 未指定语言 (或为 "auto") 时微调模型按此语言解码
+DECODING_MAX_BEAM_SIZE = 10
+DECODING_MAX_NEW_TOKENS = 440            # Whisper 解码器最多 448 个位置，需留出提示 token
+DECODING_COMPRESSION_RATIO_THRESHOLD = 2.4  # 温度回退的触发条件 (与 openai-whisper 的默认值相同)
+DECODING_LOGPROB_THRESHOLD = -1.0
+
+# 音频解码后的采样率 (Whisper 模型要求 16kHz)
+SAMPLING_RATE = 16000
+
 # 文件上传配置
 MAX_AUDIO_SIZE = 25 * 1024 * 1024  # 25MB
 ALLOWED_AUDIO_TYPES = [
@@ -30,4 +115,105 @@ ALLOWED_AUDIO_TYPES = [
     "audio/x-wav",
     "audio/x-m4a",
     "audio/m4a",
-] 
\ No newline at end of file
+]
+UPLOAD_CHUNK_SIZE = 1024 * 1024          # 上传读取和写盘的块大小 (1MB)
+UPLOAD_MEMORY_LIMIT = 4 * 1024 * 1024    # 不超过此大小的音频只保存在内存中，不落盘
+# 可以通过管道交给 FFmpeg 解码的类型 (m4a 的索引可能在文件末尾，必须落盘)
+STREAMABLE_AUDIO_TYPES = [
+    "audio/mpeg",
+    "audio/mp3",
+    "audio/wav",
+    "audio/x-wav",
+] 
+# 推理执行器配置
+# 推理在独立线程池中执行，避免阻塞 uvicorn 事件循环
+INFERENCE_MAX_WORKERS = 4          # 同时执行推理的工作线程数 (微调模型的 generate 会在批处理线程中合并执行)
+INFERENCE_MAX_QUEUE = 8            # 等待推理的最大排队请求数，超出后直接返回 503
+INFERENCE_TIMEOUT = 30 * 60        # 单个请求等待推理结果的超时时间 (秒)
+INFERENCE_RETRY_AFTER = 10         # 队列已满时建议客户端重试的最小间隔 (秒)
+
+# 推理后端: "thread" 在 API 进程的线程池中推理；"process" 使用多进程推理池 (仅 CPU)，
+# 父进程加载一次模型权重并放入共享内存，各推理子进程共用同一份权重
+INFERENCE_BACKEND = "thread"
+INFERENCE_PROCESS_WORKERS = 4              # 推理子进程数
+INFERENCE_THREADS_PER_WORKER = None        # 每个子进程的 torch 线程数，None 表示 CPU 核数 / 子进程数
+INFERENCE_PROCESS_MODELS = [DEFAULT_MODEL] # 启动时在父进程中加载并共享给子进程的模型
+INFERENCE_PROCESS_START_TIMEOUT = 10 * 60  # 等待所有子进程加载并预热完成的最长时间 (秒)
+
+# 微调模型的跨请求动态批处理配置
+# 多个请求的 80x3000 特征会在 BATCH_MAX_WAIT_MS 毫秒内被合并成一次 generate 调用
+BATCH_MAX_SIZE = 8
+BATCH_MAX_WAIT_MS = 10
+
+# 微调模型长音频分窗转录配置
+# 音频按 LONGFORM_CHUNK_SECONDS 秒的窗口切分，相邻窗口重叠 LONGFORM_OVERLAP_SECONDS 秒
+LONGFORM_CHUNK_SECONDS = 30
+LONGFORM_OVERLAP_SECONDS = 5
+
+# 批量转录 (POST /api/v1/transcribe/batch) 配置
+BATCH_MAX_FILES = 50                        # 单次批量请求最多包含的音频数 (包括 zip 内的音频)
+BATCH_MAX_TOTAL_SIZE = 500 * 1024 * 1024    # 单次批量请求解压后的音频总大小上限 (500MB)
+BATCH_DECODE_WORKERS = 4                    # 并行执行 FFmpeg 解码的线程数
+ZIP_CONTENT_TYPES = ["application/zip", "application/x-zip-compressed"]
+# zip 内的音频按扩展名识别类型
+AUDIO_EXTENSION_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".m4a": "audio/m4a",
+}
+
+# 语音活动检测 (VAD) 配置
+# 转录前先找出语音区间，只把语音部分拼接后送入模型，分段时间再换算回原始时间轴
+VAD_ENABLED = True
+VAD_FRAME_SECONDS = 0.03          # 分析帧长
+VAD_ENERGY_MARGIN_DB = 10.0       # 语音帧能量需高出噪声底 (帧能量的 10% 分位数) 的分贝数
+VAD_MIN_ENERGY_DB = -50.0         # 语音帧能量的绝对下限 (dBFS)
+VAD_MIN_DYNAMIC_RANGE_DB = 20.0   # 帧能量 90% 与 10% 分位数之差低于此值且没有接近下限的安静帧时，视为没有静音可跳过
+VAD_MAX_SPECTRAL_FLATNESS = 0.5   # 谱平坦度高于此值的帧视为噪声 (白噪声约为 0.56)
+VAD_MIN_SPEECH_SECONDS = 0.25     # 短于此长度的孤立语音片段被丢弃
+VAD_MIN_SILENCE_SECONDS = 1.0     # 只跳过不短于此长度的静音，较短的停顿保留在语音区间内
+VAD_PAD_SECONDS = 0.2             # 每个语音区间两端额外保留的长度
+VAD_MAX_SPEECH_RATIO = 0.9        # 语音占比超过此值时不做裁剪，直接解码整段音频
+
+# 转录结果缓存配置
+# 以音频内容摘要 + 模型 + 场景 + 解码参数为键，内存 LRU 在前，磁盘持久层在后
+RESULT_CACHE_DIR = ROOT_DIR / "cache" / "transcriptions"
+RESULT_CACHE_MEMORY_ENTRIES = 256
+RESULT_CACHE_DISK_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+
+# 导出配置
+# SRT / VTT / TXT / DOCX 导出由分段逐段生成，以分块传输的方式返回，每块约 EXPORT_CHUNK_BYTES 字节
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# 启动预热配置
+PRELOAD_MODEL = True          # 启动时加载模型并执行一次预热转录，完成后 /readyz 才返回就绪
+WARMUP_AUDIO_SECONDS = 2.0    # 预热所用合成音频的长度 (秒)
+
+# 实时流式转录 (WebSocket) 配置
+STREAM_DECODE_INTERVAL_SECONDS = 2.0   # 每积累多少秒新音频解码一次并推送 partial 结果
+STREAM_MIN_SEGMENT_SECONDS = 1.0       # 确定分段的最短长度
+STREAM_MAX_SEGMENT_SECONDS = 20.0      # 缓冲区超过该长度时强制切出确定分段 (必须小于 30 秒)
+STREAM_MIN_SILENCE_SECONDS = 0.6       # 末尾静音达到该长度时切出确定分段
+STREAM_SILENCE_RMS = 0.01              # 静音判定的帧能量 (RMS) 阈值
+
+# 异步转录任务配置
+# 任务持久化在 SQLite 中，服务重启后未完成的任务会重新排队
+JOBS_DIR = ROOT_DIR / "cache" / "jobs"          # 任务音频的存放目录，任务结束后删除
+JOB_DB_PATH = JOBS_DIR / "jobs.sqlite3"
+JOB_WORKERS = 2                                 # 后台执行任务的工作线程数
+JOB_MAX_ATTEMPTS = 3                            # 单个任务的最大执行次数 (包括重启后的重试)
+JOB_POLL_INTERVAL = 1.0                         # 工作线程空闲时检查新任务的间隔 (秒)
+JOB_INFERENCE_TIMEOUT = 6 * 60 * 60             # 单个任务等待推理结果的超时时间 (秒)
+JOB_CALLBACK_TIMEOUT = 10                       # 回调请求的超时时间 (秒)
+JOB_CALLBACK_ALLOWED_HOSTS = ["localhost", "127.0.0.1", "::1"]  # 任务完成回调只允许发往这些主机
+
+# 关键字词库配置
+# 词库文件 (JSON，安装 PyYAML 后也可以是 .yaml/.yml) 存在时优先使用，否则使用 app/core/keywords.py 中的内置词库。
+# 文件修改后在 KEYWORDS_RELOAD_INTERVAL 秒内自动生效 (每个进程各自检查)，无需重启服务和重新加载模型
+KEYWORDS_CONFIG_PATH = Path(os.getenv("WHISPER_KEYWORDS_CONFIG", str(ROOT_DIR / "config" / "keywords.json")))
+KEYWORDS_RELOAD_INTERVAL = 5.0
+# 场景时间线 (scene_timeline) 的窗口长度 (秒): 每个窗口按其中的场景指示词和关键字单独判断场景
+SCENE_TIMELINE_WINDOW_SECONDS = 60.0
+# 管理端点 (/api/v1/admin/...) 的访问令牌，通过请求头 X-Admin-Token 传递；未设置时只允许本机访问
+ADMIN_TOKEN = os.getenv("WHISPER_ADMIN_TOKEN") or None
+ADMIN_LOCAL_HOSTS = ["127.0.0.1", "::1", "localhost"]
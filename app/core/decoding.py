@@ -0,0 +1,183 @@
+import inspect
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+from whisper.tokenizer import LANGUAGES, TO_LANGUAGE_CODE
+
+from app.core.config import (
+    DECODING_PRESETS,
+    DECODING_DEFAULT_LANGUAGE,
+    DECODING_MAX_BEAM_SIZE,
+    DECODING_MAX_NEW_TOKENS,
+    DECODING_COMPRESSION_RATIO_THRESHOLD,
+    DECODING_LOGPROB_THRESHOLD
+)
+
+# 一次转录的解码参数，以及到两种模型接口 (openai-whisper 的 transcribe、transformers 的 generate) 的转换
+
+TASKS = ("transcribe", "translate")
+
+
+class DecodingOptions:
+    """
+    解码参数。值为 None 的参数沿用模型自己的默认值，因此不带任何参数的请求与原先的行为 (和缓存键) 相同。
+
+    - language: 语言代码，例如 "zh"；None 表示自动检测 (微调模型按 DECODING_DEFAULT_LANGUAGE 解码)
+    - task: "transcribe" 或 "translate" (翻译为英文)
+    - beam_size: 束搜索宽度，1 为贪心解码
+    - temperature: 温度序列；多于一个时为温度回退 (结果压缩比过高或平均对数概率过低时依次升温重试)
+    - max_new_tokens: 每个 30 秒窗口最多生成的 token 数
+
+    实例按参数值比较和哈希，可以直接作为批处理调度器的 key 的一部分 (创建后不应再修改)。
+    """
+    __slots__ = ("language", "task", "beam_size", "temperature", "max_new_tokens")
+
+    def __init__(self, language: Optional[str] = None, task: Optional[str] = None,
+                 beam_size: Optional[int] = None, temperature: Optional[Sequence[float]] = None,
+                 max_new_tokens: Optional[int] = None):
+        self.language = language
+        self.task = task
+        self.beam_size = beam_size
+        self.temperature = tuple(temperature) if temperature is not None else None
+        self.max_new_tokens = max_new_tokens
+
+    def _values(self) -> Tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, DecodingOptions) and self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        return f"DecodingOptions({self.cache_options()})"
+
+    @property
+    def is_greedy(self) -> bool:
+        """是否为单次贪心解码 (辅助解码只在这种情况下与普通解码结果相同)"""
+        return (self.beam_size or 1) == 1 and self.temperature in (None, (0.0,))
+
+    @property
+    def uses_temperature_fallback(self) -> bool:
+        """是否为温度回退 (给出了多个温度)"""
+        return self.temperature is not None and len(self.temperature) > 1
+
+    def cache_options(self) -> Dict[str, Any]:
+        """参与结果缓存键的参数: 只包含显式指定的参数"""
+        return {
+            name: list(value) if isinstance(value, tuple) else value
+            for name, value in zip(self.__slots__, self._values()) if value is not None
+        }
+
+    def finetuned_language(self) -> str:
+        return self.language or DECODING_DEFAULT_LANGUAGE
+
+    def whisper_kwargs(self) -> Dict[str, Any]:
+        """openai-whisper 的 model.transcribe 参数；指定了语言时跳过开头的语言检测"""
+        kwargs: Dict[str, Any] = {}
+        if self.language is not None:
+            kwargs["language"] = self.language
+        if self.task is not None:
+            kwargs["task"] = self.task
+        if self.beam_size is not None and self.beam_size > 1:
+            kwargs["beam_size"] = self.beam_size
+        if self.temperature is not None:
+            kwargs["temperature"] = self.temperature if len(self.temperature) > 1 else self.temperature[0]
+        if self.max_new_tokens is not None:
+            kwargs["sample_len"] = self.max_new_tokens
+        return kwargs
+
+    def generate_kwargs(self) -> Dict[str, Any]:
+        """transformers 的 WhisperForConditionalGeneration.generate 参数 (语言和任务由 forced_decoder_ids 给出)"""
+        kwargs: Dict[str, Any] = {}
+        if self.beam_size is not None and self.beam_size > 1:
+            kwargs["num_beams"] = self.beam_size
+        if self.max_new_tokens is not None:
+            kwargs["max_new_tokens"] = self.max_new_tokens
+        if self.temperature is not None:
+            if self.uses_temperature_fallback:
+                kwargs.update(
+                    temperature=self.temperature,
+                    compression_ratio_threshold=DECODING_COMPRESSION_RATIO_THRESHOLD,
+                    logprob_threshold=DECODING_LOGPROB_THRESHOLD
+                )
+            elif self.temperature[0] > 0:
+                kwargs.update(do_sample=True, temperature=self.temperature[0])
+        return kwargs
+
+
+DEFAULT_DECODING_OPTIONS = DecodingOptions()
+
+
+@lru_cache(maxsize=None)
+def generate_supports_temperature_fallback() -> bool:
+    """
+    当前安装的 transformers 中 Whisper 的 generate 是否支持温度回退
+    (temperature 序列和 compression_ratio_threshold / logprob_threshold，较早的版本没有这些参数)。
+    """
+    from transformers import WhisperForConditionalGeneration
+    parameters = inspect.signature(WhisperForConditionalGeneration.generate).parameters
+    return "compression_ratio_threshold" in parameters and "logprob_threshold" in parameters
+
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """语言代码或名称 (例如 "zh"、"Chinese"、"mandarin") 转换为语言代码；None / "" / "auto" 表示自动检测"""
+    if language is None:
+        return None
+    value = language.strip().lower()
+    if value in ("", "auto"):
+        return None
+    if value in LANGUAGES:
+        return value
+    if value in TO_LANGUAGE_CODE:
+        return TO_LANGUAGE_CODE[value]
+    raise ValueError(f"Unsupported language '{language}'.")
+
+
+def parse_temperature(value: Union[None, str, float, Sequence[float]]) -> Optional[Tuple[float, ...]]:
+    """温度可以是单个数值、数值序列或逗号分隔的字符串 (例如 "0,0.2,0.4")"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            temperatures = tuple(float(part) for part in value.split(","))
+        except ValueError:
+            raise ValueError(f"Invalid temperature '{value}'. Use a number or a comma-separated list.")
+    elif isinstance(value, (int, float)):
+        temperatures = (float(value),)
+    else:
+        temperatures = tuple(float(t) for t in value)
+    if not temperatures or any(not 0.0 <= t <= 1.0 for t in temperatures):
+        raise ValueError("Temperatures must be between 0 and 1.")
+    return temperatures
+
+
+def resolve_decoding_options(preset: Optional[str] = None, language: Optional[str] = None,
+                             task: Optional[str] = None, beam_size: Optional[int] = None,
+                             temperature: Union[None, str, float, Sequence[float]] = None,
+                             max_new_tokens: Optional[int] = None) -> DecodingOptions:
+    """
+    由预设 (DECODING_PRESETS) 和单独指定的参数得到解码参数，单独指定的参数优先；参数无效时抛出 ValueError。
+    """
+    values: Dict[str, Any] = {}
+    if preset:
+        if preset not in DECODING_PRESETS:
+            raise ValueError(f"Unknown preset '{preset}'. Available presets: {list(DECODING_PRESETS)}")
+        values.update(DECODING_PRESETS[preset])
+    if task is not None:
+        if task not in TASKS:
+            raise ValueError(f"Unsupported task '{task}'. Supported: {list(TASKS)}")
+        values["task"] = task
+    if beam_size is not None:
+        if not 1 <= beam_size <= DECODING_MAX_BEAM_SIZE:
+            raise ValueError(f"beam_size must be between 1 and {DECODING_MAX_BEAM_SIZE}.")
+        values["beam_size"] = beam_size
+    parsed_temperature = parse_temperature(temperature)
+    if parsed_temperature is not None:
+        values["temperature"] = parsed_temperature
+    if max_new_tokens is not None:
+        if not 1 <= max_new_tokens <= DECODING_MAX_NEW_TOKENS:
+            raise ValueError(f"max_new_tokens must be between 1 and {DECODING_MAX_NEW_TOKENS}.")
+        values["max_new_tokens"] = max_new_tokens
+    return DecodingOptions(language=normalize_language(language), **values)
@@ -0,0 +1,287 @@
+import io
+import re
+import zipfile
+from bisect import bisect_right
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+from xml.sax.saxutils import escape as xml_escape
+
+from fastapi.responses import StreamingResponse
+
+from app.core.config import EXPORT_CHUNK_BYTES
+from app.core.keyword_engine import PATTERN_SEPARATOR, ROLE_KEYWORD, ROLE_SEMANTIC
+
+# 转录结果的服务端导出: 直接由分段逐段生成 SRT / WebVTT / TXT / DOCX，
+# 每积累 EXPORT_CHUNK_BYTES 字节交出一块，供分块传输的响应使用，不需要先拼出整个文件。
+
+# 格式 -> (Content-Type, 文件扩展名)
+EXPORT_FORMATS = {
+    "srt": ("application/x-subrip; charset=utf-8", "srt"),
+    "vtt": ("text/vtt; charset=utf-8", "vtt"),
+    "txt": ("text/plain; charset=utf-8", "txt"),
+    "docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx"),
+}
+
+# 高亮的命中类型 -> 各格式的标记
+_SUBTITLE_TAGS = {ROLE_KEYWORD: ("<b>", "</b>"), ROLE_SEMANTIC: ("<i>", "</i>")}
+_VTT_TAGS = {ROLE_KEYWORD: ("<c.keyword>", "</c>"), ROLE_SEMANTIC: ("<c.semantic>", "</c>")}
+_TXT_TAGS = {ROLE_KEYWORD: ("【", "】"), ROLE_SEMANTIC: ("「", "」")}
+_DOCX_HIGHLIGHT = {ROLE_KEYWORD: "yellow", ROLE_SEMANTIC: "cyan"}
+
+# SRT 播放器把 "<...>" 当作 HTML 格式标签、把 "{\...}" 当作 ASS 覆盖标签: 尖括号按 VTT 的方式转义为实体，
+# 花括号换成全角字符
+_SRT_BRACES = str.maketrans({"{": "｛", "}": "｝"})
+
+# XML 1.0 不允许的控制字符
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# 高亮区间: (分段内起始, 分段内结束, 命中类型)
+Highlight = Tuple[int, int, str]
+
+
+def _segments(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """结果中的分段；没有分段的文本视为覆盖整段音频的一个分段"""
+    segments = [seg for seg in result.get("segments") or [] if seg.get("text")]
+    if not segments and result.get("text"):
+        segments = [{"start": 0.0, "end": result.get("duration") or 0.0, "text": result["text"]}]
+    return segments
+
+
+def _highlights(result: Dict[str, Any], segments: List[Dict[str, Any]]) -> List[List[Highlight]]:
+    """
+    把 keyword_matches (基于分段文本拼接后的全文位置) 分配到各分段。
+    只高亮连续的关键字和语义连接词；重叠时保留先出现的较长词条，位置与文本对不上的命中 (旧结果) 忽略。
+    """
+    offsets = []
+    position = 0
+    for seg in segments:
+        offsets.append(position)
+        position += len(seg["text"])
+    full_text = "".join(seg["text"] for seg in segments).lower()
+
+    candidates = sorted(
+        (m for m in result.get("keyword_matches") or []
+         if m.get("type") in (ROLE_KEYWORD, ROLE_SEMANTIC) and PATTERN_SEPARATOR not in m.get("term", "")),
+        key=lambda m: (m["start"], m["start"] - m["end"])
+    )
+    highlights: List[List[Highlight]] = [[] for _ in segments]
+    last_end = 0
+    for match in candidates:
+        start, end = match["start"], match["end"]
+        if start < last_end or full_text[start:end] != match["term"]:
+            continue
+        index = bisect_right(offsets, start) - 1
+        if end > offsets[index] + len(segments[index]["text"]):
+            continue  # 跨分段的命中不高亮
+        highlights[index].append((start - offsets[index], end - offsets[index], match["type"]))
+        last_end = end
+    return highlights
+
+
+def _markup(text: str, spans: List[Highlight], tags: Dict[str, Tuple[str, str]],
+            escape: Callable[[str], str] = lambda s: s) -> str:
+    parts = []
+    position = 0
+    for start, end, kind in spans:
+        open_tag, close_tag = tags[kind]
+        parts.append(escape(text[position:start]))
+        parts.append(open_tag + escape(text[start:end]) + close_tag)
+        position = end
+    parts.append(escape(text[position:]))
+    return "".join(parts).strip()
+
+
+def _timestamp(seconds: float, separator: str = ".", with_millis: bool = True) -> str:
+    millis = max(0, int(round(float(seconds) * 1000)))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    if not with_millis:
+        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def _chunked(pieces: Iterator[str]) -> Iterator[bytes]:
+    """把文本片段编码后按 EXPORT_CHUNK_BYTES 聚合成块"""
+    buffer: List[bytes] = []
+    size = 0
+    for piece in pieces:
+        data = piece.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _srt_escape(text: str) -> str:
+    return xml_escape(text).translate(_SRT_BRACES)
+
+
+def _iter_srt(result: Dict[str, Any]) -> Iterator[str]:
+    segments = _segments(result)
+    for number, (seg, spans) in enumerate(zip(segments, _highlights(result, segments)), 1):
+        text = _markup(seg["text"], spans, _SUBTITLE_TAGS, _srt_escape)
+        yield f"{number}\n{_timestamp(seg['start'], ',')} --> {_timestamp(seg['end'], ',')}\n{text}\n\n"
+
+
+def _iter_vtt(result: Dict[str, Any]) -> Iterator[str]:
+    yield "WEBVTT\n\n"
+    yield f"NOTE scene: {result.get('detected_scene', '通用')}\n\n"
+    segments = _segments(result)
+    for seg, spans in zip(segments, _highlights(result, segments)):
+        text = _markup(seg["text"], spans, _VTT_TAGS, xml_escape)
+        yield f"{_timestamp(seg['start'])} --> {_timestamp(seg['end'])}\n{text}\n\n"
+
+
+def _summary_lines(result: Dict[str, Any]) -> List[str]:
+    """导出文件末尾的场景、关键词和语义连接词汇总"""
+    lines = [f"场景: {result.get('detected_scene', '通用')}"]
+    keywords = result.get("found_keywords") or []
+    if keywords:
+        lines.append("关键词:")
+        lines.extend(f"{i}. {keyword}" for i, keyword in enumerate(keywords, 1))
+    semantics = {category: terms for category, terms in (result.get("found_semantics") or {}).items() if terms}
+    if semantics:
+        lines.append("语义连接词:")
+        lines.extend(f"  {category}: {'、'.join(terms)}" for category, terms in semantics.items())
+    return lines
+
+
+def _iter_txt(result: Dict[str, Any]) -> Iterator[str]:
+    yield "转录结果\n" + "=" * 20 + "\n\n"
+    segments = _segments(result)
+    for seg, spans in zip(segments, _highlights(result, segments)):
+        text = _markup(seg["text"], spans, _TXT_TAGS)
+        yield f"[{_timestamp(seg['start'], with_millis=False)} - {_timestamp(seg['end'], with_millis=False)}] {text}\n"
+    yield "\n" + "-" * 20 + "\n" + "\n".join(_summary_lines(result)) + "\n"
+
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+_DOCX_DOCUMENT_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+)
+_DOCX_DOCUMENT_END = '<w:sectPr/></w:body></w:document>'
+
+
+def _docx_run(text: str, properties: str = "") -> str:
+    text = xml_escape(_XML_INVALID.sub("", text))
+    rpr = f"<w:rPr>{properties}</w:rPr>" if properties else ""
+    return f'<w:r>{rpr}<w:t xml:space="preserve">{text}</w:t></w:r>'
+
+
+def _docx_paragraph(runs: List[str]) -> str:
+    return "<w:p>" + "".join(runs) + "</w:p>"
+
+
+def _docx_segment(seg: Dict[str, Any], spans: List[Highlight]) -> str:
+    text = seg["text"]
+    runs = [_docx_run(f"[{_timestamp(seg['start'], with_millis=False)}] ", '<w:color w:val="808080"/>')]
+    position = 0
+    for start, end, kind in spans:
+        runs.append(_docx_run(text[position:start]))
+        runs.append(_docx_run(text[start:end], f'<w:b/><w:highlight w:val="{_DOCX_HIGHLIGHT[kind]}"/>'))
+        position = end
+    runs.append(_docx_run(text[position:]))
+    return _docx_paragraph(runs)
+
+
+class _ChunkSink(io.RawIOBase):
+    """zipfile 的输出目标: 只能追加 (不可 seek)，写入的字节由生成器取走"""
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._size = 0
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    @property
+    def buffered(self) -> int:
+        return self._size
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks, self._size = [], 0
+        return data
+
+
+def _iter_docx(result: Dict[str, Any]) -> Iterator[bytes]:
+    """
+    DOCX 是 zip 包。输出目标不可 seek 时 zipfile 在每个文件的数据之后写入数据描述符，
+    document.xml 因此可以边压缩边输出，不必先在内存中生成完整文档。
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as package:
+        package.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        package.writestr("_rels/.rels", _DOCX_RELS)
+        with package.open("word/document.xml", "w") as document:
+            document.write(_DOCX_DOCUMENT_START.encode("utf-8"))
+            document.write(_docx_paragraph([_docx_run("转录结果", '<w:b/><w:sz w:val="32"/>')]).encode("utf-8"))
+            segments = _segments(result)
+            for seg, spans in zip(segments, _highlights(result, segments)):
+                document.write(_docx_segment(seg, spans).encode("utf-8"))
+                if sink.buffered >= EXPORT_CHUNK_BYTES:
+                    yield sink.take()
+            document.write(_docx_paragraph([]).encode("utf-8"))
+            for line in _summary_lines(result):
+                document.write(_docx_paragraph([_docx_run(line)]).encode("utf-8"))
+            document.write(_DOCX_DOCUMENT_END.encode("utf-8"))
+    yield sink.take()
+
+
+def iter_export(result: Dict[str, Any], fmt: str) -> Iterator[bytes]:
+    """按格式逐块生成导出文件的字节；不支持的格式抛出 ValueError"""
+    if fmt == "srt":
+        return _chunked(_iter_srt(result))
+    if fmt == "vtt":
+        return _chunked(_iter_vtt(result))
+    if fmt == "txt":
+        return _chunked(_iter_txt(result))
+    if fmt == "docx":
+        return _iter_docx(result)
+    raise ValueError(f"Unsupported export format '{fmt}'. Supported: {list(EXPORT_FORMATS)}")
+
+
+def export_headers(fmt: str, filename: Optional[str]) -> Dict[str, str]:
+    """附件下载的响应头；filename 不含扩展名，非 ASCII 字符按 RFC 5987 编码"""
+    name = f"{filename or 'transcript'}.{EXPORT_FORMATS[fmt][1]}"
+    fallback = re.sub(r'[^A-Za-z0-9._-]', "_", name)
+    return {"Content-Disposition": f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(name)}"}
+
+
+def export_response(result: Dict[str, Any], fmt: str, filename: Optional[str]) -> StreamingResponse:
+    """以分块传输返回导出文件；结果带有 cache_id 时放在响应头 X-Cache-Id 中，供之后重新导出"""
+    headers = export_headers(fmt, filename)
+    if result.get("cache_id"):
+        headers["X-Cache-Id"] = result["cache_id"]
+    return StreamingResponse(iter_export(result, fmt), media_type=EXPORT_FORMATS[fmt][0], headers=headers)
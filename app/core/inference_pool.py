@@ -0,0 +1,197 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from app.core.config import (
+    INFERENCE_MAX_WORKERS,
+    INFERENCE_MAX_QUEUE,
+    INFERENCE_TIMEOUT,
+    INFERENCE_RETRY_AFTER
+)
+from app.core.metrics import metrics
+
+
+class InferenceQueueFull(Exception):
+    """推理队列已满，请求未被接纳"""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceTimeout(Exception):
+    """请求在规定时间内没有拿到推理结果"""
+    def __init__(self, timeout: float):
+        super().__init__(f"Inference did not finish within {timeout:.0f}s")
+        self.timeout = timeout
+
+
+class _Admission:
+    """
+    一种推理后端 (本进程线程池或推理子进程池) 的准入计数: 已接纳但尚未结束的请求数不超过 workers + max_queue，
+    并记录推理耗时的指数滑动平均，用于估算 Retry-After。
+    """
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0  # 已接纳但尚未结束的请求数 (执行中 + 排队中)
+        self.avg_duration = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.pending - self.workers)
+
+    @property
+    def in_flight(self) -> int:
+        return min(self.pending, self.workers)
+
+    def retry_after(self) -> int:
+        # 以当前排队长度和平均推理耗时估算需要等待多久才会空出名额
+        estimate = self.avg_duration * (self.queue_depth + 1) / max(1, self.workers)
+        return max(INFERENCE_RETRY_AFTER, int(estimate + 0.5))
+
+    def acquire(self):
+        with self._lock:
+            if self.pending >= self.capacity:
+                raise InferenceQueueFull(self.retry_after())
+            self.pending += 1
+
+    def release(self, duration: float):
+        with self._lock:
+            self.pending -= 1
+            if duration > 0:
+                self.avg_duration = duration if self.avg_duration == 0 else 0.8 * self.avg_duration + 0.2 * duration
+
+
+class InferenceExecutor:
+    """
+    专用的推理执行器。
+
+    - 固定数量的工作线程执行阻塞的模型推理，事件循环只负责等待结果；
+    - 正在执行和排队的请求总数有上限，超出时立即拒绝 (InferenceQueueFull)；
+    - 每个请求有独立的超时时间 (InferenceTimeout)。超时后工作线程中的推理无法被中断，
+      它占用的名额会在推理真正结束时才释放，因此不会因超时而超卖并发。
+
+    挂接多进程推理池 (attach_process_pool) 后，run() 把任务发往推理子进程，并发上限为子进程数；
+    run_local() 始终在本进程的线程池中执行，用于无法跨进程传递的任务 (例如实时流式会话)。
+    两种后端各自计算名额、排队长度和 Retry-After，互不占用。
+    """
+    def __init__(self, max_workers: int = INFERENCE_MAX_WORKERS,
+                 max_queue: int = INFERENCE_MAX_QUEUE,
+                 timeout: float = INFERENCE_TIMEOUT):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="whisper-infer")
+        self._lock = threading.Lock()
+        self._thread_admission = _Admission(max_workers, max_queue)
+        self._process_admission: Optional[_Admission] = None
+        self._process_pool = None
+
+    def attach_process_pool(self, pool):
+        """之后的 run() 在推理子进程中执行，按子进程数单独计算名额"""
+        with self._lock:
+            self._process_pool = pool
+            self._process_admission = _Admission(pool.num_workers, self.max_queue)
+
+    @property
+    def uses_process_pool(self) -> bool:
+        return self._process_pool is not None
+
+    def _admissions(self):
+        admissions = [self._thread_admission]
+        if self._process_admission is not None:
+            admissions.append(self._process_admission)
+        return admissions
+
+    @property
+    def pending(self) -> int:
+        return sum(admission.pending for admission in self._admissions())
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(admission.queue_depth for admission in self._admissions())
+
+    @property
+    def in_flight(self) -> int:
+        return sum(admission.in_flight for admission in self._admissions())
+
+    @staticmethod
+    def _run(admission: _Admission, fn: Callable[..., Any], args, kwargs) -> Any:
+        start = time.time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            admission.release(time.time() - start)
+
+    def _submit_to_process_pool(self, pool, admission: _Admission, fn: Callable[..., Any], args, kwargs) -> "asyncio.Future":
+        start = time.time()
+        future = pool.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda _: admission.release(time.time() - start))
+        return asyncio.wrap_future(future)
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        执行 fn(*args, **kwargs) 并等待结果: 挂接了多进程推理池时在子进程中执行
+        (fn 和参数需要能被 pickle)，否则在推理线程池中执行。
+        """
+        with self._lock:
+            pool, admission = self._process_pool, self._process_admission
+        if pool is None:
+            return await self.run_local(fn, *args, timeout=timeout, **kwargs)
+        admission.acquire()
+        try:
+            future = self._submit_to_process_pool(pool, admission, fn, args, kwargs)
+        except Exception:
+            admission.release(0.0)
+            raise
+        try:
+            return await self._wait(future, timeout)
+        except BrokenProcessPool:
+            # 子进程异常退出后整个进程池不可用，之后的请求改在本进程的线程池中执行
+            print("ERROR: process inference pool is broken, falling back to in-process inference threads.")
+            with self._lock:
+                if self._process_pool is pool:
+                    self._process_pool = None
+                    self._process_admission = None
+            raise
+
+    async def run_local(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """在本进程的推理线程池中执行 fn(*args, **kwargs) 并等待结果"""
+        admission = self._thread_admission
+        admission.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, self._run, admission, fn, args, kwargs)
+        except Exception:
+            admission.release(0.0)
+            raise
+        return await self._wait(future, timeout)
+
+    async def _wait(self, future: "asyncio.Future", timeout: Optional[float]) -> Any:
+        wait_timeout = self.timeout if timeout is None else timeout
+        try:
+            # shield: 超时只放弃等待，不会取消已经开始的推理 (名额在推理结束时释放)
+            return await asyncio.wait_for(asyncio.shield(future), timeout=wait_timeout)
+        except asyncio.TimeoutError:
+            raise InferenceTimeout(wait_timeout)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait)
+
+
+inference_executor = InferenceExecutor()
+
+metrics.gauge("whisper_inference_queue_depth", "Requests admitted and waiting for an inference worker.",
+              lambda: inference_executor.queue_depth)
+metrics.gauge("whisper_inference_in_flight", "Requests currently being processed by inference workers.",
+              lambda: inference_executor.in_flight)
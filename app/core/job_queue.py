@@ -0,0 +1,357 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from app.core.config import (
+    JOBS_DIR,
+    JOB_DB_PATH,
+    JOB_WORKERS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    JOB_CALLBACK_TIMEOUT,
+    JOB_CALLBACK_ALLOWED_HOSTS,
+    JOB_INFERENCE_TIMEOUT
+)
+from app.core.inference_pool import inference_executor, InferenceQueueFull
+from app.core.model_registry import model_type_for, produced_by
+from app.core.result_cache import result_cache, make_cache_key
+from app.core.upload import SpooledAudio
+from app.core.whisper_handler import whisper_handler
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    audio_path TEXT,
+    filename TEXT,
+    content_hash TEXT NOT NULL,
+    scene TEXT,
+    model TEXT,
+    callback_url TEXT,
+    progress_seconds REAL NOT NULL DEFAULT 0,
+    duration_seconds REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+"""
+
+
+def validate_callback_url(url: Optional[str]) -> Optional[str]:
+    """回调地址只允许 http(s) 且主机在 JOB_CALLBACK_ALLOWED_HOSTS 中，否则抛出 ValueError"""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or parsed.hostname not in JOB_CALLBACK_ALLOWED_HOSTS:
+        raise ValueError(f"callback_url 只允许发往本机地址: {JOB_CALLBACK_ALLOWED_HOSTS}")
+    return url
+
+
+class JobStore:
+    """
+    基于 SQLite 的任务表。
+
+    所有写操作由同一把锁串行化；claim_next() 在一个事务内把最早的排队任务改为 running，
+    保证多个工作线程不会领取到同一个任务。
+    """
+    def __init__(self, db_path: Path = JOB_DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def create(self, audio_path: Path, filename: str, content_hash: str, scene: Optional[str],
+               model: Optional[str], callback_url: Optional[str]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, status, created_at, updated_at, audio_path, filename, content_hash, scene, model, callback_url) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, STATUS_QUEUED, now, now, str(audio_path), filename, content_hash, scene, model, callback_url)
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """领取最早的排队任务，状态改为 running 并累加执行次数"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (STATUS_QUEUED,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, progress_seconds = 0, updated_at = ? WHERE id = ?",
+                    (STATUS_RUNNING, time.time(), row["id"])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = dict(row)
+        job["status"] = STATUS_RUNNING
+        job["attempts"] += 1
+        return job
+
+    def update_progress(self, job_id: str, progress_seconds: float, duration_seconds: float):
+        self._execute(
+            "UPDATE jobs SET progress_seconds = ?, duration_seconds = ?, updated_at = ? WHERE id = ?",
+            (progress_seconds, duration_seconds, time.time(), job_id)
+        )
+
+    def succeed(self, job_id: str, result: Dict[str, Any]):
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?",
+            (STATUS_SUCCEEDED, json.dumps(result, ensure_ascii=False), time.time(), job_id)
+        )
+
+    def fail(self, job_id: str, error: str):
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (STATUS_FAILED, error, time.time(), job_id)
+        )
+
+    def recover(self, max_attempts: int = JOB_MAX_ATTEMPTS) -> List[Dict[str, Any]]:
+        """
+        服务启动时调用: 上次退出时仍在执行的任务重新排队；
+        已达到最大执行次数的任务标记为失败并返回，由调用方清理音频。
+        """
+        now = time.time()
+        with self._lock:
+            exhausted = [dict(row) for row in self._conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND attempts >= ?", (STATUS_RUNNING, max_attempts)
+            ).fetchall()]
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status = ? AND attempts >= ?",
+                (STATUS_FAILED, "任务执行期间服务多次重启，已放弃", now, STATUS_RUNNING, max_attempts)
+            )
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = ?, progress_seconds = 0, updated_at = ? WHERE status = ?",
+                (STATUS_QUEUED, now, STATUS_RUNNING)
+            ).rowcount
+        if requeued:
+            print(f"Requeued {requeued} unfinished transcription job(s).")
+        return exhausted
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_progress_stores: Dict[Any, JobStore] = {}
+_progress_lock = threading.Lock()
+
+
+def _progress_store(db_path: str) -> JobStore:
+    # 每个进程各自打开任务数据库 (SQLite 连接不能跨进程使用)，用于在推理子进程中直接写入进度
+    key = (os.getpid(), db_path)
+    with _progress_lock:
+        store = _progress_stores.get(key)
+        if store is None:
+            store = _progress_stores[key] = JobStore(Path(db_path))
+        return store
+
+
+def transcribe_job(job_id: str, db_path: str, audio_path: str, scene: Optional[str],
+                   model: Optional[str]) -> Dict[str, Any]:
+    """
+    在推理线程或推理子进程中转录一个任务的音频 (模块级函数，可被 pickle 发往推理子进程)。
+    解码进度直接写入任务数据库。
+    """
+    def on_progress(seconds_decoded: float, total_seconds: float):
+        _progress_store(db_path).update_progress(job_id, seconds_decoded, total_seconds)
+
+    return whisper_handler.transcribe(audio_path, requested_scene=scene, model_name=model,
+                                      progress_callback=on_progress)
+
+
+class JobManager:
+    """
+    异步转录任务: 提交后立即返回任务 ID，由后台工作线程依次执行。
+
+    任务状态、进度 (已解码的音频秒数) 和结果都保存在 JobStore 中，服务重启后未完成的任务会继续执行。
+    结果同样写入转录结果缓存，相同音频的任务和同步请求可以互相复用。
+    推理与同步请求一样经由 inference_executor 执行 (多进程模式下在推理子进程中)，受同一个准入上限约束；
+    推理队列已满时任务等待 Retry-After 后重试，不会失败。
+    """
+    def __init__(self, store: Optional[JobStore] = None, num_workers: int = JOB_WORKERS,
+                 audio_dir: Path = JOBS_DIR):
+        self._store = store
+        self.num_workers = num_workers
+        self.audio_dir = Path(audio_dir)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._workers: List[threading.Thread] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def store(self) -> JobStore:
+        # 延迟创建，导入本模块时不打开数据库
+        if self._store is None:
+            self._store = JobStore()
+        return self._store
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        启动工作线程。loop 为应用的事件循环，任务的推理以协程形式提交到该循环，与同步请求共用推理池；
+        未提供时每个任务在工作线程中用独立的事件循环执行。
+        """
+        if self._workers:
+            return
+        self._loop = loop
+        for job in self.store.recover():
+            self._remove_audio(job)
+        self._stopping.clear()
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout: float = 5.0):
+        """停止领取新任务；正在执行的任务在下次启动时重新执行"""
+        self._stopping.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+
+    def submit(self, upload: SpooledAudio, scene: Optional[str] = None, model: Optional[str] = None,
+               callback_url: Optional[str] = None) -> str:
+        """保存音频并创建任务，返回任务 ID"""
+        callback_url = validate_callback_url(callback_url)
+        audio_path = upload.persist(self.audio_dir)
+        try:
+            job_id = self.store.create(audio_path, upload.filename, upload.sha256, scene, model, callback_url)
+        except Exception:
+            upload.cleanup()
+            raise
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """任务的对外表示: 状态、进度，以及成功后的结果或失败原因"""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        duration = job["duration_seconds"]
+        info = {
+            "job_id": job["id"],
+            "status": job["status"],
+            "filename": job["filename"],
+            "scene": job["scene"],
+            "model": job["model"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "attempts": job["attempts"],
+            "progress": {
+                "seconds_decoded": round(job["progress_seconds"], 2),
+                "duration": round(duration, 2) if duration is not None else None,
+                "ratio": round(min(1.0, job["progress_seconds"] / duration), 4) if duration else 0.0
+            }
+        }
+        if job["status"] == STATUS_SUCCEEDED:
+            info["result"] = json.loads(job["result"])
+        elif job["status"] == STATUS_FAILED:
+            info["error"] = job["error"]
+        return info
+
+    # ---- 工作线程 ----
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.store.claim_next()
+            except Exception as e:
+                print(f"Job queue error: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        try:
+            model_name = whisper_handler.registry.resolve(job["model"])
+            key = make_cache_key(job["content_hash"], model_type_for(model_name), job["scene"])
+            coroutine = result_cache.get_or_compute_async(key, lambda: self._infer(job), produced_by(model_name))
+            if self._loop is not None:
+                result, cached = asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+            else:
+                result, cached = asyncio.run(coroutine)
+            if cached:
+                result = whisper_handler.refresh_analysis(result, job["scene"])
+            result = dict(result, cached=cached, cache_id=key)
+            if cached and result.get("duration") is not None:
+                self.store.update_progress(job_id, result["duration"], result["duration"])
+            self.store.succeed(job_id, result)
+            print(f"Job {job_id} finished.")
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.store.fail(job_id, str(e))
+        self._remove_audio(job)
+        self._notify(job_id, job["callback_url"])
+
+    async def _infer(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        while True:
+            try:
+                return await inference_executor.run(
+                    transcribe_job, job["id"], str(self.store.db_path), job["audio_path"], job["scene"], job["model"],
+                    timeout=JOB_INFERENCE_TIMEOUT
+                )
+            except InferenceQueueFull as e:
+                # 后台任务不拒绝，等待推理池空出名额
+                await asyncio.sleep(e.retry_after)
+
+    def _remove_audio(self, job: Dict[str, Any]):
+        if job.get("audio_path"):
+            Path(job["audio_path"]).unlink(missing_ok=True)
+
+    def _notify(self, job_id: str, callback_url: Optional[str]):
+        """任务结束后把任务信息 POST 到回调地址；回调失败只记录日志"""
+        if not callback_url:
+            return
+        body = json.dumps(self.get(job_id), ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            callback_url, data=body, method="POST",
+            headers={"Content-Type": "application/json; charset=utf-8"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=JOB_CALLBACK_TIMEOUT):
+                pass
+        except Exception as e:
+            print(f"Job {job_id} callback to {callback_url} failed: {e}")
+
+
+# 全局任务管理器，由应用的 lifespan 启动和停止
+job_manager = JobManager()
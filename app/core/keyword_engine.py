@@ -0,0 +1,596 @@
+# app/core/keyword_engine.py
+import hashlib
+import json
+import os
+import threading
+import math
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import KEYWORDS_CONFIG_PATH, KEYWORDS_RELOAD_INTERVAL, SCENE_TIMELINE_WINDOW_SECONDS
+from app.core.keywords import KEYWORDS_CONFIG
+
+# 不连续模式 ("虽然...但是...") 中相邻两部分之间允许间隔的最大字符数
+DEFAULT_MAX_GAP = 50
+
+PATTERN_SEPARATOR = "..."
+
+# 词条在词库中的角色: (类型, 所属场景或语义类别)
+ROLE_KEYWORD = "keyword"
+ROLE_INDICATOR = "indicator"
+ROLE_SEMANTIC = "semantic"
+
+BUILTIN_SOURCE = "builtin"
+
+# 场景时间线中一个场景指示词相当于几个场景关键字
+TIMELINE_INDICATOR_WEIGHT = 3
+
+# 一次命中: (模式编号, 起始, 结束, 分段序号, 时间)；整段文本分析时分段序号和时间为 None
+Hit = Tuple[int, int, int, Optional[int], Optional[float]]
+
+
+class KeywordConfigError(ValueError):
+    """词库文件无法读取或结构不正确"""
+
+
+def validate_keywords_config(config: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    检查词库结构: {场景名: {"关键字": [...], "场景指示词": [...], "语义连接词": {类别: [...]}}}，
+    各字段都可省略。结构不正确时抛出 KeywordConfigError。
+    """
+    if not isinstance(config, dict) or not config:
+        raise KeywordConfigError("Keyword config must be a non-empty mapping of scene name to scene data")
+    for scene_name, scene_data in config.items():
+        if not isinstance(scene_name, str) or not isinstance(scene_data, dict):
+            raise KeywordConfigError(f"Scene {scene_name!r} must map to an object")
+        for field in ("关键字", "场景指示词"):
+            terms = scene_data.get(field, [])
+            if not isinstance(terms, list) or not all(isinstance(t, str) for t in terms):
+                raise KeywordConfigError(f"{scene_name}.{field} must be a list of strings")
+        semantics = scene_data.get("语义连接词", {})
+        if not isinstance(semantics, dict) or not all(
+            isinstance(terms, list) and all(isinstance(t, str) for t in terms) for terms in semantics.values()
+        ):
+            raise KeywordConfigError(f"{scene_name}.语义连接词 must map category names to lists of strings")
+    return config
+
+
+def config_version(config: Dict[str, Dict[str, Any]]) -> str:
+    """词库内容的摘要，内容相同的词库版本相同"""
+    canonical = json.dumps(config, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+def load_keywords_file(path: Path) -> Dict[str, Dict[str, Any]]:
+    """读取 JSON 或 YAML (需要 PyYAML) 格式的词库文件"""
+    path = Path(path)
+    try:
+        text = path.read_text(encoding="utf-8")
+    except OSError as e:
+        raise KeywordConfigError(f"Cannot read keyword config {path}: {e}")
+    if path.suffix.lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise KeywordConfigError(f"PyYAML is required to load {path} (pip install pyyaml)")
+        try:
+            config = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise KeywordConfigError(f"Invalid YAML in {path}: {e}")
+    else:
+        try:
+            config = json.loads(text)
+        except ValueError as e:
+            raise KeywordConfigError(f"Invalid JSON in {path}: {e}")
+    return validate_keywords_config(config)
+
+
+class AhoCorasick:
+    """多模式字符串匹配自动机，一次扫描找出文本中所有词条的出现位置"""
+    def __init__(self, words: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self.words = list(words)
+        for word_id, word in enumerate(self.words):
+            self._add(word, word_id)
+        self._build()
+
+    def _add(self, word: str, word_id: int):
+        node = 0
+        for ch in word:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(word_id)
+
+    def _build(self):
+        q = deque(self._goto[0].values())
+        while q:
+            node = q.popleft()
+            for ch, nxt in self._goto[node].items():
+                q.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fail_target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = fail_target if fail_target != nxt else 0
+                # 合并失败链上的输出，扫描时不必再沿失败链回溯
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str):
+        """逐个产出 (起始位置, 结束位置, 词条编号)"""
+        goto, fail, out, words = self._goto, self._fail, self._out, self.words
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for word_id in out[node]:
+                yield i + 1 - len(words[word_id]), i + 1, word_id
+
+
+class KeywordEngine:
+    """
+    由 KEYWORDS_CONFIG 预编译的关键字分析引擎。
+
+    所有场景的关键字、场景指示词和通用语义连接词在构造时编译进同一个 Aho-Corasick 自动机，
+    analyze() 只扫描一遍文本就能同时得到场景得分、关键字、语义连接词及其出现位置。
+    含 "..." 的词条 (如 "虽然...但是...") 被拆成多个片段，各片段按顺序出现且相邻间隔
+    不超过 max_gap 个字符时视为匹配。
+
+    构造完成后不再修改，可以在多个线程间共享；词库变化时构造新的实例整体替换 (见 KeywordConfigStore)。
+    """
+    def __init__(self, config: Dict[str, Dict[str, Any]] = KEYWORDS_CONFIG, max_gap: int = DEFAULT_MAX_GAP,
+                 version: Optional[str] = None):
+        self.max_gap = max_gap
+        self.version = version or config_version(config)
+        self.scenes: Tuple[str, ...] = tuple(name for name in config if name != "通用")
+        # 每个模式: (小写词条, 片段元组, 角色列表)
+        self._patterns: List[Tuple[str, Tuple[str, ...], List[Tuple[str, str]]]] = []
+        self._pattern_index: Dict[str, int] = {}
+
+        for scene_name, scene_data in config.items():
+            for kw in scene_data.get("关键字", []):
+                self._register(kw, (ROLE_KEYWORD, scene_name))
+            if scene_name != "通用":
+                for indicator in scene_data.get("场景指示词", []):
+                    self._register(indicator, (ROLE_INDICATOR, scene_name))
+        # 与 get_all_semantic_keywords_with_category 保持一致: 语义连接词取自"通用"场景
+        generic_semantics = config.get("通用", {}).get("语义连接词", {})
+        if isinstance(generic_semantics, dict):
+            for category, kws in generic_semantics.items():
+                for kw in kws:
+                    self._register(kw, (ROLE_SEMANTIC, category))
+
+        # 编译完成后冻结角色列表
+        self._patterns = [(term, parts, tuple(roles)) for term, parts, roles in self._patterns]
+
+        # 片段 -> [(模式编号, 片段序号)]
+        fragments: Dict[str, List[Tuple[int, int]]] = {}
+        for pattern_id, (_, parts, _) in enumerate(self._patterns):
+            for part_idx, part in enumerate(parts):
+                fragments.setdefault(part, []).append((pattern_id, part_idx))
+        self._fragment_words = list(fragments)
+        self._fragment_targets = [fragments[word] for word in self._fragment_words]
+        self._automaton = AhoCorasick(self._fragment_words)
+        # 一个匹配最多能跨越的字符数减一: 增量分析时与下一分段一起重新扫描的上文长度
+        self.context_chars = max(
+            (sum(len(p) for p in parts) + max_gap * (len(parts) - 1) - 1 for _, parts, _ in self._patterns),
+            default=0
+        )
+
+    def _register(self, term: str, role: Tuple[str, str]):
+        term = term.lower().strip()
+        parts = tuple(p for p in term.split(PATTERN_SEPARATOR) if p)
+        if not parts:
+            return
+        pattern_id = self._pattern_index.get(term)
+        if pattern_id is None:
+            pattern_id = len(self._patterns)
+            self._pattern_index[term] = pattern_id
+            self._patterns.append((term, parts, []))
+        roles = self._patterns[pattern_id][2]
+        if role not in roles:
+            roles.append(role)
+
+    def _match_sequence(self, occurrences: List[List[Tuple[int, int]]]) -> List[Tuple[int, int]]:
+        """匹配不连续模式: occurrences[k] 为第 k 个片段的所有 (起始, 结束) 位置 (已按起始位置排序)"""
+        starts = [[start for start, _ in occ] for occ in occurrences]
+        spans = []
+        last_end = -1
+        for first_start, first_end in occurrences[0]:
+            if first_start < last_end:
+                continue  # 不与上一个匹配重叠
+            cur_end = first_end
+            for k in range(1, len(occurrences)):
+                j = bisect_left(starts[k], cur_end)
+                if j == len(starts[k]) or starts[k][j] - cur_end > self.max_gap:
+                    break
+                cur_end = occurrences[k][j][1]
+            else:
+                spans.append((first_start, cur_end))
+                last_end = cur_end
+        return spans
+
+    def scan(self, text: str) -> Dict[int, List[Tuple[int, int]]]:
+        """扫描文本，返回 {模式编号: [(起始, 结束), ...]}，位置基于小写化后的文本"""
+        lower_text = text.lower()
+        fragment_hits: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        for start, end, word_id in self._automaton.iter_matches(lower_text):
+            for target in self._fragment_targets[word_id]:
+                fragment_hits.setdefault(target, []).append((start, end))
+
+        spans: Dict[int, List[Tuple[int, int]]] = {}
+        for (pattern_id, part_idx), hits in fragment_hits.items():
+            if part_idx != 0:
+                continue
+            parts = self._patterns[pattern_id][1]
+            if len(parts) == 1:
+                spans[pattern_id] = hits
+                continue
+            occurrences = [fragment_hits.get((pattern_id, k)) for k in range(len(parts))]
+            if any(not occ for occ in occurrences):
+                continue
+            matched = self._match_sequence([sorted(occ) for occ in occurrences])
+            if matched:
+                spans[pattern_id] = matched
+        return spans
+
+    def _scene_scores(self, pattern_ids) -> Counter:
+        """各场景命中的不同指示词个数"""
+        scene_scores: Counter = Counter()
+        for pattern_id in pattern_ids:
+            for role_type, label in self._patterns[pattern_id][2]:
+                if role_type == ROLE_INDICATOR and label in self.scenes:
+                    scene_scores[label] += 1
+        return scene_scores
+
+    def top_scene(self, scene_scores: Counter, default: Optional[str] = "通用") -> Optional[str]:
+        """得分最高的场景；得分相同时取词库中靠前的场景"""
+        best = default
+        for scene in self.scenes:
+            if scene_scores.get(scene, 0) > scene_scores.get(best, 0):
+                best = scene
+        return best
+
+    def summarize(self, hits: List[Hit], scene_scores: Counter,
+                  requested_scene: Optional[str] = None) -> Dict[str, Any]:
+        """由命中列表和场景得分组装分析结果 (字段见 analyze)"""
+        if requested_scene and requested_scene != "auto":
+            final_scene = requested_scene
+        else:
+            final_scene = self.top_scene(scene_scores)
+
+        # 关键字和语义连接词按首次出现的位置排列
+        first_seen: Dict[int, int] = {}
+        for pattern_id, start, _, _, _ in hits:
+            if pattern_id not in first_seen or start < first_seen[pattern_id]:
+                first_seen[pattern_id] = start
+        keywords: List[str] = []
+        semantics: Dict[str, List[str]] = {}
+        relevant = set()
+        for pattern_id in sorted(first_seen, key=first_seen.get):
+            term, _, roles = self._patterns[pattern_id]
+            for role_type, label in roles:
+                if role_type == ROLE_KEYWORD and label != final_scene:
+                    continue
+                if role_type == ROLE_KEYWORD:
+                    keywords.append(term)
+                elif role_type == ROLE_SEMANTIC:
+                    semantics.setdefault(label, []).append(term)
+                relevant.add((pattern_id, role_type, label))
+
+        matches: List[Dict[str, Any]] = []
+        for pattern_id, start, end, segment, timestamp in hits:
+            term, _, roles = self._patterns[pattern_id]
+            for role_type, label in roles:
+                if (pattern_id, role_type, label) not in relevant:
+                    continue
+                match = {"term": term, "type": role_type, "label": label, "start": start, "end": end}
+                if segment is not None:
+                    match["segment"] = segment
+                    match["time"] = timestamp
+                matches.append(match)
+        matches.sort(key=lambda m: (m["start"], m["end"]))
+
+        return {
+            "scene": final_scene,
+            "scene_scores": {scene: scene_scores[scene] for scene in self.scenes if scene_scores.get(scene)},
+            "keywords": keywords,
+            "semantics": semantics,
+            "matches": matches,
+            "version": self.version
+        }
+
+    def analyze(self, text: str, requested_scene: Optional[str] = None) -> Dict[str, Any]:
+        """
+        一次扫描完成场景判断、关键字和语义连接词查找。
+
+        返回:
+            - scene: 最终场景 (requested_scene 优先，否则按场景指示词自动判断，默认 "通用")
+            - scene_scores: 各场景命中的不同指示词个数
+            - keywords: 最终场景下命中的关键字
+            - semantics: 按类别组织的语义连接词
+            - matches: 所有相关命中的位置 [{"term", "type", "label", "start", "end"}]
+            - version: 产生本结果的词库版本
+        """
+        spans = self.scan(text)
+        hits = [(pattern_id, start, end, None, None) for pattern_id, found in spans.items() for start, end in found]
+        return self.summarize(hits, self._scene_scores(spans), requested_scene)
+
+    def incremental(self) -> "IncrementalAnalysis":
+        """创建逐段分析的累加器，见 IncrementalAnalysis"""
+        return IncrementalAnalysis(self)
+
+    @property
+    def pattern_count(self) -> int:
+        return len(self._patterns)
+
+
+class IncrementalAnalysis:
+    """
+    逐段累积的关键字/场景分析。
+
+    每产生一个分段就调用 add_segment()，只扫描新分段 (加上一小段上文，以便找到跨分段边界的词条)，
+    命中和各场景的指示词得分累加在计数器中，转录结束时 result() 不再扫描全文。
+    每个命中记录所在的分段序号和按分段内字符位置估算的时间；timeline() 按时间窗口给出场景标签。
+    命中位置基于各分段文本依次拼接后的全文，与整段调用 analyze() 的结果一致。
+    """
+    def __init__(self, engine: KeywordEngine):
+        self.engine = engine
+        self.hits: List[Hit] = []
+        self.segments: List[Tuple[float, float]] = []
+        self._offsets: List[int] = []        # 各分段在全文中的起始位置
+        self._lengths: List[int] = []
+        self._length = 0
+        self._context = ""                   # 上一分段末尾的文本，与下一分段一起扫描
+        self._last_end: Dict[int, int] = {}  # 不连续模式上一次匹配的结束位置，避免跨分段的重叠匹配
+        self._indicators: Dict[str, set] = {}
+        self.scene_scores: Counter = Counter()
+
+    @property
+    def version(self) -> str:
+        return self.engine.version
+
+    @property
+    def scene(self) -> str:
+        """按目前为止的指示词得分自动判断的场景"""
+        return self.engine.top_scene(self.scene_scores)
+
+    def _locate(self, position: int) -> Tuple[int, float]:
+        """全文中的字符位置 -> (分段序号, 按字符位置在分段内线性插值的时间)"""
+        index = max(0, bisect_right(self._offsets, position) - 1)
+        seg_start, seg_end = self.segments[index]
+        length = self._lengths[index]
+        fraction = min(1.0, (position - self._offsets[index]) / length) if length else 0.0
+        return index, round(seg_start + fraction * (seg_end - seg_start), 2)
+
+    def add_segment(self, text: str, start: float = 0.0, end: float = 0.0) -> List[Hit]:
+        """追加一个分段 (start/end 为秒)，返回该分段新产生的命中"""
+        self.segments.append((start, end))
+        self._offsets.append(self._length)
+        self._lengths.append(len(text))
+        window = self._context + text
+        base = self._length - len(self._context)
+        patterns = self.engine._patterns
+        new_hits: List[Hit] = []
+        for pattern_id, spans in self.engine.scan(window).items():
+            multipart = len(patterns[pattern_id][1]) > 1
+            for span_start, span_end in spans:
+                # 完全落在上文中的匹配在上一分段中已经记录
+                if span_end <= len(self._context):
+                    continue
+                span_start, span_end = span_start + base, span_end + base
+                if multipart:
+                    if span_start < self._last_end.get(pattern_id, 0):
+                        continue
+                    self._last_end[pattern_id] = span_end
+                segment, timestamp = self._locate(span_start)
+                new_hits.append((pattern_id, span_start, span_end, segment, timestamp))
+                for role_type, label in patterns[pattern_id][2]:
+                    if role_type == ROLE_INDICATOR and label in self.engine.scenes:
+                        seen = self._indicators.setdefault(label, set())
+                        if pattern_id not in seen:
+                            seen.add(pattern_id)
+                            self.scene_scores[label] += 1
+        self.hits.extend(new_hits)
+        self._length += len(text)
+        if self.engine.context_chars:
+            self._context = window[-self.engine.context_chars:]
+        return new_hits
+
+    def result(self, requested_scene: Optional[str] = None, hits: Optional[List[Hit]] = None) -> Dict[str, Any]:
+        """
+        目前为止的分析结果 (字段同 KeywordEngine.analyze，matches 中另有 segment 和 time)。
+        hits 只汇总指定的命中 (例如 add_segment 刚返回的)，场景仍按全部分段判断。
+        """
+        return self.engine.summarize(self.hits if hits is None else hits, self.scene_scores, requested_scene)
+
+    def timeline(self, window_seconds: float = SCENE_TIMELINE_WINDOW_SECONDS) -> List[Dict[str, Any]]:
+        """
+        按时间窗口给出场景标签 [{"start", "end", "scene", "scores"}]，相邻且场景相同的窗口合并。
+        窗口得分 = 窗口内不同场景指示词个数 x TIMELINE_INDICATOR_WEIGHT + 不同场景关键字个数；
+        没有任何证据的窗口沿用前一个窗口的场景 (开头的窗口使用整体判断的场景)。
+        """
+        if not self.segments or window_seconds <= 0:
+            return []
+        duration = max(end for _, end in self.segments)
+        count = max(1, math.ceil(duration / window_seconds))
+        window_scores = [Counter() for _ in range(count)]
+        counted = [set() for _ in range(count)]
+        for pattern_id, _, _, _, timestamp in self.hits:
+            w = min(int(timestamp // window_seconds), count - 1)
+            for role_type, label in self.engine._patterns[pattern_id][2]:
+                if role_type not in (ROLE_INDICATOR, ROLE_KEYWORD) or label not in self.engine.scenes:
+                    continue
+                if (pattern_id, role_type, label) in counted[w]:
+                    continue
+                counted[w].add((pattern_id, role_type, label))
+                window_scores[w][label] += TIMELINE_INDICATOR_WEIGHT if role_type == ROLE_INDICATOR else 1
+
+        timeline: List[Dict[str, Any]] = []
+        scene = self.scene
+        for w, scores in enumerate(window_scores):
+            scene = self.engine.top_scene(scores, default=scene)
+            start, end = round(w * window_seconds, 2), round(min((w + 1) * window_seconds, duration), 2)
+            if timeline and timeline[-1]["scene"] == scene:
+                timeline[-1]["end"] = end
+                timeline[-1]["scores"].update(scores)
+            else:
+                timeline.append({"start": start, "end": end, "scene": scene, "scores": Counter(scores)})
+        for span in timeline:
+            span["scores"] = dict(span["scores"])
+        return timeline
+
+
+class KeywordConfigStore:
+    """
+    持有当前生效的 KeywordEngine。
+
+    词库文件存在时从文件编译，否则使用内置的 KEYWORDS_CONFIG。每次取用引擎时，若距上次检查
+    已超过 check_interval 秒，就检查文件的修改时间和大小，变化后重新编译并整体替换引用：
+    正在使用旧引擎的请求不受影响，新请求使用新引擎。新词库有错误时继续使用旧引擎。
+    检查发生在各自的进程内，多进程推理池的子进程同样会跟随文件更新。
+    """
+    def __init__(self, path: Optional[Path] = KEYWORDS_CONFIG_PATH,
+                 check_interval: float = KEYWORDS_RELOAD_INTERVAL,
+                 default_config: Dict[str, Dict[str, Any]] = KEYWORDS_CONFIG):
+        self.path = Path(path) if path else None
+        self.check_interval = check_interval
+        self.default_config = default_config
+        self._lock = threading.Lock()
+        self._engine: Optional[KeywordEngine] = None
+        self._source = BUILTIN_SOURCE
+        self._file_state: Optional[Tuple[int, int]] = None
+        self._loaded_at = 0.0
+        self._next_check = 0.0
+        self.last_error: Optional[str] = None
+        try:
+            self.reload()
+        except KeywordConfigError as e:
+            # 启动时词库文件有错误: 先使用内置词库，修正文件后自动加载
+            print(f"Keyword config error, using built-in keywords: {e}")
+            self.last_error = str(e)
+            self._install(KeywordEngine(default_config), BUILTIN_SOURCE, self._stat())
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        if self.path is None:
+            return None
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _install(self, engine: KeywordEngine, source: str, file_state: Optional[Tuple[int, int]]):
+        # 单次引用赋值，读取方要么拿到旧引擎，要么拿到新引擎
+        self._engine = engine
+        self._source = source
+        self._file_state = file_state
+        self._loaded_at = time.time()
+        self._next_check = time.monotonic() + self.check_interval
+
+    def reload(self) -> KeywordEngine:
+        """立即从文件 (不存在时为内置词库) 重新编译；文件有错误时抛出 KeywordConfigError 并保留当前引擎"""
+        with self._lock:
+            file_state = self._stat()
+            if file_state is None:
+                config, source = self.default_config, BUILTIN_SOURCE
+            else:
+                try:
+                    config, source = load_keywords_file(self.path), str(self.path)
+                except KeywordConfigError:
+                    # 错误的文件不再反复解析，直到再次修改
+                    self._file_state = file_state
+                    self._next_check = time.monotonic() + self.check_interval
+                    raise
+            version = config_version(config)
+            if self._engine is not None and self._engine.version == version:
+                engine = self._engine
+            else:
+                engine = KeywordEngine(config, version=version)
+                if self._engine is not None:
+                    print(f"Keyword config reloaded from {source}: version {self._engine.version} -> {version}")
+            self._install(engine, source, file_state)
+            self.last_error = None
+            return engine
+
+    def update(self, config: Dict[str, Any]) -> KeywordEngine:
+        """校验新词库，原子地写入词库文件 (先写临时文件再替换) 并立即生效"""
+        validate_keywords_config(config)
+        if self.path is None:
+            raise KeywordConfigError("No keyword config path is configured")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        if self.path.suffix.lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise KeywordConfigError(f"PyYAML is required to write {self.path} (pip install pyyaml)")
+            text = yaml.safe_dump(config, allow_unicode=True, sort_keys=False)
+        else:
+            text = json.dumps(config, ensure_ascii=False, indent=2)
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, self.path)
+        return self.reload()
+
+    def _maybe_reload(self):
+        if time.monotonic() < self._next_check:
+            return
+        # 只由一个线程检查文件，其余线程直接使用当前引擎
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            changed = self._stat() != self._file_state
+        finally:
+            self._lock.release()
+        if changed:
+            try:
+                self.reload()
+            except KeywordConfigError as e:
+                print(f"Keyword config reload failed, keeping version {self._engine.version}: {e}")
+                self.last_error = str(e)
+
+    @property
+    def current(self) -> KeywordEngine:
+        """当前生效的引擎；一次分析应只取用一次，保证结果来自同一版本的词库"""
+        self._maybe_reload()
+        return self._engine
+
+    @property
+    def version(self) -> str:
+        return self.current.version
+
+    def analyze(self, text: str, requested_scene: Optional[str] = None) -> Dict[str, Any]:
+        return self.current.analyze(text, requested_scene=requested_scene)
+
+    def info(self) -> Dict[str, Any]:
+        engine = self.current
+        return {
+            "version": engine.version,
+            "source": self._source,
+            "path": str(self.path) if self.path else None,
+            "loaded_at": self._loaded_at,
+            "scenes": list(engine.scenes),
+            "patterns": engine.pattern_count,
+            "reload_interval": self.check_interval,
+            "last_error": self.last_error
+        }
+
+
+keyword_engine = KeywordConfigStore()
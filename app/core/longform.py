@@ -0,0 +1,140 @@
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+# 长音频分窗转录的工具函数
+# Whisper 的输入固定为 30 秒，长音频按带重叠的窗口切分后分别解码，
+# 再根据重叠区域去除相邻窗口之间重复的文本。
+
+
+def split_windows(num_samples: int, sampling_rate: int, chunk_seconds: float, overlap_seconds: float) -> List[Tuple[int, int]]:
+    """把 [0, num_samples) 切成长度为 chunk_seconds、相邻重叠 overlap_seconds 的窗口 (单位: 采样点)"""
+    chunk = int(chunk_seconds * sampling_rate)
+    overlap = int(overlap_seconds * sampling_rate)
+    if chunk <= 0:
+        raise ValueError("chunk_seconds must be positive")
+    if not 0 <= overlap < chunk:
+        raise ValueError("overlap_seconds must be in [0, chunk_seconds)")
+    if num_samples <= chunk:
+        return [(0, num_samples)]
+
+    step = chunk - overlap
+    windows = []
+    start = 0
+    while True:
+        end = min(start + chunk, num_samples)
+        windows.append((start, end))
+        if end >= num_samples:
+            break
+        start += step
+    return windows
+
+
+def _dedupe_overlap(prev_text: str, cur_text: str, max_chars: int, min_match: int = 4,
+                    min_ratio: float = 0.8, edge_slack: int = 3) -> Tuple[str, str]:
+    """
+    去除前一窗口结尾和当前窗口开头之间被重复转录的重叠内容，返回 (裁剪后的前一段文本, 裁剪后的当前文本)。
+
+    重叠区域的文本必须位于前一段的末尾和当前段的开头: 对齐区域在前一段中之后、在当前段中之前
+    最多各有 edge_slack 个字符 (窗口边缘被截断的半个字词)，整个区域不超过 max_chars，
+    对齐区域中相同的字符不少于 min_match 个且相似度不低于 min_ratio。
+    找不到这样的对齐时 (例如两段只是碰巧含有相同的词) 两段文本都原样返回。
+    """
+    if not prev_text or not cur_text:
+        return prev_text, cur_text
+    tail_start = max(0, len(prev_text) - max_chars)
+    tail = prev_text[tail_start:]
+    head = cur_text[:max_chars]
+    blocks = [b for b in SequenceMatcher(None, tail, head, autojunk=False).get_matching_blocks() if b.size]
+
+    best = None  # (相同字符数, 最后一个块)
+    for k, last in enumerate(blocks):
+        if len(tail) - (last.a + last.size) > edge_slack:
+            continue
+        # 从最后一个块向前累加，直到当前段中的起点足够靠近开头
+        matched = 0
+        for first in reversed(blocks[:k + 1]):
+            matched += first.size
+            if first.b > edge_slack:
+                continue
+            region = (last.a + last.size - first.a) + (last.b + last.size - first.b)
+            if matched >= min_match and 2 * matched / region >= min_ratio and (best is None or matched > best[0]):
+                best = (matched, last)
+    if best is None:
+        return prev_text, cur_text
+    last = best[1]
+    # 重复内容保留在前一段中，前一段在对齐区域之后的多余尾巴 (通常是窗口边缘被截断的半句) 丢弃
+    new_prev = prev_text[:tail_start + last.a + last.size]
+    new_cur = cur_text[last.b + last.size:]
+    return new_prev, new_cur
+
+
+class WindowMerger:
+    """
+    逐个窗口合并解码文本的增量版本 (见 merge_windows)。
+    每个窗口的文本按顺序交给 add()；一个分段在下一个窗口到来、去除重叠之后才不再变化，
+    add() 返回此时已确定的分段，finish() 返回最后剩余的分段。空文本的分段不返回，编号连续。
+    """
+    def __init__(self, windows: List[Tuple[int, int]], sampling_rate: int, overlap_seconds: float):
+        self.windows = windows
+        self.sampling_rate = sampling_rate
+        # 重叠区域最多能容纳的字符数 (中文语速按每秒约 8 字估算，留出余量)
+        self.max_overlap_chars = max(8, int(overlap_seconds * 10))
+        self._added = 0
+        self._pending: Optional[Dict[str, Any]] = None
+        self._next_id = 0
+
+    def _span(self, i: int) -> Tuple[float, float]:
+        """窗口 i "独占" 的时间区域: 与相邻窗口的重叠部分各分一半"""
+        start, end = self.windows[i]
+        seg_start = start / self.sampling_rate
+        seg_end = end / self.sampling_rate
+        if i > 0:
+            prev_end = self.windows[i - 1][1]
+            if prev_end > start:
+                seg_start = (start + prev_end) / 2 / self.sampling_rate
+        if i + 1 < len(self.windows):
+            next_start = self.windows[i + 1][0]
+            if next_start < end:
+                seg_end = (next_start + end) / 2 / self.sampling_rate
+        return seg_start, seg_end
+
+    def _release(self) -> List[Dict[str, Any]]:
+        segment, self._pending = self._pending, None
+        if segment is None or not segment["text"]:
+            return []
+        segment["id"] = self._next_id
+        self._next_id += 1
+        return [segment]
+
+    def add(self, text: str) -> List[Dict[str, Any]]:
+        """加入下一个窗口的文本，返回因此确定的分段"""
+        seg_start, seg_end = self._span(self._added)
+        self._added += 1
+        text = (text or "").strip()
+        if self._pending is not None:
+            self._pending["text"], text = _dedupe_overlap(self._pending["text"], text, self.max_overlap_chars)
+        finished = self._release()
+        self._pending = {
+            "id": 0,
+            "start": round(seg_start, 2),
+            "end": round(seg_end, 2),
+            "text": text
+        }
+        return finished
+
+    def finish(self) -> List[Dict[str, Any]]:
+        return self._release()
+
+
+def merge_windows(windows: List[Tuple[int, int]], texts: List[str], sampling_rate: int,
+                  overlap_seconds: float) -> List[Dict[str, Any]]:
+    """
+    把各窗口的解码文本合并成带时间戳的分段。
+    每个窗口的分段时间取该窗口"独占"的区域: 与相邻窗口的重叠部分各分一半。
+    """
+    merger = WindowMerger(windows, sampling_rate, overlap_seconds)
+    segments: List[Dict[str, Any]] = []
+    for text in texts[:len(windows)]:
+        segments.extend(merger.add(text))
+    segments.extend(merger.finish())
+    return segments
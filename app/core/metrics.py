@@ -0,0 +1,297 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 默认的耗时分桶 (秒)，覆盖从毫秒级的关键字分析到数分钟的长音频转录
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+TOKEN_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """取值在导出时由回调函数给出: 回调返回一个数值，或 {标签值元组: 数值} 字典"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], object], labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Failed to collect metric {self.name}: {e}")
+            return []
+        values = value if isinstance(value, dict) else {(): value}
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in sorted(values.items()) if v is not None
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各分桶计数 (不累计), 总和, 样本数]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def means(self) -> Dict[LabelValues, float]:
+        """各标签组合的平均值"""
+        with self._lock:
+            return {key: total / n for key, (_, total, n) in self._series.items() if n}
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*counts], total, n)) for key, (counts, total, n) in self._series.items())
+        lines = self.header()
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class MetricsRegistry:
+    """进程内的指标集合，以 Prometheus 文本格式导出"""
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], object], labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, fn, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes() -> Optional[int]:
+    """当前进程的常驻内存 (RSS)；不支持 /proc 的平台返回历史峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 上单位为 KB，macOS 上为字节
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+metrics = MetricsRegistry()
+
+# 各处理阶段的耗时: upload_receive / disk_spool / audio_decode / vad / feature_extraction /
+# encoder / decoder / keyword_analysis
+STAGE_SECONDS = metrics.histogram(
+    "whisper_stage_duration_seconds", "Duration of each transcription stage in seconds.", ["stage"]
+)
+REQUEST_SECONDS = metrics.histogram(
+    "whisper_http_request_duration_seconds", "HTTP request duration in seconds.", ["handler", "method", "status"]
+)
+REAL_TIME_FACTOR = metrics.histogram(
+    "whisper_real_time_factor", "Processing time divided by audio duration.", ["model_type"], buckets=RTF_BUCKETS
+)
+AUDIO_SECONDS = metrics.counter(
+    "whisper_audio_seconds_total", "Seconds of audio transcribed.", ["model_type"]
+)
+MODEL_LOAD_SECONDS = metrics.histogram(
+    "whisper_model_load_seconds", "Time taken to load a model in seconds.", ["model_type"]
+)
+metrics.gauge("process_resident_memory_bytes", "Resident memory size in bytes.", process_rss_bytes)
+
+# 辅助解码: mode 为 greedy (普通贪心解码) 或 assisted (草稿模型提出候选、主模型验证)
+DECODE_TOKEN_SECONDS = metrics.histogram(
+    "whisper_decode_seconds_per_token",
+    "Generate wall time per output token of the longest sequence in the call, by decoding mode.",
+    ["model_type", "mode"], buckets=TOKEN_BUCKETS
+)
+ASSISTED_DRAFT_TOKENS = metrics.counter(
+    "whisper_assisted_draft_tokens_total", "Candidate tokens proposed by the draft model.", ["model_type"]
+)
+ASSISTED_ACCEPTED_TOKENS = metrics.counter(
+    "whisper_assisted_accepted_tokens_total", "Draft tokens accepted by the main model.", ["model_type"]
+)
+
+
+def _assisted_acceptance_rate() -> Dict[LabelValues, float]:
+    accepted = ASSISTED_ACCEPTED_TOKENS.values()
+    return {key: accepted.get(key, 0.0) / drafted for key, drafted in ASSISTED_DRAFT_TOKENS.values().items() if drafted}
+
+
+def _assisted_speedup() -> Dict[LabelValues, float]:
+    """每个模型普通贪心解码与辅助解码的每 token 平均耗时之比，两种模式都有样本时才给出"""
+    means = DECODE_TOKEN_SECONDS.means()
+    speedup = {}
+    for (model_type, mode), assisted in means.items():
+        greedy = means.get((model_type, "greedy"))
+        if mode == "assisted" and greedy and assisted > 0:
+            speedup[(model_type,)] = greedy / assisted
+    return speedup
+
+
+metrics.gauge(
+    "whisper_assisted_acceptance_rate", "Fraction of draft tokens accepted in assisted decoding.",
+    _assisted_acceptance_rate, ["model_type"]
+)
+metrics.gauge(
+    "whisper_assisted_speedup", "Mean greedy seconds per token divided by mean assisted seconds per token.",
+    _assisted_speedup, ["model_type"]
+)
+
+_encoder_timing = threading.local()
+
+
+def stage_timer(stage: str):
+    """with stage_timer("audio_decode"): ... 记录一个阶段的耗时"""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def _encoder_pre_hook(module, args):
+    _encoder_timing.start = time.perf_counter()
+
+
+def _encoder_post_hook(module, args, output):
+    start = getattr(_encoder_timing, "start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    _encoder_timing.start = None
+    _encoder_timing.total = getattr(_encoder_timing, "total", 0.0) + elapsed
+    STAGE_SECONDS.observe(elapsed, stage="encoder")
+
+
+def instrument_encoder(encoder) -> None:
+    """
+    在编码器模块上注册前向钩子，记录编码器耗时，并累加到当前线程的计数中，
+    以便从一次 generate/transcribe 的总耗时中扣除编码器部分，得到解码器耗时。
+    钩子是模块级函数，模型可以随钩子一起被 pickle (spawn 方式的推理子进程通过 initargs 接收模型)。
+    """
+    encoder.register_forward_pre_hook(_encoder_pre_hook)
+    encoder.register_forward_hook(_encoder_post_hook)
+
+
+@contextmanager
+def decoder_timer():
+    """包住一次 generate/transcribe 调用: 总耗时减去其间的编码器耗时记为 decoder 阶段"""
+    _encoder_timing.total = 0.0
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start - getattr(_encoder_timing, "total", 0.0)
+        STAGE_SECONDS.observe(max(0.0, elapsed), stage="decoder")
@@ -0,0 +1,312 @@
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+import whisper
+from transformers import WhisperProcessor
+
+from app.core.config import (
+    AI_MODEL_DIR,
+    MODEL_SPECS,
+    DEFAULT_MODEL,
+    FALLBACK_MODEL,
+    MODEL_MEMORY_BUDGET_BYTES,
+    FINETUNED_INFERENCE_PRECISION,
+    QUANTIZED_MODEL_CACHE_DIR
+)
+from app.core.quantization import load_finetuned_model, load_pretrained_model, PRECISION_FP32
+from app.core.metrics import MODEL_LOAD_SECONDS, instrument_encoder
+
+KIND_FINETUNED = "finetuned"
+KIND_ORIGINAL = "original"
+KIND_STUB = "stub"
+
+
+class UnknownModelError(ValueError):
+    """请求了 MODEL_SPECS 中未配置的模型"""
+
+
+class LoadedModel:
+    """注册表中一个常驻内存的模型"""
+    def __init__(self, name: str, kind: str, model_type: str, model: Any,
+                 processor: Optional[WhisperProcessor], load_time: float):
+        self.name = name              # 注册表中的名称，例如 "small_finetuned"
+        self.kind = kind              # KIND_FINETUNED、KIND_ORIGINAL 或 KIND_STUB (基准测试用)
+        self.model_type = model_type  # 对外报告的模型标识，例如 "original_whisper_small"
+        self.model = model
+        self.processor = processor
+        self.load_time = load_time
+        self.size_bytes = _module_size_bytes(model)
+        self.last_used = time.time()
+        self.in_use = 0               # 正在使用该模型的请求数，大于 0 时不会被淘汰
+
+
+def _module_size_bytes(module: torch.nn.Module) -> int:
+    # 动态量化后的 Linear 权重不在 parameters() 中，因此按 state_dict 统计
+    total = 0
+    for tensor in module.state_dict().values():
+        if isinstance(tensor, torch.Tensor):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def _precision_of(spec: Dict[str, Any]) -> str:
+    return spec.get("precision", FINETUNED_INFERENCE_PRECISION)
+
+
+def model_type_for(name: str) -> str:
+    """注册表名称对应的模型标识 (与加载后的 LoadedModel.model_type 一致)"""
+    spec = MODEL_SPECS.get(name)
+    if spec is None:
+        raise UnknownModelError(f"Unknown model '{name}'. Available models: {list(MODEL_SPECS)}")
+    if spec["kind"] == KIND_FINETUNED:
+        precision = _precision_of(spec)
+        # Hugging Face 检查点以 hf_ 加仓库名标识，例如 openai/whisper-tiny -> hf_whisper-tiny
+        base = f"hf_{spec['pretrained'].rsplit('/', 1)[-1]}" if "pretrained" in spec else spec["config_dir"].name
+        # 非 fp32 的输出可能与 fp32 略有不同，标识中带上精度，结果缓存也随之区分
+        return base if precision == PRECISION_FP32 else f"{base}_{precision}"
+    if spec["kind"] == KIND_STUB:
+        return "stub"
+    return f"original_whisper_{spec['whisper_name']}"
+
+
+def produced_by(name: str) -> Callable[[Dict[str, Any]], bool]:
+    """
+    判断转录结果是否确实由注册表名称 name 对应的模型产生 (用作结果缓存的写入条件)。
+    默认模型加载失败时会回退到 FALLBACK_MODEL (多进程模式下只有推理子进程知道)，
+    回退结果不能写在默认模型的缓存键下，否则默认模型恢复后仍会返回回退结果。
+    """
+    model_type = model_type_for(name)
+    return lambda result: result.get("model_type") == model_type
+
+
+class ModelRegistry:
+    """
+    多模型注册表。
+
+    按名称加载 MODEL_SPECS 中配置的模型，同一进程内可同时常驻多个模型。
+    所有常驻模型的参数总大小超过 memory_budget 时，按最近使用时间淘汰当前没有请求在使用的模型。
+    """
+    def __init__(self, device: str, memory_budget: int = MODEL_MEMORY_BUDGET_BYTES):
+        self.device = device
+        self.memory_budget = memory_budget
+        self._models: Dict[str, LoadedModel] = {}
+        self._lock = threading.RLock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._failed: Dict[str, str] = {}  # 加载失败的模型及原因
+        self._known_sizes: Dict[str, int] = {}
+        # fork 出的推理子进程只继承调用 fork 的线程，父进程中其他线程持有的锁和计数需要重置
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        for entry in self._models.values():
+            entry.in_use = 0
+
+    # ---- 名称解析 ----
+
+    def resolve(self, name: Optional[str] = None) -> str:
+        """把请求中的模型名称 (None / "auto" 表示默认模型) 解析为注册表名称"""
+        if not name or name == "auto":
+            name = DEFAULT_MODEL
+            if name in self._failed and FALLBACK_MODEL:
+                name = FALLBACK_MODEL
+        if name not in MODEL_SPECS:
+            raise UnknownModelError(f"Unknown model '{name}'. Available models: {list(MODEL_SPECS)}")
+        return name
+
+    def available(self) -> List[str]:
+        return list(MODEL_SPECS)
+
+    def resident(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "name": entry.name,
+                    "model_type": entry.model_type,
+                    "size_bytes": entry.size_bytes,
+                    "in_use": entry.in_use,
+                    "last_used": entry.last_used,
+                    "load_time": entry.load_time
+                }
+                for entry in self._models.values()
+            ]
+
+    def is_resident(self, name: str) -> bool:
+        return name in self._models
+
+    def peek(self, name: str) -> Optional[LoadedModel]:
+        return self._models.get(name)
+
+    # ---- 加载与淘汰 ----
+
+    def _load_finetuned(self, name: str, spec: Dict[str, Any]) -> LoadedModel:
+        if "pretrained" in spec:
+            return self._load_pretrained(name, spec)
+        config_dir = spec["config_dir"]
+        weights_path = spec["weights_path"]
+        print(f"Attempting to load finetuned model '{name}' from: {config_dir} and weights from: {weights_path}")
+        if not (config_dir.exists() and weights_path.exists()):
+            raise FileNotFoundError(f"Finetuned model config or weights path does not exist for '{name}'.")
+        load_start = time.time()
+        processor = WhisperProcessor.from_pretrained(str(config_dir))
+        model = load_finetuned_model(
+            config_dir, weights_path, self.device,
+            precision=_precision_of(spec), cache_dir=QUANTIZED_MODEL_CACHE_DIR
+        )
+        entry = LoadedModel(name, KIND_FINETUNED, model_type_for(name), model, processor, time.time() - load_start)
+        instrument_encoder(model.get_encoder())
+        print(f"Successfully loaded finetuned model '{entry.model_type}' and processor from local files.")
+        return entry
+
+    def _load_pretrained(self, name: str, spec: Dict[str, Any]) -> LoadedModel:
+        """加载 Hugging Face 上未经微调的检查点 (首次使用时下载到 Hugging Face 缓存目录)"""
+        pretrained = spec["pretrained"]
+        print(f"Attempting to load Hugging Face model '{name}' from: {pretrained}")
+        load_start = time.time()
+        processor = WhisperProcessor.from_pretrained(pretrained)
+        model = load_pretrained_model(pretrained, self.device, precision=_precision_of(spec))
+        entry = LoadedModel(name, KIND_FINETUNED, model_type_for(name), model, processor, time.time() - load_start)
+        instrument_encoder(model.get_encoder())
+        print(f"Successfully loaded Hugging Face model '{entry.model_type}'.")
+        return entry
+
+    def _load_original(self, name: str, spec: Dict[str, Any]) -> LoadedModel:
+        whisper_name = spec["whisper_name"]
+        local_path = AI_MODEL_DIR / f"{whisper_name}.pt"
+        print(f"Attempting to load original OpenAI Whisper model: {whisper_name}")
+        load_start = time.time()
+        model = whisper.load_model(
+            whisper_name if not local_path.exists() else str(local_path),
+            download_root=str(AI_MODEL_DIR)
+        )
+        model = model.to(self.device)
+        entry = LoadedModel(name, KIND_ORIGINAL, f"original_whisper_{whisper_name}", model, None, time.time() - load_start)
+        instrument_encoder(model.encoder)
+        print(f"Successfully loaded original OpenAI Whisper model: {entry.model_type}")
+        return entry
+
+    def _load_stub(self, name: str, spec: Dict[str, Any]) -> LoadedModel:
+        from app.core.stub_model import StubWhisperModel
+        print(f"Using stub model '{name}' (benchmark mode, no weights are loaded).")
+        return LoadedModel(name, KIND_STUB, model_type_for(name), StubWhisperModel(), None, 0.0)
+
+    def _evict_for(self, incoming_bytes: int, keep: str):
+        """淘汰空闲模型，直到常驻模型加上 incoming_bytes 不超过预算"""
+        with self._lock:
+            resident_bytes = sum(entry.size_bytes for entry in self._models.values())
+            idle = sorted(
+                (entry for entry in self._models.values() if entry.in_use == 0 and entry.name != keep),
+                key=lambda entry: entry.last_used
+            )
+            evicted = []
+            for entry in idle:
+                if resident_bytes + incoming_bytes <= self.memory_budget:
+                    break
+                del self._models[entry.name]
+                resident_bytes -= entry.size_bytes
+                evicted.append(entry.name)
+        if evicted:
+            print(f"Evicted idle models {evicted} to stay within the memory budget.")
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        if resident_bytes + incoming_bytes > self.memory_budget:
+            print(f"WARNING: resident models ({resident_bytes + incoming_bytes} bytes) exceed the memory budget "
+                  f"({self.memory_budget} bytes) because the remaining models are in use.")
+
+    def load(self, name: str) -> LoadedModel:
+        """返回常驻的模型，不存在时加载 (同一模型只会被一个线程加载)"""
+        entry = self._models.get(name)
+        if entry is not None:
+            return entry
+        spec = MODEL_SPECS[name]
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                return entry
+            # 以上次加载时的实际大小估算，先腾出空间再加载，避免内存峰值
+            self._evict_for(self._known_sizes.get(name, 0), keep=name)
+            if spec["kind"] == KIND_FINETUNED:
+                entry = self._load_finetuned(name, spec)
+            elif spec["kind"] == KIND_STUB:
+                entry = self._load_stub(name, spec)
+            else:
+                entry = self._load_original(name, spec)
+            self._known_sizes[name] = entry.size_bytes
+            MODEL_LOAD_SECONDS.observe(entry.load_time, model_type=entry.model_type)
+            with self._lock:
+                self._models[name] = entry
+                self._failed.pop(name, None)
+            self._evict_for(0, keep=name)
+            return entry
+
+    def get(self, name: Optional[str] = None) -> LoadedModel:
+        """
+        解析并加载模型。默认模型加载失败时回退到 FALLBACK_MODEL，
+        与原先"优先微调模型，失败时使用原始 Whisper"的行为一致。
+        """
+        resolved = self.resolve(name)
+        try:
+            return self.load(resolved)
+        except Exception as e:
+            is_default = not name or name == "auto"
+            if is_default and FALLBACK_MODEL and resolved != FALLBACK_MODEL:
+                print(f"Error loading model '{resolved}': {e}. Will attempt to load fallback model '{FALLBACK_MODEL}'.")
+                self._failed[resolved] = str(e)
+                return self.load(FALLBACK_MODEL)
+            raise
+
+    @contextmanager
+    def acquire(self, name: Optional[str] = None):
+        """在使用期间持有模型，防止它被淘汰"""
+        while True:
+            entry = self.get(name)
+            with self._lock:
+                # get() 返回后模型可能刚好被其他线程淘汰，此时重新加载
+                if self._models.get(entry.name) is entry:
+                    entry.in_use += 1
+                    entry.last_used = time.time()
+                    break
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.time()
+
+    def share_memory(self, name: Optional[str] = None) -> LoadedModel:
+        """
+        加载模型并把其权重移到共享内存，供多进程推理池的子进程直接使用同一份权重
+        (动态量化的打包权重不支持共享内存，fork 后以写时复制的方式共享)。
+        """
+        entry = self.get(name)
+        entry.model.share_memory()
+        return entry
+
+    def adopt(self, entry: LoadedModel):
+        """登记一个在其他进程中加载好的模型 (spawn 方式的推理子进程通过共享内存接收权重)"""
+        with self._lock:
+            entry.in_use = 0
+            entry.last_used = time.time()
+            self._models[entry.name] = entry
+            self._known_sizes[entry.name] = entry.size_bytes
+
+    def unload(self, name: str) -> bool:
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is None or entry.in_use > 0:
+                return False
+            del self._models[name]
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return True
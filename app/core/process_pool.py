@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, List, Optional
+
+import torch
+
+from app.core.config import (
+    INFERENCE_PROCESS_WORKERS,
+    INFERENCE_THREADS_PER_WORKER,
+    INFERENCE_PROCESS_MODELS,
+    INFERENCE_PROCESS_START_TIMEOUT,
+    PRELOAD_MODEL
+)
+from app.core.model_registry import LoadedModel
+from app.core.whisper_handler import whisper_handler
+
+
+def _threads_per_worker(num_workers: int) -> int:
+    if INFERENCE_THREADS_PER_WORKER:
+        return INFERENCE_THREADS_PER_WORKER
+    return max(1, (os.cpu_count() or 1) // num_workers)
+
+
+def _init_worker(num_threads: int, shared_entries: Optional[List[LoadedModel]], barrier):
+    """推理子进程的初始化: 限定 torch 线程数、接收共享的模型权重、预热，然后在屏障处等待其他子进程"""
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # fork 自已使用过 inter-op 线程池的父进程时无法再设置，保持继承的值
+        pass
+    # spawn 方式下子进程是全新的解释器，通过共享内存接收父进程加载的模型；fork 方式下直接继承
+    for entry in shared_entries or []:
+        whisper_handler.registry.adopt(entry)
+    if PRELOAD_MODEL:
+        try:
+            whisper_handler.warmup()
+        except Exception as e:
+            print(f"Inference worker {os.getpid()} warmup failed: {e}")
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    print(f"Inference worker {os.getpid()} ready ({num_threads} torch threads).")
+
+
+def _noop():
+    return os.getpid()
+
+
+class ProcessInferencePool:
+    """
+    多进程推理池 (INFERENCE_BACKEND = "process")。
+
+    父进程只加载一次模型，并把权重移到共享内存；子进程以 fork (Linux) 或 spawn 方式启动，
+    直接使用同一份权重，内存占用不随进程数增长。每个子进程的 torch 线程数被限定为
+    CPU 核数 / 进程数，避免多个进程的线程互相争抢。
+
+    子进程在父进程执行任何推理之前全部启动，避免 fork 继承到正在使用的 OpenMP 线程池。
+    """
+    def __init__(self, num_workers: int = INFERENCE_PROCESS_WORKERS,
+                 model_names: Optional[List[str]] = None):
+        self.num_workers = num_workers
+        self.model_names = list(model_names if model_names is not None else INFERENCE_PROCESS_MODELS)
+        self.num_threads = _threads_per_worker(num_workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    def start(self, timeout: float = INFERENCE_PROCESS_START_TIMEOUT):
+        """在父进程中加载模型并放入共享内存，然后启动全部子进程并等待它们完成预热"""
+        if self._executor is not None:
+            return
+        if whisper_handler.device != "cpu":
+            raise RuntimeError("The process inference backend only supports CPU inference.")
+
+        entries = [whisper_handler.registry.share_memory(name) for name in self.model_names]
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        if start_method == "spawn":
+            # 让 ForkingPickler 以共享内存句柄的方式传递张量，而不是复制
+            import torch.multiprocessing  # noqa: F401
+        context = multiprocessing.get_context(start_method)
+        barrier = context.Barrier(self.num_workers + 1)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.num_threads, entries if start_method == "spawn" else None, barrier)
+        )
+        # 同时提交与进程数相同的任务，确保所有子进程现在就启动，而不是等到第一个请求
+        for _ in range(self.num_workers):
+            self._executor.submit(_noop)
+        try:
+            barrier.wait(timeout=timeout)
+        except threading.BrokenBarrierError:
+            print(f"WARNING: not all inference workers became ready within {timeout:.0f}s.")
+        print(f"Process inference pool started: {self.num_workers} workers ({start_method}), "
+              f"{self.num_threads} torch threads each, shared models {[e.name for e in entries]}.")
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """fn 和参数需要能被 pickle (模块级函数和普通数据)"""
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,102 @@
+import hashlib
+from contextlib import nullcontext
+from pathlib import Path
+
+import torch
+from transformers import WhisperConfig, WhisperForConditionalGeneration
+
+try:
+    # 跳过随机初始化: 权重随后会被 load_state_dict 覆盖
+    from transformers.modeling_utils import no_init_weights
+except ImportError:  # 旧版本 transformers
+    no_init_weights = None
+
+PRECISION_FP32 = "fp32"
+PRECISION_INT8 = "int8"
+PRECISION_BF16 = "bf16"
+SUPPORTED_PRECISIONS = (PRECISION_FP32, PRECISION_INT8, PRECISION_BF16)
+
+
+def _empty_model(config: WhisperConfig) -> WhisperForConditionalGeneration:
+    with (no_init_weights() if no_init_weights is not None else nullcontext()):
+        return WhisperForConditionalGeneration(config=config)
+
+
+def quantize_dynamic_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """对所有 Linear 层做动态 int8 量化 (权重离线量化，激活在推理时按批量化，仅支持 CPU)"""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def quantized_cache_path(cache_dir: Path, weights_path: Path, precision: str) -> Path:
+    """量化结果的缓存文件名包含原始权重的大小和修改时间，权重更新后自动失效"""
+    stat = weights_path.stat()
+    fingerprint = hashlib.sha1(f"{weights_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{torch.__version__}".encode()).hexdigest()[:12]
+    return cache_dir / f"{weights_path.stem}_{precision}_{fingerprint}.pt"
+
+
+def load_finetuned_model(config_dir: Path, weights_path: Path, device: str,
+                         precision: str = PRECISION_FP32, cache_dir: Path = None) -> WhisperForConditionalGeneration:
+    """
+    按指定精度加载微调模型。
+
+    - fp32: 与原先的加载方式相同；
+    - int8: 仅 CPU。首次加载时量化 fp32 权重并把量化后的 state_dict 缓存到 cache_dir，
+            之后直接构建量化结构并加载缓存，跳过 fp32 权重读取和量化过程；
+    - bf16: 把权重转换为 bfloat16 (CPU 需支持 AVX512-BF16/AMX 才有明显加速)。
+    """
+    if precision not in SUPPORTED_PRECISIONS:
+        raise ValueError(f"Unsupported precision '{precision}'. Supported: {SUPPORTED_PRECISIONS}")
+    if precision == PRECISION_INT8 and device != "cpu":
+        print(f"WARNING: dynamic int8 quantization is CPU-only; loading '{weights_path.name}' in fp32 on {device}.")
+        precision = PRECISION_FP32
+
+    model_config = WhisperConfig.from_pretrained(str(config_dir))
+
+    if precision == PRECISION_INT8:
+        cache_path = quantized_cache_path(cache_dir, weights_path, precision) if cache_dir is not None else None
+        if cache_path is not None and cache_path.exists():
+            model = quantize_dynamic_int8(_empty_model(model_config))
+            model.load_state_dict(torch.load(str(cache_path), map_location="cpu"))
+            print(f"Loaded cached int8 model from {cache_path}")
+        else:
+            model = _empty_model(model_config)
+            model.load_state_dict(torch.load(str(weights_path), map_location="cpu"))
+            model.eval()
+            model = quantize_dynamic_int8(model)
+            if cache_path is not None:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = cache_path.with_suffix(".tmp")
+                torch.save(model.state_dict(), str(tmp_path))
+                tmp_path.replace(cache_path)
+                print(f"Saved int8 model cache to {cache_path}")
+        model.eval()
+        return model
+
+    model = _empty_model(model_config)
+    model.load_state_dict(torch.load(str(weights_path), map_location=device))
+    if precision == PRECISION_BF16:
+        model = model.to(torch.bfloat16)
+    model = model.to(device)
+    model.eval()
+    return model
+
+
+def load_pretrained_model(pretrained: str, device: str,
+                          precision: str = PRECISION_FP32) -> WhisperForConditionalGeneration:
+    """
+    按指定精度加载 Hugging Face 上的检查点 (例如辅助解码的草稿模型 openai/whisper-tiny)。
+    这类模型较小，int8 量化在加载时直接进行，不做缓存。
+    """
+    if precision not in SUPPORTED_PRECISIONS:
+        raise ValueError(f"Unsupported precision '{precision}'. Supported: {SUPPORTED_PRECISIONS}")
+    if precision == PRECISION_INT8 and device != "cpu":
+        print(f"WARNING: dynamic int8 quantization is CPU-only; loading '{pretrained}' in fp32 on {device}.")
+        precision = PRECISION_FP32
+
+    model = WhisperForConditionalGeneration.from_pretrained(pretrained)
+    model.eval()
+    if precision == PRECISION_INT8:
+        return quantize_dynamic_int8(model)
+    if precision == PRECISION_BF16:
+        model = model.to(torch.bfloat16)
+    return model.to(device)
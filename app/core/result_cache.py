@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from app.core.config import (
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_MEMORY_ENTRIES,
+    RESULT_CACHE_DISK_MAX_BYTES,
+    VAD_ENABLED
+)
+
+
+def make_cache_key(content_hash: str, model_name: str, scene: Optional[str],
+                   options: Optional[Dict[str, Any]] = None) -> str:
+    """由音频内容摘要、模型、场景和解码参数生成缓存键"""
+    payload = {
+        "audio": content_hash,
+        "model": model_name,
+        "scene": scene or "auto",
+        "options": options or {},
+        # 是否跳过静音会影响转录结果 (分段和时间戳)，切换 VAD_ENABLED 后不复用旧结果
+        "vad": VAD_ENABLED
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+async def _in_thread(fn: Callable[..., Any], *args) -> Any:
+    # 缓存的磁盘读写在默认线程池中执行，不阻塞事件循环
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+class ResultCache:
+    """
+    按内容寻址的转录结果缓存。
+
+    - 内存层: 容量为 memory_entries 的 LRU；
+    - 磁盘层: disk_dir 下的 JSON 文件，总大小超过 disk_max_bytes 时按最近访问时间淘汰；
+    - 相同键的并发请求只计算一次，其余请求等待第一个请求的结果 (get_or_compute)。
+    """
+    def __init__(self, disk_dir: Path = RESULT_CACHE_DIR,
+                 memory_entries: int = RESULT_CACHE_MEMORY_ENTRIES,
+                 disk_max_bytes: int = RESULT_CACHE_DISK_MAX_BYTES):
+        self.disk_dir = Path(disk_dir)
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        # 磁盘层索引: 键 -> (文件大小, 最近访问时间)
+        self._disk_index: Dict[str, Tuple[int, float]] = {}
+        self._disk_bytes = 0
+        self._scan_disk()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # 子进程中不存在父进程里正在计算的请求
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def _scan_disk(self):
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+        for entry in self.disk_dir.glob("*/*.json"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            self._disk_index[entry.stem] = (stat.st_size, stat.st_mtime)
+            self._disk_bytes += stat.st_size
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        # 调用方需持有 self._lock
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """先查内存层，再查磁盘层；磁盘命中会被提升到内存层"""
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                return result
+            indexed = key in self._disk_index
+
+        path = self._disk_path(key)
+        # 不在索引中的条目可能由其他推理进程写入 (INFERENCE_BACKEND = "process")，用一次 stat 确认
+        if not indexed and not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path)  # 以 mtime 记录最近访问时间，供重启后的淘汰顺序使用
+            stat = path.stat()
+        except (OSError, ValueError):
+            with self._lock:
+                size, _ = self._disk_index.pop(key, (0, 0.0))
+                self._disk_bytes -= size
+            return None
+
+        with self._lock:
+            size, _ = self._disk_index.get(key, (None, 0.0))
+            if size is None:
+                size = stat.st_size
+                self._disk_bytes += size
+            self._disk_index[key] = (size, stat.st_mtime)
+            self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._remember(key, result)
+
+        # 磁盘层只是尽力而为：目录创建、写入或 stat 失败 (例如并发淘汰删掉了刚写入的文件) 时只保留内存中的结果
+        path = self._disk_path(key)
+        data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            mtime = path.stat().st_mtime
+        except OSError as e:
+            tmp_path.unlink(missing_ok=True)
+            print(f"Failed to write transcription cache entry {key}: {e}")
+            return
+
+        with self._lock:
+            old_size, _ = self._disk_index.get(key, (0, 0.0))
+            self._disk_index[key] = (len(data), mtime)
+            self._disk_bytes += len(data) - old_size
+            victims = self._select_victims()
+        for victim in victims:
+            self._disk_path(victim).unlink(missing_ok=True)
+
+    def _select_victims(self):
+        # 调用方需持有 self._lock；按最近访问时间从旧到新淘汰，直到总大小回到上限以内
+        victims = []
+        if self._disk_bytes <= self.disk_max_bytes:
+            return victims
+        for key, (size, _) in sorted(self._disk_index.items(), key=lambda item: item[1][1]):
+            if self._disk_bytes <= self.disk_max_bytes:
+                break
+            victims.append(key)
+            self._disk_bytes -= size
+        for key in victims:
+            del self._disk_index[key]
+        return victims
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        """返回 (该键进行中的计算, 是否由调用方负责计算)"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def _fail(self, key: str, future: Future, error: BaseException):
+        future.set_exception(error)
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def _resolve(self, key: str, future: Future, result: Dict[str, Any],
+                 cacheable: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        # 先唤醒等待者再写缓存，写缓存失败不影响本次请求和等待者
+        future.set_result(result)
+        try:
+            if cacheable is None or cacheable(result):
+                self.put(key, result)
+        except Exception as e:
+            print(f"Failed to cache transcription result {key}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]],
+                       cacheable: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        返回 (结果, 是否来自缓存)。
+        缓存未命中时调用 compute()；同一键已有请求在计算时，等待其结果而不重复计算。
+        cacheable(结果) 为 False 时结果只交给当前等待的请求，不写入缓存 (例如实际使用的是回退模型)。
+        """
+        result = self.get(key)
+        if result is not None:
+            return result, True
+
+        future, owner = self._claim(key)
+        if not owner:
+            return future.result(), True
+        try:
+            result = compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._resolve(key, future, result, cacheable)
+        return result, False
+
+    async def get_or_compute_async(self, key: str, compute: Callable[[], Awaitable[Dict[str, Any]]],
+                                   cacheable: Optional[Callable[[Dict[str, Any]], bool]] = None
+                                   ) -> Tuple[Dict[str, Any], bool]:
+        """
+        get_or_compute 的协程版本，供事件循环中的请求使用: compute 是协程函数 (例如把推理交给推理池)。
+        查缓存和合并并发请求都在本进程中完成，与 get_or_compute 共用进行中的计算。
+        """
+        result = await _in_thread(self.get, key)
+        if result is not None:
+            return result, True
+
+        future, owner = self._claim(key)
+        if not owner:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        await _in_thread(self._resolve, key, future, result, cacheable)
+        return result, False
+
+    async def get_or_compute_many_async(
+        self, keys: List[str],
+        compute_many: Callable[[List[int]], Awaitable[List[Union[Dict[str, Any], Exception]]]],
+        cacheable: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[Tuple[Union[Dict[str, Any], Exception], bool]]:
+        """
+        批量版本: 返回与 keys 顺序一致的 (结果或异常, 是否来自缓存)。
+        未命中且没有其他请求在计算的键，各取第一次出现的下标一次性交给 compute_many(下标列表)，
+        它返回与下标一一对应的结果或异常；其余键等待已有的计算。
+        """
+        cached = await _in_thread(lambda: [self.get(key) for key in keys])
+        outcomes: List[Optional[Tuple[Union[Dict[str, Any], Exception], bool]]] = [
+            (result, True) if result is not None else None for result in cached
+        ]
+        owned: Dict[str, Tuple[int, Future]] = {}
+        waiting: Dict[int, Future] = {}
+        for i, key in enumerate(keys):
+            if outcomes[i] is not None:
+                continue
+            if key in owned:
+                waiting[i] = owned[key][1]
+                continue
+            future, owner = self._claim(key)
+            if owner:
+                owned[key] = (i, future)
+            else:
+                waiting[i] = future
+
+        if owned:
+            try:
+                computed = await compute_many([i for i, _ in owned.values()])
+            except BaseException as e:
+                for key, (_, future) in owned.items():
+                    self._fail(key, future, e)
+                raise
+            for (key, (i, future)), result in zip(owned.items(), computed):
+                if isinstance(result, Exception):
+                    self._fail(key, future, result)
+                else:
+                    await _in_thread(self._resolve, key, future, result, cacheable)
+
+        for i, future in waiting.items():
+            try:
+                outcomes[i] = (await asyncio.wrap_future(future), keys[i] not in owned)
+            except Exception as e:
+                outcomes[i] = (e, False)
+        for i, future in owned.values():
+            error = future.exception()
+            outcomes[i] = (error if error is not None else future.result(), False)
+        return outcomes
+
+result_cache = ResultCache()
@@ -0,0 +1,232 @@
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.audio import pcm16_to_float32, StreamResampler, FFmpegStreamDecoder
+from app.core.config import (
+    SAMPLING_RATE,
+    SCENE_TIMELINE_WINDOW_SECONDS,
+    STREAM_DECODE_INTERVAL_SECONDS,
+    STREAM_MAX_SEGMENT_SECONDS,
+    STREAM_MIN_SEGMENT_SECONDS,
+    STREAM_MIN_SILENCE_SECONDS,
+    STREAM_SILENCE_RMS
+)
+from app.core.keyword_engine import keyword_engine, IncrementalAnalysis
+from app.core.whisper_handler import whisper_handler
+
+FORMAT_PCM = "pcm_s16le"
+# 编码格式到 FFmpeg 输入格式 (容器) 的映射
+ENCODED_FORMATS = {"opus": "ogg", "ogg": "ogg", "webm": "webm"}
+
+_FRAME_SECONDS = 0.03  # 静音检测的帧长
+
+
+class StreamingSession:
+    """
+    一路实时流式转录会话。
+
+    音频块不断追加到滚动缓冲区；每积累 STREAM_DECODE_INTERVAL_SECONDS 秒新音频就解码一次整个缓冲区
+    并推送 partial 结果。缓冲区末尾出现足够长的静音，或缓冲区超过 STREAM_MAX_SEGMENT_SECONDS 秒时，
+    切下已说完的部分作为确定分段 (final)，附带该分段的关键字、语义连接词和当前场景，然后从缓冲区移除。
+    关键字分析逐段累积: 每个确定分段只扫描一次，场景按累计的指示词得分判断。
+
+    add_audio() 在事件循环中调用，step()/flush() 在推理线程中调用，缓冲区由锁保护。
+    """
+    def __init__(self, sample_format: str = FORMAT_PCM, sample_rate: int = SAMPLING_RATE,
+                 scene: Optional[str] = None, model_name: Optional[str] = None,
+                 assisted: Optional[bool] = None):
+        if sample_format != FORMAT_PCM and sample_format not in ENCODED_FORMATS:
+            raise ValueError(f"Unsupported stream format '{sample_format}'. Supported: {[FORMAT_PCM] + list(ENCODED_FORMATS)}")
+        self.sample_format = sample_format
+        self.sample_rate = sample_rate
+        self.scene = scene
+        self.model_name = model_name
+        self.assisted = assisted
+        self._decoder = FFmpegStreamDecoder(input_format=ENCODED_FORMATS[sample_format]) if sample_format != FORMAT_PCM else None
+        self._resampler = StreamResampler(sample_rate, SAMPLING_RATE) if sample_format == FORMAT_PCM else None
+        self._lock = threading.Lock()
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0.0     # 缓冲区第一个采样在整段录音中的时间 (秒)
+        self._decoded_len = 0        # 上次解码时缓冲区的长度
+        self.segments: List[Dict[str, Any]] = []
+        self.model_type: Optional[str] = None
+        self.language = "unknown"
+        self._analysis: Optional[IncrementalAnalysis] = None
+
+    # ---- 音频输入 (事件循环) ----
+
+    def add_audio(self, data: bytes):
+        """追加一个音频块。编码格式的块会写入 FFmpeg 解码进程 (可能短暂阻塞，调用方应放到线程中执行)"""
+        if self._decoder is not None:
+            self._decoder.feed(data)
+            samples = self._decoder.read()
+        else:
+            samples = self._resampler.process(pcm16_to_float32(data))
+        self._append(samples)
+
+    def _append(self, samples: np.ndarray):
+        if len(samples):
+            with self._lock:
+                self._buffer = np.concatenate([self._buffer, samples])
+
+    def pending_seconds(self) -> float:
+        """自上次解码以来新增的音频时长"""
+        if self._decoder is not None:
+            self._append(self._decoder.read())
+        with self._lock:
+            return (len(self._buffer) - self._decoded_len) / SAMPLING_RATE
+
+    def should_decode(self) -> bool:
+        return self.pending_seconds() >= STREAM_DECODE_INTERVAL_SECONDS
+
+    # ---- 解码 (推理线程) ----
+
+    def _find_cut(self, audio: np.ndarray) -> Optional[int]:
+        """在缓冲区中寻找切分点: 最后一段足够长的静音的中点；缓冲区过长时强制切分"""
+        frame = int(_FRAME_SECONDS * SAMPLING_RATE)
+        n_frames = len(audio) // frame
+        min_samples = int(STREAM_MIN_SEGMENT_SECONDS * SAMPLING_RATE)
+        max_samples = int(STREAM_MAX_SEGMENT_SECONDS * SAMPLING_RATE)
+        if n_frames == 0:
+            return None
+        rms = np.sqrt(np.mean(audio[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+        silent = rms < STREAM_SILENCE_RMS
+        min_run = max(1, int(STREAM_MIN_SILENCE_SECONDS / _FRAME_SECONDS))
+
+        cut = None
+        run = 0
+        for i in range(min(n_frames, max_samples // frame) - 1, -1, -1):
+            if silent[i]:
+                run += 1
+                continue
+            if run >= min_run:
+                candidate = (i + 1 + run // 2) * frame
+                if candidate >= min_samples:
+                    cut = candidate
+                    break
+            run = 0
+        if cut is None and run >= min_run and run * frame < len(audio):
+            cut = (run // 2) * frame if run * frame >= min_samples else None
+        if cut is None and len(audio) >= max_samples:
+            cut = max_samples
+        return cut
+
+    def _finalize(self, audio: np.ndarray, cut: int) -> Optional[Dict[str, Any]]:
+        """把缓冲区前 cut 个采样转录为确定分段，并从缓冲区移除"""
+        piece = audio[:cut]
+        if np.sqrt(np.mean(piece ** 2)) < STREAM_SILENCE_RMS:
+            # 整段都是静音，直接丢弃，不送入模型 (避免在静音上产生幻觉文本)
+            result = {"text": ""}
+        else:
+            result = whisper_handler.transcribe_window(piece, model_name=self.model_name, assisted=self.assisted)
+            self.model_type = result["model_type"]
+            self.language = result["language"]
+        with self._lock:
+            start = self._buffer_start
+            self._buffer = self._buffer[cut:]
+            self._buffer_start += cut / SAMPLING_RATE
+            self._decoded_len = 0
+        text = result["text"]
+        if not text:
+            return None
+
+        segment = {
+            "id": len(self.segments),
+            "start": round(start, 2),
+            "end": round(start + cut / SAMPLING_RATE, 2),
+            "text": text
+        }
+        analysis = self._current_analysis()
+        self.segments.append(segment)
+        new_hits = analysis.add_segment(text, segment["start"], segment["end"])
+        # 场景按目前为止累计的指示词得分判断，分段的关键字按该场景查找
+        scene = self.scene or analysis.scene
+        result = analysis.result(requested_scene=scene, hits=new_hits)
+        return {
+            "type": "final",
+            "segment": segment,
+            "scene": scene,
+            "keywords": result["keywords"],
+            "semantics": result["semantics"],
+            "keyword_matches": result["matches"],
+            "keywords_version": result["version"]
+        }
+
+    def _current_analysis(self) -> IncrementalAnalysis:
+        """会话的逐段分析累加器；词库更新后用新词库重新分析已有分段"""
+        engine = keyword_engine.current
+        if self._analysis is None or self._analysis.version != engine.version:
+            self._analysis = engine.incremental()
+            for segment in self.segments:
+                self._analysis.add_segment(segment["text"], segment["start"], segment["end"])
+        return self._analysis
+
+    def step(self) -> List[Dict[str, Any]]:
+        """解码一次: 能切出确定分段时推送 final，否则推送整个缓冲区的 partial 结果"""
+        with self._lock:
+            audio = self._buffer.copy()
+            start = self._buffer_start
+        if len(audio) == 0:
+            return []
+        cut = self._find_cut(audio)
+        if cut is not None:
+            message = self._finalize(audio, cut)
+            return [message] if message else []
+
+        result = whisper_handler.transcribe_window(audio, model_name=self.model_name, assisted=self.assisted)
+        self.model_type = result["model_type"]
+        with self._lock:
+            self._decoded_len = len(audio)
+        return [{
+            "type": "partial",
+            "text": result["text"],
+            "start": round(start, 2),
+            "end": round(start + len(audio) / SAMPLING_RATE, 2)
+        }]
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """录音结束: 把缓冲区中剩余的音频全部转为确定分段"""
+        if self._decoder is not None:
+            self._append(self._decoder.close())
+        messages = []
+        while True:
+            with self._lock:
+                audio = self._buffer.copy()
+            if len(audio) == 0:
+                break
+            cut = self._find_cut(audio)
+            if cut is None or cut >= len(audio):
+                cut = min(len(audio), int(STREAM_MAX_SEGMENT_SECONDS * SAMPLING_RATE))
+            message = self._finalize(audio, cut)
+            if message:
+                messages.append(message)
+        return messages
+
+    # ---- 汇总 ----
+
+    @property
+    def text(self) -> str:
+        return "".join(seg["text"] for seg in self.segments)
+
+    def summary(self) -> Dict[str, Any]:
+        analysis = self._current_analysis()
+        result = analysis.result(requested_scene=self.scene)
+        return {
+            "type": "done",
+            "text": self.text,
+            "segments": self.segments,
+            "language": self.language,
+            "model_type": self.model_type,
+            "detected_scene": result["scene"],
+            "found_keywords": result["keywords"],
+            "found_semantics": result["semantics"],
+            "keyword_matches": result["matches"],
+            "scene_timeline": analysis.timeline(SCENE_TIMELINE_WINDOW_SECONDS),
+            "keywords_version": result["version"]
+        }
+
+    def close(self):
+        if self._decoder is not None:
+            self._decoder.close(timeout=0.5)
@@ -0,0 +1,63 @@
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.core.config import SAMPLING_RATE, STUB_MODEL_RTF
+
+# 桩模型输出的句子，覆盖课堂/会议场景的关键字、指示词和语义连接词，使关键字分析的开销接近真实文本
+SAMPLE_SENTENCES = [
+    "今天我们讲第三章的重点和难点，",
+    "首先回顾上节课的作业，然后讨论实验报告的数据分析，",
+    "虽然这个公式的推导比较复杂，但是只要掌握基本概念就能理解，",
+    "会议议程的第一个议题是项目里程碑，",
+    "负责人需要在截止时间之前提交行动项，",
+    "因为预算有限，所以我们要先确定目标和范围，",
+    "同学们注意，期末考试会考到这个定理的证明，",
+    "最后总结一下今天的结论和下一步计划。",
+]
+_CHARS_PER_SECOND = 4.0  # 普通话语速约为每秒 4 个字
+_SEGMENT_SECONDS = 5.0
+
+
+class StubWhisperModel:
+    """
+    不加载权重的桩模型 (WHISPER_STUB_MODEL=1)，提供与 openai-whisper 模型相同的 transcribe 接口。
+
+    输出文本的长度与音频时长成正比，并按 STUB_MODEL_RTF 休眠以模拟推理耗时，
+    用于在没有模型文件的环境中测量 HTTP、上传、解码和关键字分析的开销。
+    本模块不依赖 torch，微基准测试可以直接导入其中的示例文本。
+    """
+    def __init__(self, rtf: float = STUB_MODEL_RTF):
+        self.rtf = rtf
+
+    def state_dict(self) -> Dict[str, Any]:
+        # 注册表按 state_dict 统计模型大小
+        return {}
+
+    def share_memory(self) -> "StubWhisperModel":
+        return self
+
+    def transcribe(self, audio: np.ndarray, **kwargs) -> Dict[str, Any]:
+        duration = len(audio) / SAMPLING_RATE
+        if self.rtf > 0:
+            time.sleep(duration * self.rtf)
+
+        # 按语速生成连续文本，再按固定时长切成分段
+        n_chars = max(1, int(duration * _CHARS_PER_SECOND))
+        text = ""
+        index = 0
+        while len(text) < n_chars:
+            text += SAMPLE_SENTENCES[index % len(SAMPLE_SENTENCES)]
+            index += 1
+        text = text[:n_chars]
+
+        segments: List[Dict[str, Any]] = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + _SEGMENT_SECONDS)
+            piece = text[int(start * _CHARS_PER_SECOND):int(end * _CHARS_PER_SECOND)]
+            if piece:
+                segments.append({"id": len(segments), "start": round(start, 2), "end": round(end, 2), "text": piece})
+            start = end
+        return {"text": text, "language": "zh", "segments": segments}
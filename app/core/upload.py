@@ -0,0 +1,234 @@
+import hashlib
+import io
+import secrets
+import shutil
+import time
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import List, Optional, Tuple, Union
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import (
+    UPLOAD_DIR,
+    MAX_AUDIO_SIZE,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_MEMORY_LIMIT,
+    STREAMABLE_AUDIO_TYPES,
+    AUDIO_EXTENSION_TYPES,
+    BATCH_MAX_FILES,
+    BATCH_MAX_TOTAL_SIZE
+)
+from app.core.metrics import STAGE_SECONDS
+
+
+class UploadTooLarge(Exception):
+    """上传文件超过 MAX_AUDIO_SIZE"""
+    def __init__(self, max_size: int):
+        super().__init__(f"Upload exceeds {max_size} bytes")
+        self.max_size = max_size
+
+
+class SpooledAudio:
+    """
+    一次读取完成的上传音频。
+
+    小文件保存在内存中 (data)，大文件或无法经管道解码的格式写入 UPLOAD_DIR (path)。
+    sha256 为整个文件内容的摘要，在读取的同时计算。
+    """
+    def __init__(self, filename: str, content_type: str, sha256: str, size: int,
+                 data: Optional[bytes] = None, path: Optional[Path] = None):
+        self.filename = filename
+        self.content_type = content_type
+        self.sha256 = sha256
+        self.size = size
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self) -> Union[bytes, Path]:
+        """传给 WhisperHandler.transcribe 的音频来源"""
+        return self.data if self.data is not None else self.path
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    def persist(self, directory: Path) -> Path:
+        """把音频保存到 directory 下的文件 (用于异步任务)，返回文件路径；之后 source 指向该文件"""
+        directory.mkdir(parents=True, exist_ok=True)
+        target = directory / f"{self.sha256[:16]}_{secrets.token_hex(4)}{Path(self.filename).suffix}"
+        if self.data is not None:
+            target.write_bytes(self.data)
+            self.data = None
+        else:
+            shutil.move(str(self.path), str(target))
+        self.path = target
+        return target
+
+    def cleanup(self):
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+        self.data = None
+
+
+async def spool_upload(file: UploadFile, max_size: int = MAX_AUDIO_SIZE,
+                       memory_limit: int = UPLOAD_MEMORY_LIMIT) -> SpooledAudio:
+    """
+    单次流式读取上传文件: 同时校验大小、计算 SHA-256，并写入最终的存放位置。
+
+    - 不超过 memory_limit 且能通过管道交给 FFmpeg 解码的文件只保存在内存中，不落盘；
+    - 其余文件以大块缓冲写入 UPLOAD_DIR，文件名包含内容摘要。
+    超过 max_size 时抛出 UploadTooLarge，并删除已写入的部分文件。
+    """
+    hasher = hashlib.sha256()
+    # m4a 等容器的索引可能位于文件末尾，FFmpeg 无法从管道读取，必须落盘
+    can_stay_in_memory = file.content_type in STREAMABLE_AUDIO_TYPES
+    buffer = bytearray()
+    size = 0
+    path: Optional[Path] = None
+    out = None
+    receive_start = time.perf_counter()
+    spool_seconds = 0.0  # 写盘耗时，单独记为 disk_spool 阶段
+
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(max_size)
+            hasher.update(chunk)
+
+            if out is None and (not can_stay_in_memory or size > memory_limit):
+                path = UPLOAD_DIR / f"{secrets.token_hex(8)}.part"
+                out = open(path, "wb", buffering=UPLOAD_CHUNK_SIZE)
+                if buffer:
+                    write_start = time.perf_counter()
+                    await run_in_threadpool(out.write, bytes(buffer))
+                    spool_seconds += time.perf_counter() - write_start
+                    buffer = bytearray()
+            if out is not None:
+                write_start = time.perf_counter()
+                await run_in_threadpool(out.write, chunk)
+                spool_seconds += time.perf_counter() - write_start
+            else:
+                buffer.extend(chunk)
+    except BaseException:
+        if out is not None:
+            out.close()
+        if path is not None:
+            path.unlink(missing_ok=True)
+        raise
+
+    sha256 = hasher.hexdigest()
+    filename = file.filename or "audio"
+    if out is None:
+        STAGE_SECONDS.observe(time.perf_counter() - receive_start, stage="upload_receive")
+        return SpooledAudio(filename, file.content_type, sha256, size, data=bytes(buffer))
+
+    write_start = time.perf_counter()
+    out.close()
+    spool_seconds += time.perf_counter() - write_start
+    STAGE_SECONDS.observe(time.perf_counter() - receive_start - spool_seconds, stage="upload_receive")
+    STAGE_SECONDS.observe(spool_seconds, stage="disk_spool")
+    final_path = UPLOAD_DIR / f"{sha256[:16]}_{secrets.token_hex(4)}{Path(filename).suffix}"
+    path.rename(final_path)
+    return SpooledAudio(filename, file.content_type, sha256, size, path=final_path)
+
+
+def _spool_zip_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, content_type: str,
+                      max_size: int, memory_limit: int) -> SpooledAudio:
+    """读取 zip 中的一个音频，处理方式与 spool_upload 相同 (以实际解压的字节数校验大小)"""
+    hasher = hashlib.sha256()
+    filename = PurePosixPath(info.filename).name
+    can_stay_in_memory = content_type in STREAMABLE_AUDIO_TYPES and info.file_size <= memory_limit
+    buffer = bytearray()
+    size = 0
+    path: Optional[Path] = None
+    out = None
+    try:
+        with archive.open(info) as member:
+            while True:
+                chunk = member.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(max_size)
+                hasher.update(chunk)
+                if out is None and (not can_stay_in_memory or size > memory_limit):
+                    path = UPLOAD_DIR / f"{secrets.token_hex(8)}.part"
+                    out = open(path, "wb", buffering=UPLOAD_CHUNK_SIZE)
+                    out.write(buffer)
+                    buffer = bytearray()
+                if out is not None:
+                    out.write(chunk)
+                else:
+                    buffer.extend(chunk)
+    except BaseException:
+        if out is not None:
+            out.close()
+        if path is not None:
+            path.unlink(missing_ok=True)
+        raise
+
+    sha256 = hasher.hexdigest()
+    if out is None:
+        return SpooledAudio(filename, content_type, sha256, size, data=bytes(buffer))
+    out.close()
+    final_path = UPLOAD_DIR / f"{sha256[:16]}_{secrets.token_hex(4)}{Path(filename).suffix}"
+    path.rename(final_path)
+    return SpooledAudio(filename, content_type, sha256, size, path=final_path)
+
+
+def extract_zip(archive: SpooledAudio, max_files: int = BATCH_MAX_FILES, max_size: int = MAX_AUDIO_SIZE,
+                max_total_size: int = BATCH_MAX_TOTAL_SIZE,
+                memory_limit: int = UPLOAD_MEMORY_LIMIT) -> List[Tuple[str, Union[SpooledAudio, Exception]]]:
+    """
+    展开上传的 zip 压缩包，返回 [(zip 内的文件名, SpooledAudio 或该文件的错误)]。
+
+    按扩展名 (AUDIO_EXTENSION_TYPES) 识别音频，目录和 macOS 生成的元数据文件会被忽略，
+    其他文件作为单个文件的错误返回。压缩包本身无法读取、音频数超过 max_files
+    或解压后总大小超过 max_total_size 时抛出 ValueError。
+    """
+    source = io.BytesIO(archive.data) if archive.in_memory else archive.path
+    try:
+        zf = zipfile.ZipFile(source)
+    except (zipfile.BadZipFile, OSError) as e:
+        raise ValueError(f"无法读取 zip 压缩包 {archive.filename}: {e}") from e
+
+    items: List[Tuple[str, Union[SpooledAudio, Exception]]] = []
+    total_size = 0
+    with zf:
+        members = [
+            info for info in zf.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith("__MACOSX/")
+            and not PurePosixPath(info.filename).name.startswith(".")
+        ]
+        if len(members) > max_files:
+            raise ValueError(f"压缩包内文件数 ({len(members)}) 超过上限 {max_files}")
+        try:
+            for info in members:
+                content_type = AUDIO_EXTENSION_TYPES.get(PurePosixPath(info.filename).suffix.lower())
+                if content_type is None:
+                    items.append((info.filename, ValueError(f"不支持的文件类型: {info.filename}")))
+                    continue
+                total_size += info.file_size
+                if total_size > max_total_size:
+                    raise ValueError(f"压缩包解压后的总大小超过限制: {max_total_size/1024/1024:.2f}MB")
+                try:
+                    items.append((info.filename, _spool_zip_member(zf, info, content_type, max_size, memory_limit)))
+                except UploadTooLarge:
+                    items.append((info.filename, ValueError(f"文件大小超过限制: {max_size/1024/1024:.2f}MB")))
+                except (zipfile.BadZipFile, OSError, RuntimeError, EOFError) as e:
+                    items.append((info.filename, e))
+        except BaseException:
+            for _, item in items:
+                if isinstance(item, SpooledAudio):
+                    item.cleanup()
+            raise
+    return items
@@ -0,0 +1,136 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.core.config import (
+    SAMPLING_RATE,
+    VAD_FRAME_SECONDS,
+    VAD_ENERGY_MARGIN_DB,
+    VAD_MIN_ENERGY_DB,
+    VAD_MIN_DYNAMIC_RANGE_DB,
+    VAD_MAX_SPECTRAL_FLATNESS,
+    VAD_MIN_SPEECH_SECONDS,
+    VAD_MIN_SILENCE_SECONDS,
+    VAD_PAD_SECONDS
+)
+
+_FFT_BLOCK_FRAMES = 4096  # 每次做 FFT 的帧数，限制长音频的临时内存
+
+
+def _frame_features(audio: np.ndarray, frame: int) -> Tuple[np.ndarray, np.ndarray]:
+    """逐帧计算能量 (dBFS) 和谱平坦度，全部为向量化运算"""
+    n_frames = len(audio) // frame
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy_db = 10.0 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+    flatness = np.empty(n_frames, dtype=np.float32)
+    window = np.hanning(frame).astype(np.float32)
+    for start in range(0, n_frames, _FFT_BLOCK_FRAMES):
+        power = np.abs(np.fft.rfft(frames[start:start + _FFT_BLOCK_FRAMES] * window, axis=1)) ** 2 + 1e-12
+        # 几何平均 / 算术平均: 白噪声接近 0.56，浊音等有明显谐波结构的信号远小于此
+        flatness[start:start + _FFT_BLOCK_FRAMES] = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return energy_db, flatness
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """布尔序列中连续 True 区间的 [起始, 结束) 下标，形状为 (n, 2)"""
+    padded = np.concatenate([[False], mask, [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges.reshape(-1, 2)
+
+
+def peak_energy_db(audio: np.ndarray, sr: int = SAMPLING_RATE) -> float:
+    """最响一帧的能量 (dBFS)；不足一帧的音频按整段计算"""
+    if len(audio) == 0:
+        return -100.0
+    frame = int(VAD_FRAME_SECONDS * sr)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return float(10.0 * np.log10(np.mean(audio ** 2) + 1e-10))
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    return float(10.0 * np.log10(np.max(np.mean(frames ** 2, axis=1)) + 1e-10))
+
+
+def detect_speech(audio: np.ndarray, sr: int = SAMPLING_RATE) -> List[Tuple[int, int]]:
+    """
+    能量 + 谱平坦度的语音活动检测，返回语音区间的采样下标列表 [(start, end), ...]。
+
+    阈值相对于整段音频的噪声底 (帧能量的 10% 分位数) 自适应；短于 VAD_MIN_SILENCE_SECONDS 的停顿
+    视为语音的一部分，短于 VAD_MIN_SPEECH_SECONDS 的孤立片段被丢弃，每个区间两端各保留 VAD_PAD_SECONDS。
+
+    只有存在安静的参照帧 (10% 分位数接近 VAD_MIN_ENERGY_DB，或 90% 与 10% 分位数相差至少
+    VAD_MIN_DYNAMIC_RANGE_DB) 时才使用自适应阈值；连续不安静的音频中 10% 分位数就是语音本身的电平，
+    阈值会高于普通语音，此时把整段音频作为一个区间返回。
+    """
+    frame = int(VAD_FRAME_SECONDS * sr)
+    if len(audio) < frame:
+        return []
+    energy_db, flatness = _frame_features(audio, frame)
+    floor, top = np.percentile(energy_db, [10, 90])
+    if floor > VAD_MIN_ENERGY_DB and top - floor < VAD_MIN_DYNAMIC_RANGE_DB:
+        return [(0, len(audio))]
+    threshold = max(floor + VAD_ENERGY_MARGIN_DB, VAD_MIN_ENERGY_DB)
+    speech = (energy_db > threshold) & (flatness < VAD_MAX_SPECTRAL_FLATNESS)
+
+    # 填平短停顿
+    silences = _runs(~speech)
+    min_silence = int(np.ceil(VAD_MIN_SILENCE_SECONDS / VAD_FRAME_SECONDS))
+    for start, end in silences[(silences[:, 1] - silences[:, 0]) < min_silence]:
+        if start > 0 and end < len(speech):
+            speech[start:end] = True
+
+    regions = _runs(speech)
+    min_speech = int(np.ceil(VAD_MIN_SPEECH_SECONDS / VAD_FRAME_SECONDS))
+    regions = regions[(regions[:, 1] - regions[:, 0]) >= min_speech]
+    if len(regions) == 0:
+        return []
+
+    pad = int(VAD_PAD_SECONDS * sr)
+    merged: List[Tuple[int, int]] = []
+    for start, end in regions * frame:
+        start, end = max(0, int(start) - pad), min(len(audio), int(end) + pad)
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class SpeechTimeline:
+    """
+    把若干语音区间拼接成一段紧凑音频，并在紧凑音频的时间与原始音频的时间之间换算。
+    """
+    def __init__(self, regions: List[Tuple[int, int]], sr: int = SAMPLING_RATE):
+        self.regions = regions
+        self.sr = sr
+        lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        # 每个区间在紧凑音频中的起始采样
+        self._offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    @property
+    def speech_samples(self) -> int:
+        return int(self._offsets[-1])
+
+    def compact(self, audio: np.ndarray) -> np.ndarray:
+        return np.concatenate([audio[start:end] for start, end in self.regions])
+
+    def to_original(self, t: float, is_end: bool = False) -> float:
+        """
+        紧凑音频中的时间 (秒) 换算为原始音频中的时间。
+        恰好落在两个区间交界处时，起点归入后一个区间，终点 (is_end=True) 归入前一个区间。
+        """
+        sample = min(max(t * self.sr, 0.0), float(self._offsets[-1]))
+        side = "left" if is_end else "right"
+        idx = int(np.searchsorted(self._offsets, sample, side=side)) - 1
+        idx = min(max(idx, 0), len(self.regions) - 1)
+        return float(self.regions[idx][0] + sample - self._offsets[idx]) / self.sr
+
+    def map_segments(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把分段的 start/end 换算回原始时间轴 (其余字段保持不变)"""
+        mapped = []
+        for seg in segments:
+            seg = dict(seg)
+            seg["start"] = round(self.to_original(seg["start"]), 2)
+            seg["end"] = round(self.to_original(seg["end"], is_end=True), 2)
+            mapped.append(seg)
+        return mapped
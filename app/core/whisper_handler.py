@@ -1,227 +1,634 @@
-import whisper
 import torch
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Union, Dict, Any, List, Tuple
+from typing import Union, Dict, Any, List, Tuple, Optional, Callable
 from app.core.config import (
-    WHISPER_MODEL_NAME,
-    WHISPER_MODEL_PATH,
-    AI_MODEL_DIR,
-    FINETUNED_WHISPER_WEIGHTS_PATH,
-    FINETUNED_WHISPER_CONFIG_DIR
+    ASSISTED_DECODING_DEFAULT,
+    ASSISTED_NUM_TOKENS,
+    BATCH_DECODE_WORKERS,
+    BATCH_MAX_SIZE,
+    BATCH_MAX_WAIT_MS,
+    LONGFORM_CHUNK_SECONDS,
+    LONGFORM_OVERLAP_SECONDS,
+    MODEL_SPECS,
+    SAMPLING_RATE,
+    SCENE_TIMELINE_WINDOW_SECONDS,
+    VAD_ENABLED,
+    VAD_MAX_SPEECH_RATIO,
+    VAD_MIN_ENERGY_DB,
+    WARMUP_AUDIO_SECONDS
 )
-from app.core.keywords import (
-    get_keywords_by_scene,
-    get_all_semantic_keywords_with_category,
-    get_scene_indicator_words,
-    KEYWORDS_CONFIG
+from app.core.batching import MicroBatcher
+from app.core.decoding import DecodingOptions, DEFAULT_DECODING_OPTIONS
+from app.core.longform import split_windows, WindowMerger
+from app.core.keyword_engine import keyword_engine, IncrementalAnalysis
+from app.core.audio import load_audio
+from app.core.vad import detect_speech, peak_energy_db, SpeechTimeline
+from app.core.metrics import (
+    metrics, stage_timer, decoder_timer, REAL_TIME_FACTOR, AUDIO_SECONDS,
+    DECODE_TOKEN_SECONDS, ASSISTED_DRAFT_TOKENS, ASSISTED_ACCEPTED_TOKENS
 )
+from app.core.model_registry import ModelRegistry, LoadedModel, KIND_FINETUNED, KIND_ORIGINAL, KIND_STUB
+
+# 进度回调: (已解码的音频秒数, 音频总秒数)
+ProgressCallback = Callable[[float, float], None]
+# 分段回调: 每个分段确定后以该分段 ({"id", "start", "end", "text", ...}) 被调用
+SegmentCallback = Callable[[Dict[str, Any]], None]
+# 批处理调度器的 key: (模型名称, 解码参数, 辅助解码的草稿模型名称或 None)，只有 key 相同的样本才会拼成一批
+GenerateKey = Tuple[str, DecodingOptions, Optional[str]]
+import os
 import time
 import re
-from collections import Counter
+import threading
+
+from transformers import WhisperForConditionalGeneration
+
+
+class _DecoderCalls:
+    """统计一次 generate 期间解码器的前向调用次数，并记录第一次调用时解码器输入 (提示 token) 的长度"""
+    def __init__(self, model: WhisperForConditionalGeneration):
+        self.calls = 0
+        self.prompt_length = None
+        self._handle = model.get_decoder().register_forward_pre_hook(self._pre_hook, with_kwargs=True)
+
+    def _pre_hook(self, module, args, kwargs):
+        self.calls += 1
+        if self.prompt_length is None:
+            input_ids = kwargs.get("input_ids", args[0] if args else None)
+            if input_ids is not None:
+                self.prompt_length = input_ids.shape[-1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._handle.remove()
 
-from transformers import WhisperProcessor, WhisperForConditionalGeneration, WhisperConfig
 
 class WhisperHandler:
     def __init__(self):
-        self._model = None
-        self._processor = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model_name_loaded = "original_whisper"
+        # 多个模型可同时常驻，由注册表负责加载、回退和按内存预算淘汰
+        self.registry = ModelRegistry(self.device)
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+        self.warmed_up = False
+        # 批处理调度线程不会被 fork 到子进程中，子进程首次使用时重新创建
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
 
-    def _load_finetuned_model(self):
-        """尝试加载微调后的模型和处理器"""
-        print(f"Attempting to load finetuned model from: {FINETUNED_WHISPER_CONFIG_DIR} and weights from: {FINETUNED_WHISPER_WEIGHTS_PATH}")
-        if FINETUNED_WHISPER_CONFIG_DIR.exists() and FINETUNED_WHISPER_WEIGHTS_PATH.exists():
-            try:
-                self._processor = WhisperProcessor.from_pretrained(str(FINETUNED_WHISPER_CONFIG_DIR))
-                
-                model_config = WhisperConfig.from_pretrained(str(FINETUNED_WHISPER_CONFIG_DIR))
-                self._model = WhisperForConditionalGeneration(config=model_config)
-                self._model.load_state_dict(torch.load(str(FINETUNED_WHISPER_WEIGHTS_PATH), map_location=self.device))
-                
-                self._model = self._model.to(self.device)
-                self._model.eval()
-                self.model_name_loaded = FINETUNED_WHISPER_CONFIG_DIR.name
-                print(f"Successfully loaded finetuned model '{self.model_name_loaded}' and processor from local files.")
-                return True
-            except Exception as e:
-                print(f"Error loading finetuned model: {e}. Will attempt to load original whisper model.")
-                self._model = None
-                self._processor = None
-                return False
-        else:
-            print("Finetuned model config or weights path does not exist. Will attempt to load original whisper model.")
-            return False
+    def _reset_after_fork(self):
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
 
-    def _load_original_whisper_model(self):
-        """加载原始的 OpenAI Whisper 模型"""
-        print(f"Attempting to load original OpenAI Whisper model: {WHISPER_MODEL_NAME}")
+    def _default_entry(self) -> Optional[LoadedModel]:
         try:
-            self._model = whisper.load_model(
-                WHISPER_MODEL_NAME if not WHISPER_MODEL_PATH.exists() else str(WHISPER_MODEL_PATH),
-                download_root=str(AI_MODEL_DIR)
-            )
-            self._model = self._model.to(self.device)
-            self.model_name_loaded = f"original_whisper_{WHISPER_MODEL_NAME}"
-            print(f"Successfully loaded original OpenAI Whisper model: {self.model_name_loaded}")
-            return True
+            return self.registry.get()
         except Exception as e:
-            print(f"Error loading original OpenAI Whisper model: {e}")
-            self._model = None
-            return False
+            print(f"Error loading default Whisper model: {e}")
+            return None
 
     @property
     def model(self):
-        if self._model is None:
-            if not self._load_finetuned_model():
-                self._load_original_whisper_model()
-        return self._model
-    
+        """默认模型 (未加载时先加载)"""
+        entry = self._default_entry()
+        return entry.model if entry is not None else None
+
+    @property
+    def model_name_loaded(self) -> str:
+        entry = self.registry.peek(self.registry.resolve())
+        return entry.model_type if entry is not None else "original_whisper"
+
+    @property
+    def model_load_time(self) -> float:
+        """默认模型的加载耗时 (秒)"""
+        entry = self.registry.peek(self.registry.resolve())
+        return entry.load_time if entry is not None else 0.0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.registry.is_resident(self.registry.resolve())
+
+    def warmup(self, model_name: Optional[str] = None) -> bool:
+        """
+        加载模型并用一段合成音频执行一次完整转录，
+        让权重加载、批处理线程和首次推理的内核初始化都发生在接收流量之前。
+        """
+        try:
+            entry = self.registry.get(model_name)
+        except Exception as e:
+            print(f"Warmup skipped: Whisper model could not be loaded ({e}).")
+            return False
+        warmup_start = time.time()
+        # 低幅度噪声而非全零，避免部分算子对全零输入走特殊路径
+        rng = np.random.default_rng(0)
+        synthetic_audio = (rng.standard_normal(int(WARMUP_AUDIO_SECONDS * SAMPLING_RATE)) * 1e-3).astype(np.float32)
+        # 合成噪声会被 VAD 判为静音，预热时跳过 VAD，确保真正执行一次解码
+        self.transcribe(synthetic_audio, model_name=entry.name, vad=False)
+        if model_name is None:
+            self.warmed_up = True
+        print(f"Warmup of '{entry.model_type}' finished in {time.time() - warmup_start:.2f}s "
+              f"(model load took {entry.load_time:.2f}s).")
+        return True
+
     @property
     def processor(self):
-        if self._processor is None:
-            _ = self.model
-            if self._processor is None and self.model_name_loaded.startswith("original_whisper"):
-                print("Original whisper model does not have a separate Hugging Face processor. Operations will use model's internal methods.")
-        return self._processor
-
-    def _find_keywords_and_semantics(self, text: str, keywords_to_check: List[str], semantic_keywords_map: Dict[str, List[str]]) -> Dict[str, Any]:
-        """在文本中查找指定的关键字和语义连接词 (不区分大小写)"""
-        lower_text = text.lower()
-        
-        found_plain_keywords = set()
-        for kw in keywords_to_check:
-            # 对于普通关键字，简单包含检查
-            if kw.lower() in lower_text:
-                found_plain_keywords.add(kw) 
-                
-        found_semantic_keywords: Dict[str, List[str]] = {}
-        for category, kws in semantic_keywords_map.items():
-            current_category_found = []
-            for kw in kws:
-                if kw.lower() in lower_text: # 简单包含检查
-                    current_category_found.append(kw)
-            if current_category_found:
-                found_semantic_keywords[category] = list(set(current_category_found)) # 去重
-                
-        return {
-            "keywords": list(found_plain_keywords),
-            "semantics": found_semantic_keywords
-        }
+        """默认模型的 Hugging Face 处理器 (原始 Whisper 模型没有单独的处理器，返回 None)"""
+        entry = self._default_entry()
+        if entry is not None and entry.processor is None:
+            print("Original whisper model does not have a separate Hugging Face processor. Operations will use model's internal methods.")
+        return entry.processor if entry is not None else None
+
+    @property
+    def batcher(self) -> MicroBatcher:
+        """微调模型 generate 的批处理调度器 (首次使用时在当前进程中创建调度线程)"""
+        if self._batcher is None:
+            with self._batcher_lock:
+                if self._batcher is None:
+                    self._batcher = MicroBatcher(
+                        self._generate_batch,
+                        max_batch_size=BATCH_MAX_SIZE,
+                        max_wait=BATCH_MAX_WAIT_MS / 1000.0,
+                        name="whisper-generate-batcher"
+                    )
+        return self._batcher
 
-    def _auto_detect_scene(self, text: str) -> str:
-        """根据文本内容自动判断场景"""
-        lower_text = text.lower()
-        scene_scores: Dict[str, int] = Counter()
-        indicator_map = get_scene_indicator_words()
+    def _generate_batch(self, key: GenerateKey, features_list: List[torch.Tensor]) -> List[str]:
+        """
+        把同一模型的多个 80x3000 特征拼成一个批次执行一次 generate，并按顺序返回各自的文本。
+        key 中带有草稿模型时改用辅助解码: Hugging Face 的辅助生成只支持 batch size 为 1，批次内逐个样本解码。
+        """
+        model_name, options, draft_name = key
+        # 提交样本的请求在等待结果期间持有该模型 (及草稿模型)，因此它们一定仍然常驻
+        entry = self.registry.peek(model_name)
+        if entry is None:
+            raise RuntimeError(f"Model '{model_name}' was evicted while requests were pending.")
+        draft = self.registry.peek(draft_name) if draft_name is not None else None
+        if draft_name is not None and draft is None:
+            raise RuntimeError(f"Draft model '{draft_name}' was evicted while requests were pending.")
+        # 特征转换为模型权重的数据类型 (bf16 模型需要 bf16 输入；int8 动态量化模型仍为 fp32)
+        model_dtype = next(entry.model.parameters()).dtype
+        input_features = torch.stack(features_list).to(self.device, dtype=model_dtype)
+        forced_decoder_ids = entry.processor.get_decoder_prompt_ids(
+            language=options.finetuned_language(), task=options.task or "transcribe"
+        )
+        if draft is None:
+            start = time.perf_counter()
+            with torch.inference_mode(), decoder_timer(), _DecoderCalls(entry.model) as calls:
+                predicted_ids = entry.model.generate(input_features=input_features, forced_decoder_ids=forced_decoder_ids,
+                                                     **options.generate_kwargs())
+            # 每 token 耗时只统计贪心解码，作为辅助解码加速比的基准
+            if options.is_greedy:
+                self._observe_token_time(entry, "greedy", time.perf_counter() - start,
+                                         predicted_ids.shape[-1] - (calls.prompt_length or 0))
+            return entry.processor.batch_decode(predicted_ids, skip_special_tokens=True)
 
-        for scene, indicators in indicator_map.items():
-            for indicator in indicators:
-                if indicator in lower_text:
-                    scene_scores[scene] += 1
-        
-        if scene_scores:
-            return scene_scores.most_common(1)[0][0]
-        return "通用"
+        sequences = []
+        for features in input_features:
+            start = time.perf_counter()
+            with torch.inference_mode(), decoder_timer(), \
+                    _DecoderCalls(entry.model) as calls, _DecoderCalls(draft.model) as draft_calls:
+                predicted_ids = entry.model.generate(input_features=features[None], forced_decoder_ids=forced_decoder_ids,
+                                                     assistant_model=draft.model, **options.generate_kwargs())
+            new_tokens = predicted_ids.shape[-1] - (calls.prompt_length or 0)
+            self._observe_token_time(entry, "assisted", time.perf_counter() - start, new_tokens)
+            # 每轮验证主模型前向一次，产出被接受的候选加上主模型自己的一个 token，
+            # 因此被接受的候选数 = 新 token 数 - 主模型前向次数；草稿模型每次前向提出一个候选
+            ASSISTED_DRAFT_TOKENS.inc(draft_calls.calls, model_type=entry.model_type)
+            ASSISTED_ACCEPTED_TOKENS.inc(max(0, new_tokens - calls.calls), model_type=entry.model_type)
+            sequences.append(predicted_ids[0])
+        return entry.processor.batch_decode(sequences, skip_special_tokens=True)
+
+    def _observe_token_time(self, entry: LoadedModel, mode: str, elapsed: float, new_tokens: int):
+        if new_tokens > 0:
+            DECODE_TOKEN_SECONDS.observe(elapsed / new_tokens, model_type=entry.model_type, mode=mode)
+
+    def _acquire_draft(self, stack: ExitStack, entry: LoadedModel, assisted: Optional[bool],
+                       options: DecodingOptions = DEFAULT_DECODING_OPTIONS) -> Optional[LoadedModel]:
+        """
+        需要辅助解码时在 stack 中持有 entry 配置的草稿模型并返回它 (assisted 为 None 时按 ASSISTED_DECODING_DEFAULT)。
+        模型没有配置草稿模型、草稿模型无法加载或与主模型精度不一致时返回 None，按普通贪心解码；
+        解码参数不是单次贪心解码 (束搜索或温度回退) 时也返回 None。
+        """
+        if not (ASSISTED_DECODING_DEFAULT if assisted is None else assisted):
+            return None
+        if not options.is_greedy:
+            if assisted:
+                print("Assisted decoding only applies to greedy decoding, ignoring it for beam search/temperature fallback.")
+            return None
+        draft_name = MODEL_SPECS.get(entry.name, {}).get("draft_model")
+        if entry.kind != KIND_FINETUNED or not draft_name:
+            print(f"Assisted decoding is not configured for '{entry.model_type}', using greedy decoding.")
+            return None
+        try:
+            draft = stack.enter_context(self.registry.acquire(draft_name))
+        except Exception as e:
+            print(f"Draft model '{draft_name}' could not be loaded ({e}), using greedy decoding.")
+            return None
+        if not isinstance(draft.model, WhisperForConditionalGeneration) or \
+                next(draft.model.parameters()).dtype != next(entry.model.parameters()).dtype:
+            print(f"Draft model '{draft.model_type}' cannot assist '{entry.model_type}', using greedy decoding.")
+            return None
+        # 每次 generate 从 ASSISTED_NUM_TOKENS 个候选开始，按接受情况增减 (不跨请求累积)
+        draft.model.generation_config.num_assistant_tokens = ASSISTED_NUM_TOKENS
+        draft.model.generation_config.num_assistant_tokens_schedule = "heuristic_transient"
+        return draft
+
+    @staticmethod
+    def _generate_key(entry: LoadedModel, options: DecodingOptions,
+                      draft: Optional[LoadedModel] = None) -> GenerateKey:
+        return (entry.name, options, draft.name if draft is not None else None)
+
+    def _transcribe_longform_many(self, entry: LoadedModel, speech_arrays: List[np.ndarray], sampling_rate: int,
+                                  key: GenerateKey,
+                                  progress_callback: Optional[ProgressCallback] = None,
+                                  segment_callback: Optional[Callable[[int, Dict[str, Any]], None]] = None
+                                  ) -> List[Union[List[Dict[str, Any]], Exception]]:
+        """
+        微调模型的长音频转录: 每段音频按 30 秒重叠窗口切分，所有音频的窗口按顺序分组提交给批处理调度器，
+        一个批次可以包含多段音频的窗口；各窗口的文本按音频逐个合并重叠区域，返回带真实起止时间的分段。
+        分段一旦确定 (下一个窗口已解码并去除重叠) 就以 segment_callback(音频序号, 分段) 交出，
+        此时下一组窗口已经提交，回调中的处理 (如关键字分析) 与解码同时进行。
+        某一组解码失败时，该组涉及的音频返回异常，其余音频不受影响。
+        """
+        all_windows = [split_windows(len(a), sampling_rate, LONGFORM_CHUNK_SECONDS, LONGFORM_OVERLAP_SECONDS)
+                       for a in speech_arrays]
+        flat = [(i, start, end) for i, windows in enumerate(all_windows) for start, end in windows]
+        mergers = [WindowMerger(windows, sampling_rate, LONGFORM_OVERLAP_SECONDS) for windows in all_windows]
+        segments: List[List[Dict[str, Any]]] = [[] for _ in speech_arrays]
+        errors: Dict[int, Exception] = {}
+        decoded_until = [0] * len(speech_arrays)
+        total_seconds = sum(len(a) for a in speech_arrays) / sampling_rate
+
+        def _emit(i: int, finished: List[Dict[str, Any]]):
+            segments[i].extend(finished)
+            if segment_callback is not None:
+                for segment in finished:
+                    segment_callback(i, segment)
+
+        def _collect(group, futures):
+            try:
+                group_texts = [future.result() for future in futures]
+            except Exception as e:
+                for i, _, _ in group:
+                    errors[i] = e
+                return
+            for (i, _, end), text in zip(group, group_texts):
+                if i in errors:
+                    continue
+                _emit(i, mergers[i].add(text))
+                decoded_until[i] = end
+            if progress_callback is not None:
+                progress_callback(sum(decoded_until) / sampling_rate, total_seconds)
+
+        # 每次只提交一个批次大小的窗口，让其他请求的样本有机会插入，避免长音频独占调度器；
+        # 提交下一组之后再等待并处理上一组，每个请求最多有两组窗口在调度器中
+        in_flight = None
+        for g in range(0, len(flat), BATCH_MAX_SIZE):
+            group = [w for w in flat[g:g + BATCH_MAX_SIZE] if w[0] not in errors]
+            if not group:
+                continue
+            try:
+                with stage_timer("feature_extraction"):
+                    input_features = entry.processor.feature_extractor(
+                        [speech_arrays[i][start:end] for i, start, end in group],
+                        sampling_rate=sampling_rate,
+                        return_tensors="pt"
+                    ).input_features
+                futures = self.batcher.submit_many_nowait(list(input_features), key=key)
+            except Exception as e:
+                for i, _, _ in group:
+                    errors[i] = e
+                continue
+            if in_flight is not None:
+                _collect(*in_flight)
+            in_flight = (group, futures)
+        if in_flight is not None:
+            _collect(*in_flight)
+
+        results: List[Union[List[Dict[str, Any]], Exception]] = []
+        for i in range(len(speech_arrays)):
+            if i in errors:
+                results.append(errors[i])
+                continue
+            _emit(i, mergers[i].finish())
+            results.append(segments[i])
+        return results
+
+    def _transcribe_longform(self, entry: LoadedModel, speech_array, sampling_rate: int, key: GenerateKey,
+                             progress_callback: Optional[ProgressCallback] = None,
+                             segment_callback: Optional[SegmentCallback] = None) -> List[Dict[str, Any]]:
+        """单段音频的长音频转录，见 _transcribe_longform_many"""
+        callback = None
+        if segment_callback is not None:
+            callback = lambda _i, segment: segment_callback(segment)
+        segments = self._transcribe_longform_many(entry, [speech_array], sampling_rate, key, progress_callback,
+                                                  segment_callback=callback)[0]
+        if isinstance(segments, Exception):
+            raise segments
+        return segments
 
-    def transcribe(self, audio_path: Union[str, Path], requested_scene: str = None) -> Dict[str, Any]:
+    def _speech_timeline(self, speech_array: np.ndarray) -> Optional[SpeechTimeline]:
+        """
+        VAD 预处理: 返回语音区间的时间轴；语音占比过高、裁剪收益不大时返回 None。
+        没有检测到语音但音频并不安静时也返回 None (解码整段音频): 整段都没有安静帧时 (例如持续的音调、
+        嘈杂环境) 噪声底估计偏高，不能据此判定为静音。
+        """
+        with stage_timer("vad"):
+            timeline = SpeechTimeline(detect_speech(speech_array, SAMPLING_RATE))
+            if timeline.speech_samples == 0 and peak_energy_db(speech_array, SAMPLING_RATE) > VAD_MIN_ENERGY_DB:
+                print("VAD: no speech regions found in non-silent audio, decoding the full clip.")
+                return None
+        if len(speech_array) == 0 or timeline.speech_samples > VAD_MAX_SPEECH_RATIO * len(speech_array):
+            return None
+        print(f"VAD: decoding {timeline.speech_samples / SAMPLING_RATE:.1f}s of speech "
+              f"out of {len(speech_array) / SAMPLING_RATE:.1f}s audio ({len(timeline.regions)} regions).")
+        return timeline
+
+    def _decode(self, entry: LoadedModel, speech_array: np.ndarray,
+                progress_callback: Optional[ProgressCallback] = None,
+                vad: bool = False,
+                segment_callback: Optional[SegmentCallback] = None,
+                draft: Optional[LoadedModel] = None,
+                options: DecodingOptions = DEFAULT_DECODING_OPTIONS) -> Tuple[str, str, List[Dict[str, Any]]]:
+        """
+        用指定模型解码 16kHz 波形，返回 (文本, 语言, 分段)。
+        vad=True 时只解码语音区间拼接成的紧凑音频，分段时间换算回原始时间轴；没有检测到语音时不调用模型。
+        segment_callback 按顺序收到每个确定的分段 (时间已换算回原始时间轴)。
+        draft 为辅助解码的草稿模型 (见 _acquire_draft)，None 表示普通解码；options 为解码参数。
+        """
+        timeline = self._speech_timeline(speech_array) if vad else None
+        if timeline is None:
+            return self._decode_array(entry, speech_array, progress_callback, segment_callback, draft, options)
+
+        duration = len(speech_array) / SAMPLING_RATE
+        if timeline.speech_samples == 0:
+            if progress_callback is not None:
+                progress_callback(duration, duration)
+            return "", "unknown", []
+        callback = on_segment = None
+        if progress_callback is not None:
+            callback = lambda decoded, _total: progress_callback(timeline.to_original(decoded, is_end=True), duration)
+        if segment_callback is not None:
+            on_segment = lambda segment: segment_callback(timeline.map_segments([segment])[0])
+        text, language, segments = self._decode_array(entry, timeline.compact(speech_array), callback, on_segment,
+                                                      draft, options)
+        return text, language, timeline.map_segments(segments)
+
+    def _decode_array(self, entry: LoadedModel, speech_array: np.ndarray,
+                      progress_callback: Optional[ProgressCallback] = None,
+                      segment_callback: Optional[SegmentCallback] = None,
+                      draft: Optional[LoadedModel] = None,
+                      options: DecodingOptions = DEFAULT_DECODING_OPTIONS) -> Tuple[str, str, List[Dict[str, Any]]]:
+        """用指定模型解码 16kHz 波形，返回 (文本, 语言, 分段)"""
+        # 桩模型提供与原始 Whisper 相同的 transcribe 接口
+        if entry.kind in (KIND_ORIGINAL, KIND_STUB):
+            # 原始 Whisper 的 transcribe 内部完成特征提取和解码，编码器耗时由钩子单独记录；
+            # 指定了语言时跳过开头的语言检测
+            with torch.inference_mode(), decoder_timer():
+                result = entry.model.transcribe(speech_array, fp16=torch.cuda.is_available(), **options.whisper_kwargs())
+            # 原始 Whisper 的 transcribe 没有进度钩子，只在结束时报告一次
+            if progress_callback is not None:
+                duration = len(speech_array) / SAMPLING_RATE
+                progress_callback(duration, duration)
+            segments = result.get("segments", [])
+            if segment_callback is not None:
+                for segment in segments:
+                    segment_callback(segment)
+            return result.get("text", ""), result.get("language", "unknown"), segments
+        if entry.processor and isinstance(entry.model, WhisperForConditionalGeneration):
+            segments = self._transcribe_longform(entry, speech_array, SAMPLING_RATE,
+                                                 key=self._generate_key(entry, options, draft),
+                                                 progress_callback=progress_callback, segment_callback=segment_callback)
+            return "".join(seg["text"] for seg in segments), options.finetuned_language(), segments
+        raise Exception(f"Model '{entry.model_type}' is not a recognized type for transcription.")
+
+    def transcribe_window(self, speech_array: np.ndarray, model_name: Optional[str] = None,
+                          assisted: Optional[bool] = None,
+                          options: DecodingOptions = DEFAULT_DECODING_OPTIONS) -> Dict[str, Any]:
+        """
+        只解码一段已解码的波形，不做关键字分析。
+        供实时流式转录使用: 滚动缓冲区会被反复解码，关键字分析只在分段确定后进行。
+        """
+        with self.registry.acquire(model_name) as entry, ExitStack() as stack:
+            draft = self._acquire_draft(stack, entry, assisted, options)
+            text, language, segments = self._decode(entry, speech_array, draft=draft, options=options)
+        return {"text": text.strip(), "language": language, "segments": segments, "model_type": entry.model_type}
+
+    def transcribe(self, audio: Union[str, Path, bytes, np.ndarray], requested_scene: str = None,
+                   model_name: Optional[str] = None,
+                   progress_callback: Optional[ProgressCallback] = None,
+                   vad: Optional[bool] = None,
+                   assisted: Optional[bool] = None,
+                   options: DecodingOptions = DEFAULT_DECODING_OPTIONS) -> Dict[str, Any]:
+        """
+        转录音频并进行关键字分析。
+        audio 可以是音频文件路径、内存中的完整音频字节，或已解码的 16kHz float32 波形。
+        model_name 为 MODEL_SPECS 中的模型名称，None 或 "auto" 表示默认模型。
+        progress_callback 在解码过程中以 (已解码秒数, 总秒数) 被调用。
+        vad 为 None 时按 VAD_ENABLED 决定是否先跳过静音区间。
+        assisted 为 True 时用草稿模型辅助解码 (结果与普通解码相同)，None 时按 ASSISTED_DECODING_DEFAULT。
+        options 为解码参数 (语言、任务、束搜索宽度、温度回退、最大 token 数)，两种模型分支都会使用。
+        """
         start_time = time.time() # 记录开始时间
         
-        current_model = self.model
-        if current_model is None:
-            raise Exception("Whisper model could not be loaded.")
-
         transcribed_text = ""
         detected_language = "unknown"
         segments = []
         _processing_time_value = 0.0 
 
-        try:
-            if self.model_name_loaded.startswith("original_whisper"):
-                result = current_model.transcribe(str(audio_path), fp16=torch.cuda.is_available())
-                transcribed_text = result.get("text", "")
-                detected_language = result.get("language", "unknown")
-                segments = result.get("segments", [])
-            elif self._processor and isinstance(current_model, WhisperForConditionalGeneration):
-                import librosa
-                
-                speech_array = librosa.load(str(audio_path), sr=self._processor.feature_extractor.sampling_rate)[0]
-                
-                processed_input = self._processor(
-                    speech_array,
-                    sampling_rate=self._processor.feature_extractor.sampling_rate, 
-                    return_tensors="pt",
-                )
-                input_features = processed_input["input_features"].to(self.device) # 使用字典访问
-                
-                if "attention_mask" in processed_input:
-                    attention_mask = processed_input["attention_mask"].to(self.device)
+        # 关键字分析随分段产生逐段进行，整个请求使用同一版本的词库
+        analysis = keyword_engine.current.incremental()
+
+        # 转录期间持有模型 (及草稿模型)，防止它被注册表淘汰
+        with self.registry.acquire(model_name) as entry, ExitStack() as stack:
+            model_type = entry.model_type
+            draft = self._acquire_draft(stack, entry, assisted, options)
+            try:
+                # 两种模型分支共用同一次 FFmpeg 解码 (16kHz 单声道)
+                if isinstance(audio, np.ndarray):
+                    speech_array = audio
                 else:
-                    print("WARNING: 'attention_mask' not found in processor output. Passing None to model.generate.")
-                    attention_mask = None 
+                    speech_array = load_audio(audio, SAMPLING_RATE)
 
-                forced_decoder_ids = self._processor.get_decoder_prompt_ids(language="zh", task="transcribe")
-                
-                generate_args = {
-                    "input_features": input_features,
-                    "forced_decoder_ids": forced_decoder_ids
-                }
-                if attention_mask is not None: # 只有当 attention_mask 存在时才传递
-                    generate_args["attention_mask"] = attention_mask
-                
-                predicted_ids = current_model.generate(**generate_args)
-                
-                transcription_result = self._processor.batch_decode(predicted_ids, skip_special_tokens=True)
-                transcribed_text = transcription_result[0] if transcription_result else ""
+                transcribed_text, detected_language, segments = self._decode(
+                    entry, speech_array, progress_callback, vad=VAD_ENABLED if vad is None else vad,
+                    segment_callback=lambda segment: self._analyze_segment(analysis, segment),
+                    draft=draft, options=options
+                )
                 
-                if hasattr(current_model.config, "forced_decoder_ids"):
-                    lang_code = "zh"
-                else:
-                    lang_code = "zh"
-                detected_language = lang_code
+                _processing_time_value = time.time() - start_time
+
+            except Exception as e:
+                _processing_time_value = time.time() - start_time 
+                if "ffmpeg" in str(e).lower():
+                    print("FFMPEG related error suspected. Please ensure FFmpeg is installed and in system PATH.")
                 
-                segments = [{"text": transcribed_text, "start": 0, "end": 0}]
-            else:
-                raise Exception(f"Model '{self.model_name_loaded}' is not a recognized type for transcription.")
-            
-            _processing_time_value = time.time() - start_time
+                import traceback
+                print(f"Error during transcription with model {model_type}:")
+                print(f"Exception Type: {type(e)}")
+                print(f"Exception Details: {str(e)}")
+                print("Traceback:")
+                traceback.print_exc()
 
-        except Exception as e:
-            _processing_time_value = time.time() - start_time 
-            if "ffmpeg" in str(e).lower():
-                print("FFMPEG related error suspected. Please ensure FFmpeg is installed and in system PATH.")
-            
-            import traceback
-            print(f"Error during transcription with model {self.model_name_loaded}:")
-            print(f"Exception Type: {type(e)}")
-            print(f"Exception Details: {str(e)}")
-            print("Traceback:")
-            traceback.print_exc()
-
-            raise
-        
-        if requested_scene and requested_scene != "auto":
-            final_scene = requested_scene
-        else:
-            final_scene = self._auto_detect_scene(transcribed_text)
+                raise
         
-        current_scene_keywords_config = KEYWORDS_CONFIG.get(final_scene, {})
-        scene_specific_plain_keywords = [kw.lower() for kw in current_scene_keywords_config.get("关键字", [])]
-        all_semantic_keywords_map = get_all_semantic_keywords_with_category()
-        analysis_result = self._find_keywords_and_semantics(transcribed_text, scene_specific_plain_keywords, all_semantic_keywords_map)
+        self._observe_real_time_factor(model_type, _processing_time_value, len(speech_array) / SAMPLING_RATE)
+        return self._build_output(transcribed_text, detected_language, segments, _processing_time_value,
+                                  len(speech_array) / SAMPLING_RATE, model_type, requested_scene, analysis)
 
+    def _observe_real_time_factor(self, model_type: str, processing_time: float, duration: float):
+        if duration > 0:
+            REAL_TIME_FACTOR.observe(processing_time / duration, model_type=model_type)
+            AUDIO_SECONDS.inc(duration, model_type=model_type)
+
+    def _build_output(self, transcribed_text: str, detected_language: str, segments: List[Dict[str, Any]],
+                      processing_time: float, duration: float, model_type: str,
+                      requested_scene: Optional[str],
+                      analysis: Optional[IncrementalAnalysis] = None) -> Dict[str, Any]:
         output = {
             "text": transcribed_text,
             "language": detected_language,
             "segments": segments,
-            "processing_time": _processing_time_value,
-            "model_type": self.model_name_loaded,
-            "device": self.device,
-            "detected_scene": final_scene,
-            "found_keywords": analysis_result["keywords"],
-            "found_semantics": analysis_result["semantics"]
+            "processing_time": processing_time,
+            "duration": duration,
+            "model_type": model_type,
+            "device": self.device
         }
-        
+        output.update(self._analyze_segments(transcribed_text, segments, duration, requested_scene, analysis))
         return output
 
-whisper_handler = WhisperHandler() 
\ No newline at end of file
+    def _analyze_segment(self, analysis: IncrementalAnalysis, segment: Dict[str, Any]):
+        with stage_timer("keyword_analysis"):
+            analysis.add_segment(segment.get("text", ""), segment.get("start", 0.0), segment.get("end", 0.0))
+
+    def _analyze_segments(self, text: str, segments: List[Dict[str, Any]], duration: float,
+                          requested_scene: Optional[str],
+                          analysis: Optional[IncrementalAnalysis] = None) -> Dict[str, Any]:
+        """
+        汇总逐段分析的结果。analysis 为 None 时 (批量转录、缓存结果重新分析) 在这里按分段补做；
+        没有分段的文本作为覆盖整段音频的一个分段分析。命中位置基于各分段文本拼接后的全文。
+        """
+        if analysis is None:
+            analysis = keyword_engine.current.incremental()
+            for segment in segments:
+                self._analyze_segment(analysis, segment)
+        if not analysis.segments and text:
+            self._analyze_segment(analysis, {"text": text, "start": 0.0, "end": duration})
+        analysis_result = analysis.result(requested_scene)
+        return {
+            "detected_scene": analysis_result["scene"],
+            "found_keywords": analysis_result["keywords"],
+            "found_semantics": analysis_result["semantics"],
+            "keyword_matches": analysis_result["matches"],
+            "scene_timeline": analysis.timeline(SCENE_TIMELINE_WINDOW_SECONDS),
+            "keywords_version": analysis_result["version"]
+        }
+
+    def refresh_analysis(self, result: Dict[str, Any], requested_scene: Optional[str]) -> Dict[str, Any]:
+        """
+        缓存的转录结果若由旧版本词库分析，按当前词库重新分析各分段 (不重新转录)，返回新的结果字典。
+        """
+        if result.get("keywords_version") == keyword_engine.version:
+            return result
+        return dict(result, **self._analyze_segments(result.get("text", ""), result.get("segments", []),
+                                                     result.get("duration", 0.0), requested_scene))
+
+    def transcribe_many(self, audios: List[Union[str, Path, bytes]], requested_scene: str = None,
+                        model_name: Optional[str] = None,
+                        vad: Optional[bool] = None,
+                        assisted: Optional[bool] = None,
+                        options: DecodingOptions = DEFAULT_DECODING_OPTIONS) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        批量转录多段音频，返回与输入顺序一致的列表，每项为转录结果 (同 transcribe) 或该音频的异常。
+
+        各音频先由 FFmpeg 并行解码；微调模型把所有音频的窗口一起分批送入 generate，
+        原始 Whisper 模型没有批量接口，逐段转录。单段音频出错不影响其他音频。
+        """
+        vad = VAD_ENABLED if vad is None else vad
+        start_time = time.time()
+        results: List[Union[Dict[str, Any], Exception]] = [None] * len(audios)
+
+        def _load(source):
+            try:
+                return load_audio(source, SAMPLING_RATE)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(BATCH_DECODE_WORKERS, len(audios)))) as pool:
+            arrays = list(pool.map(_load, audios))
+        decoded = [i for i, a in enumerate(arrays) if not isinstance(a, Exception)]
+        for i, a in enumerate(arrays):
+            if isinstance(a, Exception):
+                print(f"Batch item {i} could not be decoded: {a}")
+                results[i] = a
+        if not decoded:
+            return results
+
+        with self.registry.acquire(model_name) as entry, ExitStack() as stack:
+            draft = self._acquire_draft(stack, entry, assisted, options)
+            if entry.kind == KIND_FINETUNED and entry.processor and isinstance(entry.model, WhisperForConditionalGeneration):
+                # VAD 裁剪后只把语音部分送入批处理；没有语音的音频不参与解码
+                timelines = [self._speech_timeline(arrays[i]) if vad else None for i in decoded]
+                to_decode = [k for k, tl in enumerate(timelines) if tl is None or tl.speech_samples > 0]
+                engine = keyword_engine.current
+                analyses = [engine.incremental() for _ in decoded]
+
+                def _on_segment(n: int, segment: Dict[str, Any]):
+                    k = to_decode[n]
+                    if timelines[k] is not None:
+                        segment = timelines[k].map_segments([segment])[0]
+                    self._analyze_segment(analyses[k], segment)
+
+                decoded_segments = self._transcribe_longform_many(
+                    entry,
+                    [arrays[decoded[k]] if timelines[k] is None else timelines[k].compact(arrays[decoded[k]]) for k in to_decode],
+                    SAMPLING_RATE, key=self._generate_key(entry, options, draft), segment_callback=_on_segment
+                )
+                outcomes = [("", "unknown", [])] * len(decoded)
+                for k, segments in zip(to_decode, decoded_segments):
+                    if isinstance(segments, Exception):
+                        outcomes[k] = segments
+                        continue
+                    if timelines[k] is not None:
+                        segments = timelines[k].map_segments(segments)
+                    outcomes[k] = ("".join(seg["text"] for seg in segments), options.finetuned_language(), segments)
+            else:
+                analyses = [keyword_engine.current.incremental() for _ in decoded]
+                outcomes = []
+                for k, i in enumerate(decoded):
+                    try:
+                        outcomes.append(self._decode(
+                            entry, arrays[i], vad=vad, draft=draft, options=options,
+                            segment_callback=lambda segment, k=k: self._analyze_segment(analyses[k], segment)
+                        ))
+                    except Exception as e:
+                        outcomes.append(e)
+
+        # 批量转录的总耗时记在每个结果的 processing_time 中
+        processing_time = time.time() - start_time
+        self._observe_real_time_factor(entry.model_type, processing_time,
+                                       sum(len(arrays[i]) for i in decoded) / SAMPLING_RATE)
+        for k, (i, outcome) in enumerate(zip(decoded, outcomes)):
+            if isinstance(outcome, Exception):
+                print(f"Batch item {i} failed with model {entry.model_type}: {outcome}")
+                results[i] = outcome
+                continue
+            text, language, segments = outcome
+            results[i] = self._build_output(text, language, segments, processing_time,
+                                            len(arrays[i]) / SAMPLING_RATE, entry.model_type, requested_scene,
+                                            analyses[k])
+        return results
+
+whisper_handler = WhisperHandler()
+
+metrics.gauge(
+    "whisper_model_load_time_seconds", "Load time of each resident model in seconds.",
+    lambda: {(m["model_type"],): m["load_time"] for m in whisper_handler.registry.resident()}, ["model_type"]
+)
+metrics.gauge(
+    "whisper_batcher_pending", "Feature windows waiting for the generate batcher.",
+    lambda: whisper_handler._batcher.pending if whisper_handler._batcher is not None else 0
+) 
\ No newline at end of file
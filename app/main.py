@@ -1,12 +1,72 @@
+from contextlib import asynccontextmanager
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1 import transcribe
+from fastapi import Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from app.api.v1 import transcribe, stream, jobs, admin
+from app.core.config import PRELOAD_MODEL, INFERENCE_BACKEND
+from app.core.whisper_handler import whisper_handler
+from app.core.inference_pool import inference_executor
+from app.core.job_queue import job_manager
+from app.core.metrics import metrics, REQUEST_SECONDS
+import time
 import os
 
+
+async def _start_process_pool():
+    """启动多进程推理池: 必须在本进程执行任何推理之前完成，子进程在启动时各自预热"""
+    from app.core.process_pool import ProcessInferencePool
+    pool = ProcessInferencePool()
+    try:
+        await run_in_threadpool(pool.start)
+    except Exception as e:
+        print(f"Process inference pool could not be started, using inference threads instead: {e}")
+        pool.shutdown(wait=False)
+        return
+    inference_executor.attach_process_pool(pool)
+
+
+_process_pool_settled = False  # 多进程推理池已启动 (或启动失败并回退到线程)
+
+
+async def _preload_and_warmup():
+    """在后台线程中加载模型并预热，期间 /healthz 正常响应，/readyz 返回未就绪"""
+    global _process_pool_settled
+    if INFERENCE_BACKEND == "process":
+        await _start_process_pool()
+        _process_pool_settled = True
+        # 子进程已全部 fork 完成后再打开任务数据库；任务的推理同样交给推理池
+        await run_in_threadpool(job_manager.start, asyncio.get_running_loop())
+    if not PRELOAD_MODEL:
+        return
+    try:
+        # 多进程模式下本进程仍负责实时流式转录，同样需要预热
+        await run_in_threadpool(whisper_handler.warmup)
+    except Exception as e:
+        print(f"Model preload/warmup failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup_task = asyncio.create_task(_preload_and_warmup()) if PRELOAD_MODEL or INFERENCE_BACKEND == "process" else None
+    # 启动异步任务工作线程，上次未完成的任务会重新排队 (多进程模式下在推理池启动后再启动)
+    if INFERENCE_BACKEND != "process":
+        await run_in_threadpool(job_manager.start, asyncio.get_running_loop())
+    yield
+    await run_in_threadpool(job_manager.stop)
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    inference_executor.shutdown(wait=False)
+
+
 app = FastAPI(
     title="Whisper Transcription API",
     description="基于Whisper的语音转录API服务",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS 配置
@@ -18,8 +78,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # 按处理函数而不是实际路径统计，避免 /jobs/{job_id} 等路径产生大量标签
+        endpoint = request.scope.get("endpoint")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            handler=getattr(endpoint, "__name__", "unmatched"), method=request.method, status=str(status)
+        )
+
 # 添加API路由
 app.include_router(transcribe.router, prefix="/api/v1", tags=["transcribe"])
+app.include_router(stream.router, prefix="/api/v1", tags=["stream"])
+app.include_router(jobs.router, prefix="/api/v1", tags=["jobs"])
+app.include_router(admin.router, prefix="/api/v1", tags=["admin"])
 
 @app.get("/")
 async def root():
@@ -27,4 +106,30 @@ async def root():
         "message": "Welcome to Whisper Transcription API",
         "docs_url": "/docs",
         "redoc_url": "/redoc"
-    } 
\ No newline at end of file
+    }
+
+@app.get("/healthz")
+async def healthz():
+    """存活检查: 进程能响应请求即返回 200"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """就绪检查: 模型已加载并完成预热时返回 200，否则返回 503"""
+    ready = whisper_handler.is_loaded and (whisper_handler.warmed_up or not PRELOAD_MODEL)
+    if INFERENCE_BACKEND == "process":
+        ready = ready and _process_pool_settled
+    body = {
+        "status": "ready" if ready else "starting",
+        "model_loaded": whisper_handler.is_loaded,
+        "warmed_up": whisper_handler.warmed_up,
+        "model_type": whisper_handler.model_name_loaded if whisper_handler.is_loaded else None,
+        "model_load_time": whisper_handler.model_load_time,
+        "inference_backend": "process" if inference_executor.uses_process_pool else "thread"
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus 文本格式的指标: 各阶段耗时直方图、实时率、推理队列、模型加载耗时和进程内存"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,194 @@
+# benchmarks/bench_api.py
+# 转录 API 的服务端基准测试: 冷启动时间、单请求延迟分位数和不同并发下的持续吞吐量
+#
+# 用法 (在项目根目录下运行):
+#   python -m benchmarks.bench_api --start-server --stub                # 桩模型，离线测量 HTTP/解码/关键字开销
+#   python -m benchmarks.bench_api --start-server --durations 10 60     # 真实模型
+#   python -m benchmarks.bench_api --url http://127.0.0.1:8000          # 测量已经运行的服务
+import argparse
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import (
+    ROOT_DIR,
+    environment,
+    http_get,
+    post_file,
+    summarize,
+    synth_speech_like,
+    wav_bytes,
+    write_results
+)
+
+
+def start_server(port: int, stub: bool, stub_rtf: float, timeout: float) -> Tuple[subprocess.Popen, Dict[str, Any]]:
+    """启动 uvicorn 并测量冷启动: 进程启动到 /healthz 可用、到 /readyz 就绪 (模型加载并预热完成) 的时间"""
+    env = dict(os.environ)
+    if stub:
+        env["WHISPER_STUB_MODEL"] = "1"
+        env["WHISPER_STUB_RTF"] = str(stub_rtf)
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT_DIR, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    cold_start: Dict[str, Any] = {"healthz_seconds": None, "readyz_seconds": None}
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode} during startup")
+        try:
+            if cold_start["healthz_seconds"] is None and http_get(f"{base_url}/healthz")[0] == 200:
+                cold_start["healthz_seconds"] = time.perf_counter() - start
+            if cold_start["healthz_seconds"] is not None:
+                status, body = http_get(f"{base_url}/readyz")
+                if status == 200:
+                    cold_start["readyz_seconds"] = time.perf_counter() - start
+                    cold_start["model_load_time"] = json.loads(body).get("model_load_time")
+                    break
+        except OSError:
+            pass
+        time.sleep(0.1)
+    else:
+        proc.terminate()
+        raise RuntimeError(f"Server did not become ready within {timeout:.0f}s")
+    print(f"Cold start: healthz {cold_start['healthz_seconds']:.2f}s, readyz {cold_start['readyz_seconds']:.2f}s")
+    return proc, cold_start
+
+
+def _unique_payload(base: bytes, index: int) -> bytes:
+    """改写第一个采样，使每个请求的音频内容不同，避免命中转录结果缓存"""
+    payload = bytearray(base)
+    payload[44:48] = struct.pack("<I", index)
+    return bytes(payload)
+
+
+def run_level(url: str, base_audio: bytes, duration: float, concurrency: int, num_requests: int,
+              fields: Dict[str, str], allow_cache: bool, offset: int) -> Dict[str, Any]:
+    """以固定并发发送 num_requests 个请求，统计延迟分布与吞吐量"""
+    payloads = [base_audio if allow_cache else _unique_payload(base_audio, offset + i) for i in range(num_requests)]
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    def one(payload: bytes):
+        start = time.perf_counter()
+        status, _ = post_file(url, "bench.wav", payload, "audio/wav", fields)
+        return status, time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for status, elapsed in pool.map(one, payloads):
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+    wall = time.perf_counter() - wall_start
+
+    result = {
+        "audio_seconds": duration,
+        "concurrency": concurrency,
+        "requests": num_requests,
+        "status_counts": statuses,
+        "latency": summarize(latencies),
+        "wall_seconds": wall,
+        "throughput_rps": len(latencies) / wall if wall > 0 else None,
+        "audio_seconds_per_second": len(latencies) * duration / wall if wall > 0 else None
+    }
+    lat = result["latency"]
+    print(f"  audio={duration:>6.1f}s concurrency={concurrency:>3d} ok={len(latencies)}/{num_requests} "
+          f"p50={lat['p50'] or 0:.3f}s p90={lat['p90'] or 0:.3f}s p99={lat['p99'] or 0:.3f}s "
+          f"rps={result['throughput_rps'] or 0:.2f} audio_x={result['audio_seconds_per_second'] or 0:.1f}")
+    return result
+
+
+def scrape_stages(base_url: str) -> Dict[str, Dict[str, float]]:
+    """从 /metrics 读取各阶段的累计耗时与次数"""
+    try:
+        status, body = http_get(f"{base_url}/metrics")
+    except OSError:
+        return {}
+    if status != 200:
+        return {}
+    stages: Dict[str, Dict[str, float]] = {}
+    for line in body.decode("utf-8").splitlines():
+        for suffix in ("_sum", "_count"):
+            prefix = f"whisper_stage_duration_seconds{suffix}{{stage=\""
+            if line.startswith(prefix):
+                stage = line[len(prefix):line.index('"', len(prefix))]
+                stages.setdefault(stage, {})[suffix[1:]] = float(line.rsplit(" ", 1)[1])
+    for values in stages.values():
+        values["mean"] = values.get("sum", 0.0) / values["count"] if values.get("count") else None
+    return stages
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark POST /api/v1/transcribe/")
+    parser.add_argument("--url", default=None, help="已运行服务的地址，例如 http://127.0.0.1:8000")
+    parser.add_argument("--start-server", action="store_true", help="启动一个 uvicorn 进程并测量冷启动时间")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stub", action="store_true", help="使用桩模型 (WHISPER_STUB_MODEL=1)，仅与 --start-server 一起使用")
+    parser.add_argument("--stub-rtf", type=float, default=0.0, help="桩模型模拟的实时率")
+    parser.add_argument("--startup-timeout", type=float, default=900)
+    parser.add_argument("--durations", type=float, nargs="+", default=[5.0, 30.0, 120.0], help="合成音频时长 (秒)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=20, help="每个并发级别的请求数")
+    parser.add_argument("--warmup", type=int, default=2, help="每个音频时长正式计时前的预热请求数")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--scene", default=None)
+    parser.add_argument("--allow-cache", action="store_true", help="重复发送相同音频，测量缓存命中路径")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径 (默认 benchmarks/results/api-<时间>.json)")
+    args = parser.parse_args(argv)
+
+    if not args.url and not args.start_server:
+        parser.error("either --url or --start-server is required")
+
+    proc = None
+    cold_start = None
+    base_url = args.url.rstrip("/") if args.url else f"http://127.0.0.1:{args.port}"
+    if args.start_server:
+        proc, cold_start = start_server(args.port, args.stub, args.stub_rtf, args.startup_timeout)
+
+    fields = {"return_type": "json"}
+    if args.model:
+        fields["model"] = args.model
+    if args.scene:
+        fields["scene"] = args.scene
+    url = f"{base_url}/api/v1/transcribe/"
+
+    results = []
+    offset = 0
+    try:
+        for duration in args.durations:
+            base_audio = wav_bytes(synth_speech_like(duration))
+            print(f"Audio {duration:.1f}s ({len(base_audio) / 1024:.0f} KB)")
+            for i in range(args.warmup):
+                post_file(url, "warmup.wav", _unique_payload(base_audio, 10 ** 9 + offset + i), "audio/wav", fields)
+            offset += args.warmup
+            for concurrency in args.concurrency:
+                results.append(run_level(url, base_audio, duration, concurrency, args.requests,
+                                         fields, args.allow_cache, offset))
+                offset += args.requests
+        stages = scrape_stages(base_url)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    write_results({
+        "benchmark": "api",
+        "environment": environment(),
+        "config": vars(args),
+        "cold_start": cold_start,
+        "results": results,
+        "stages": stages
+    }, args.output, "api")
+
+
+if __name__ == "__main__":
+    main()
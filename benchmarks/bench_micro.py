@@ -0,0 +1,104 @@
+# benchmarks/bench_micro.py
+# 微基准测试: 关键字/场景分析、FFmpeg 音频解码和 VAD，不需要模型文件
+#
+# 用法 (在项目根目录下运行):
+#   python -m benchmarks.bench_micro
+#   python -m benchmarks.bench_micro --repeat 50 --output benchmarks/results/micro-base.json
+import argparse
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import environment, summarize, synth_speech_like, time_calls, wav_bytes, write_results
+from app.core.keyword_engine import keyword_engine
+from app.core.stub_model import SAMPLE_SENTENCES
+
+
+def _text_of_length(n_chars: int) -> str:
+    text = ""
+    i = 0
+    while len(text) < n_chars:
+        text += SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)]
+        i += 1
+    return text[:n_chars]
+
+
+def bench_keywords(lengths: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """WhisperHandler 转录后的关键字分析 (keyword_engine.analyze)，分别测自动场景和指定场景"""
+    results = []
+    for n_chars in lengths:
+        text = _text_of_length(n_chars)
+        for scene in (None, "课堂"):
+            timings = time_calls(lambda: keyword_engine.analyze(text, requested_scene=scene), repeat)
+            stats = summarize(timings)
+            results.append({
+                "name": "keyword_analysis",
+                "chars": n_chars,
+                "scene": scene or "auto",
+                "timing": stats,
+                "chars_per_second": n_chars / stats["mean"] if stats["mean"] else None
+            })
+            print(f"  keyword_analysis chars={n_chars:>6d} scene={scene or 'auto':<4} "
+                  f"mean={stats['mean'] * 1e3:.3f}ms p90={stats['p90'] * 1e3:.3f}ms")
+    return results
+
+
+def bench_audio(durations: List[float], repeat: int) -> List[Dict[str, Any]]:
+    """FFmpeg 解码 + 重采样 (文件路径 / 内存字节两种输入)，以及 VAD"""
+    from app.core.audio import load_audio
+    from app.core.vad import detect_speech
+
+    results = []
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+    if not has_ffmpeg:
+        print("  ffmpeg not found, skipping audio decode benchmarks")
+    with tempfile.TemporaryDirectory() as tmp:
+        for duration in durations:
+            audio = synth_speech_like(duration)
+            data = wav_bytes(audio)
+            path = Path(tmp) / f"{duration:g}s.wav"
+            path.write_bytes(data)
+
+            cases = [("vad", lambda: detect_speech(audio))]
+            if has_ffmpeg:
+                cases += [
+                    ("audio_decode_path", lambda: load_audio(path)),
+                    ("audio_decode_bytes", lambda: load_audio(data)),
+                ]
+            for name, fn in cases:
+                stats = summarize(time_calls(fn, repeat))
+                results.append({
+                    "name": name,
+                    "audio_seconds": duration,
+                    "timing": stats,
+                    "real_time_factor": stats["mean"] / duration if stats["mean"] else None
+                })
+                print(f"  {name:<18} audio={duration:>6.1f}s mean={stats['mean'] * 1e3:.2f}ms "
+                      f"p90={stats['p90'] * 1e3:.2f}ms")
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks for keyword analysis, audio decoding and VAD")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--text-lengths", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--durations", type=float, nargs="+", default=[5.0, 30.0, 300.0])
+    parser.add_argument("--output", default=None, help="结果 JSON 路径 (默认 benchmarks/results/micro-<时间>.json)")
+    args = parser.parse_args(argv)
+
+    print("Keyword analysis")
+    results = bench_keywords(args.text_lengths, args.repeat)
+    print("Audio")
+    results += bench_audio(args.durations, args.repeat)
+
+    write_results({
+        "benchmark": "micro",
+        "environment": environment(),
+        "config": vars(args),
+        "results": results
+    }, args.output, "micro")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# benchmarks/common.py
+# 基准测试脚本共用的工具: 合成音频、计时统计、HTTP multipart 上传和结果文件读写
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+import urllib.error
+import urllib.request
+import uuid
+import wave
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).parent.parent
+RESULTS_DIR = Path(__file__).parent / "results"
+SAMPLING_RATE = 16000
+
+
+def synth_speech_like(duration: float, sr: int = SAMPLING_RATE, seed: int = 0) -> np.ndarray:
+    """
+    生成类似语音的合成音频: 带谐波的浊音片段 (基频随机) 与短停顿交替，
+    能被 VAD 判为语音，避免基准测试时被当作静音跳过。
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    audio = (rng.standard_normal(n) * 0.002).astype(np.float32)
+    pos = 0
+    while pos < n:
+        length = int(rng.uniform(0.8, 3.0) * sr)
+        end = min(n, pos + length)
+        t = np.arange(end - pos) / sr
+        f0 = rng.uniform(100, 220)
+        voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 8))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 5) * t)
+        audio[pos:end] += (0.08 * voiced * envelope).astype(np.float32)
+        pos = end + int(rng.uniform(0.1, 0.5) * sr)
+    return np.clip(audio, -1.0, 1.0)
+
+
+def wav_bytes(audio: np.ndarray, sr: int = SAMPLING_RATE) -> bytes:
+    """16 位单声道 WAV 文件内容"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes((audio * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def summarize(samples: List[float]) -> Dict[str, Optional[float]]:
+    """均值、分位数和最大值 (秒)"""
+    if not samples:
+        return {"count": 0, "mean": None, "p50": None, "p90": None, "p99": None, "max": None}
+    arr = np.asarray(samples, dtype=np.float64)
+    return {
+        "count": len(samples),
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p90": float(np.percentile(arr, 90)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max())
+    }
+
+
+def time_calls(fn: Callable[[], Any], repeat: int, warmup: int = 1) -> List[float]:
+    """执行 warmup 次预热后，再执行 repeat 次并返回每次的耗时 (秒)"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def post_file(url: str, filename: str, content: bytes, content_type: str,
+              fields: Optional[Dict[str, str]] = None, timeout: float = 600) -> Tuple[int, bytes]:
+    """以 multipart/form-data 上传一个文件 (字段名 file)，返回 (状态码, 响应体)"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode("utf-8")
+        )
+    parts.append(
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {content_type}\r\n\r\n".encode("utf-8")
+    )
+    parts.append(content)
+    parts.append(f"\r\n--{boundary}--\r\n".encode("utf-8"))
+    request = urllib.request.Request(
+        url, data=b"".join(parts), method="POST",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def http_get(url: str, timeout: float = 5) -> Tuple[int, bytes]:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def environment() -> Dict[str, Any]:
+    """记录运行环境，便于比较不同提交的结果"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_DIR, capture_output=True, text=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "git_dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def write_results(results: Dict[str, Any], output: Optional[str], prefix: str) -> Path:
+    """写入 JSON 结果文件；未指定路径时写入 benchmarks/results/<prefix>-<时间>.json"""
+    if output:
+        path = Path(output)
+    else:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nResults written to {path}")
+    return path
@@ -0,0 +1,106 @@
+# benchmarks/compare.py
+# 比较两个基准测试结果文件 (bench_api 或 bench_micro 的输出)，打印相对变化并标出退化
+#
+# 用法 (在项目根目录下运行):
+#   python -m benchmarks.compare benchmarks/results/api-base.json benchmarks/results/api-new.json
+#   python -m benchmarks.compare base.json new.json --threshold 5
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# 各类结果用于配对的字段，以及要比较的指标: (显示名, 取值路径, 越大越好)
+_KEY_FIELDS = ("name", "chars", "scene", "audio_seconds", "concurrency")
+_API_METRICS = [
+    ("p50", ("latency", "p50"), False),
+    ("p90", ("latency", "p90"), False),
+    ("p99", ("latency", "p99"), False),
+    ("rps", ("throughput_rps",), True),
+]
+_MICRO_METRICS = [
+    ("mean", ("timing", "mean"), False),
+    ("p90", ("timing", "p90"), False),
+]
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _entry_key(entry: Dict[str, Any]) -> Tuple:
+    return tuple((field, entry[field]) for field in _KEY_FIELDS if field in entry)
+
+
+def _lookup(entry: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value: Any = entry
+    for part in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> List[str]:
+    """打印逐项对比，返回超过阈值 (百分比) 的退化项"""
+    metric_defs = _API_METRICS if base.get("benchmark") == "api" else _MICRO_METRICS
+    base_entries = {_entry_key(e): e for e in base.get("results", [])}
+    regressions = []
+
+    for entry in new.get("results", []):
+        key = _entry_key(entry)
+        old = base_entries.get(key)
+        label = " ".join(f"{field}={value}" for field, value in key)
+        if old is None:
+            print(f"{label:<50} (no baseline)")
+            continue
+        parts = []
+        for name, path, higher_is_better in metric_defs:
+            before, after = _lookup(old, path), _lookup(entry, path)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = " !"
+                regressions.append(f"{label} {name} {change:+.1f}%")
+            parts.append(f"{name} {before:.4g}->{after:.4g} ({change:+.1f}%){flag}")
+        print(f"{label:<50} " + "  ".join(parts))
+
+    for name in ("healthz_seconds", "readyz_seconds"):
+        before = _lookup(base, ("cold_start", name))
+        after = _lookup(new, ("cold_start", name))
+        if before and after is not None:
+            print(f"cold_start {name:<39} {before:.3f}s->{after:.3f}s ({(after - before) / before * 100:+.1f}%)")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base", help="基线结果 JSON")
+    parser.add_argument("new", help="新结果 JSON")
+    parser.add_argument("--threshold", type=float, default=10.0, help="视为退化的变化百分比")
+    args = parser.parse_args(argv)
+
+    base, new = _load(args.base), _load(args.new)
+    if base.get("benchmark") != new.get("benchmark"):
+        parser.error(f"cannot compare '{base.get('benchmark')}' results with '{new.get('benchmark')}' results")
+    for label, data in (("base", base), ("new", new)):
+        env = data.get("environment") or {}
+        dirty = " (dirty)" if env.get("git_dirty") else ""
+        print(f"{label}: commit {env.get('git_commit')}{dirty}, python {env.get('python')}, cpus {env.get('cpu_count')}")
+    print()
+
+    regressions = compare(base, new, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:g}%:")
+        for item in regressions:
+            print(f"  {item}")
+        return 1
+    print(f"\nNo regressions over {args.threshold:g}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
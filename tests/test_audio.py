@@ -0,0 +1,38 @@
+import numpy as np
+
+from app.core.audio import StreamResampler
+
+
+def _tone(freq, sr, seconds=1.0):
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def _rms(audio):
+    # 跳过开头的滤波器延迟
+    return float(np.sqrt(np.mean(audio[1000:] ** 2)))
+
+
+def test_high_frequencies_do_not_alias_into_the_speech_band():
+    # 12kHz 在 16kHz 采样下会混叠到 4kHz
+    out = StreamResampler(48000).process(_tone(12000, 48000))
+    assert _rms(out) < 0.005
+
+
+def test_speech_band_is_preserved():
+    out = StreamResampler(44100).process(_tone(1000, 44100))
+    assert abs(_rms(out) - 0.5 / np.sqrt(2)) < 0.01
+
+
+def test_chunked_output_matches_one_shot_output():
+    audio = np.random.default_rng(0).standard_normal(44100).astype(np.float32) * 0.1
+    whole = StreamResampler(44100).process(audio)
+    resampler = StreamResampler(44100)
+    chunks = [resampler.process(audio[i:i + 1234]) for i in range(0, len(audio), 1234)]
+    assert np.allclose(np.concatenate(chunks), whole, atol=1e-6)
+    assert abs(len(whole) - 16000) <= 1
+
+
+def test_target_rate_passes_through():
+    audio = _tone(1000, 16000)
+    assert StreamResampler(16000).process(audio) is audio
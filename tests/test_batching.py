@@ -0,0 +1,34 @@
+import pytest
+
+from app.core.batching import MicroBatcher
+
+
+class _Abort(BaseException):
+    pass
+
+
+def test_base_exception_fails_the_batch_but_keeps_the_loop_running():
+    calls = []
+
+    def process(key, payloads):
+        calls.append(payloads)
+        if len(calls) == 1:
+            raise _Abort("interrupted")
+        return [payload * 2 for payload in payloads]
+
+    batcher = MicroBatcher(process, max_batch_size=4, max_wait=0.01)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        batcher.submit(1, timeout=5)
+    assert batcher.submit(2, timeout=5) == 4
+    assert batcher._thread.is_alive()
+
+
+def test_exception_is_passed_to_every_caller_in_the_batch():
+    def process(key, payloads):
+        raise ValueError("bad batch")
+
+    batcher = MicroBatcher(process, max_batch_size=4, max_wait=0.05)
+    futures = batcher.submit_many_nowait([1, 2, 3])
+    for future in futures:
+        with pytest.raises(ValueError, match="bad batch"):
+            future.result(timeout=5)
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from app.core.export import iter_export
+
+
+def _export(result, fmt):
+    return b"".join(iter_export(result, fmt)).decode("utf-8")
+
+
+def _result(text):
+    return {"text": text, "segments": [{"start": 0.0, "end": 1.5, "text": text}], "keyword_matches": []}
+
+
+def test_srt_escapes_markup_from_the_transcript():
+    srt = _export(_result("如果 a<b 且 {\\an8} 成立"), "srt")
+    assert "1\n00:00:00,000 --> 00:00:01,500\n" in srt
+    assert "a&lt;b" in srt
+    assert "{" not in srt and "｛\\an8｝" in srt
+
+
+def test_srt_keeps_keyword_highlight_tags():
+    result = _result("今天讲作业<重点>")
+    result["keyword_matches"] = [{"term": "作业", "type": "keyword", "start": 3, "end": 5}]
+    srt = _export(result, "srt")
+    assert "今天讲<b>作业</b>&lt;重点&gt;" in srt
+
+
+def test_vtt_escapes_markup_from_the_transcript():
+    assert "a&lt;b" in _export(_result("a<b"), "vtt")
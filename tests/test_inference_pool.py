@@ -0,0 +1,67 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core.inference_pool import InferenceExecutor, InferenceQueueFull
+
+
+class _FakeProcessPool:
+    """用线程池代替推理子进程池，只提供 InferenceExecutor 用到的接口"""
+    def __init__(self, num_workers):
+        self.num_workers = num_workers
+        self._executor = ThreadPoolExecutor(max_workers=num_workers)
+
+    def submit(self, fn, *args, **kwargs):
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def _blocker():
+    release = threading.Event()
+    return release, lambda: release.wait(5)
+
+
+def test_streaming_work_does_not_use_process_pool_slots():
+    executor = InferenceExecutor(max_workers=1, max_queue=0)
+    executor.attach_process_pool(_FakeProcessPool(num_workers=2))
+    release, block = _blocker()
+
+    async def main():
+        local = asyncio.ensure_future(executor.run_local(block))
+        await asyncio.sleep(0.05)
+        # 本进程线程池已满，但推理子进程仍有两个空闲名额
+        remote = [asyncio.ensure_future(executor.run(block)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert executor.in_flight == 3
+        assert executor.queue_depth == 0
+        with pytest.raises(InferenceQueueFull):
+            await executor.run_local(block)
+        with pytest.raises(InferenceQueueFull):
+            await executor.run(block)
+        release.set()
+        await asyncio.gather(local, *remote)
+
+    asyncio.run(main())
+    assert executor.pending == 0
+    executor.shutdown()
+
+
+def test_queue_depth_is_counted_against_each_backends_workers():
+    executor = InferenceExecutor(max_workers=4, max_queue=4)
+    executor.attach_process_pool(_FakeProcessPool(num_workers=1))
+    release, block = _blocker()
+
+    async def main():
+        remote = [asyncio.ensure_future(executor.run(block)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert executor.in_flight == 1
+        assert executor.queue_depth == 2
+        release.set()
+        await asyncio.gather(*remote)
+
+    asyncio.run(main())
+    executor.shutdown()
@@ -0,0 +1,38 @@
+from app.core.longform import _dedupe_overlap, merge_windows
+
+MAX_CHARS = 50
+
+
+def test_no_overlap_keeps_both_texts():
+    prev, cur = "今天的课程到这里结束", "请大家回去复习第三章"
+    assert _dedupe_overlap(prev, cur, MAX_CHARS) == (prev, cur)
+
+
+def test_spurious_bigram_keeps_both_texts():
+    prev, cur = "这是第一部分的结尾了", "接下来我们看第二部分"
+    assert _dedupe_overlap(prev, cur, MAX_CHARS) == (prev, cur)
+
+
+def test_shared_phrase_in_the_middle_keeps_both_texts():
+    prev, cur = "今天我们先讲一下概率论的基本内容", "下一个话题是关于概率论的内容，我们继续"
+    assert _dedupe_overlap(prev, cur, MAX_CHARS) == (prev, cur)
+
+
+def test_true_overlap_is_removed_from_current_text():
+    prev = "今天我们讨论线性代数的基本概念和矩阵运算"
+    cur = "概念和矩阵运算，然后看几个例子"
+    assert _dedupe_overlap(prev, cur, MAX_CHARS) == (prev, "，然后看几个例子")
+
+
+def test_true_overlap_with_truncated_edges_and_one_substitution():
+    # 前一段末尾多出被截断的半个字词，当前段的重叠部分有一个字识别不同
+    prev = "我们讨论线性代数的基本概念和矩阵运算的"
+    cur = "本概念和据阵运算的几个例子"
+    assert _dedupe_overlap(prev, cur, MAX_CHARS) == (prev, "几个例子")
+
+
+def test_merge_windows_does_not_drop_unrelated_window():
+    sr = 100
+    windows = [(0, 3000), (2500, 5500)]
+    segments = merge_windows(windows, ["这是第一部分的结尾了", "接下来我们看第二部分"], sr, 5)
+    assert "".join(seg["text"] for seg in segments) == "这是第一部分的结尾了接下来我们看第二部分"
@@ -0,0 +1,26 @@
+import pickle
+
+from app.core.metrics import instrument_encoder
+
+
+class _FakeEncoder:
+    """只记录注册的钩子，代替 torch 的编码器模块"""
+    def __init__(self):
+        self.pre_hooks = []
+        self.hooks = []
+
+    def register_forward_pre_hook(self, hook):
+        self.pre_hooks.append(hook)
+
+    def register_forward_hook(self, hook):
+        self.hooks.append(hook)
+
+
+def test_instrumented_encoder_can_be_pickled():
+    # spawn 方式的推理子进程通过 pickle 接收已加载 (并已注册钩子) 的模型
+    encoder = _FakeEncoder()
+    instrument_encoder(encoder)
+    restored = pickle.loads(pickle.dumps(encoder))
+    assert len(restored.pre_hooks) == 1 and len(restored.hooks) == 1
+    restored.pre_hooks[0](restored, ())
+    restored.hooks[0](restored, (), None)
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app.core.result_cache import ResultCache
+
+
+def test_waiters_get_result_when_disk_write_fails(tmp_path, monkeypatch):
+    cache = ResultCache(disk_dir=tmp_path, memory_entries=4)
+    key = "k" * 64
+    started, release = threading.Event(), threading.Event()
+    results = {}
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return {"text": "你好"}
+
+    def broken_mkdir(self, *args, **kwargs):
+        raise PermissionError("read-only")
+
+    monkeypatch.setattr(Path, "mkdir", broken_mkdir)
+    owner = threading.Thread(target=lambda: results.setdefault("owner", cache.get_or_compute(key, compute)))
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(
+        target=lambda: results.setdefault("waiter", cache.get_or_compute(key, lambda: pytest.fail("computed twice")))
+    )
+    waiter.start()
+    time.sleep(0.1)  # 让等待者阻塞在进行中的计算上
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+
+    assert not owner.is_alive() and not waiter.is_alive()
+    assert results["owner"] == ({"text": "你好"}, False)
+    assert results["waiter"] == ({"text": "你好"}, True)
+    # 写盘失败时仍保留内存层结果
+    assert cache.get(key) == {"text": "你好"}
+
+
+def test_compute_error_propagates_and_clears_in_flight(tmp_path):
+    cache = ResultCache(disk_dir=tmp_path)
+
+    def compute():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("a" * 64, compute)
+    assert cache._in_flight == {}
+    assert cache.get_or_compute("a" * 64, lambda: {"text": "ok"}) == ({"text": "ok"}, False)
+
+
+def test_put_tolerates_file_removed_before_stat(tmp_path, monkeypatch):
+    cache = ResultCache(disk_dir=tmp_path)
+    real_stat = Path.stat
+
+    def racing_stat(self, *args, **kwargs):
+        if self.suffix == ".json":
+            self.unlink(missing_ok=True)
+        return real_stat(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "stat", racing_stat)
+    cache.put("b" * 64, {"text": "ok"})
+    assert cache.get("b" * 64) == {"text": "ok"}
+
+
+def test_async_requests_for_the_same_key_compute_once(tmp_path):
+    cache = ResultCache(disk_dir=tmp_path)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"text": "ok"}
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute_async("c" * 64, compute) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert sorted(cached for _, cached in results) == [False, True, True]
+    assert all(result == {"text": "ok"} for result, _ in results)
+
+
+def test_async_batch_computes_only_missing_keys_once(tmp_path):
+    cache = ResultCache(disk_dir=tmp_path)
+    cache.put("h" * 64, {"text": "hit"})
+    requested = []
+
+    async def compute_many(indices):
+        requested.append(indices)
+        return [{"text": "new"}, ValueError("bad audio")]
+
+    keys = ["m" * 64, "h" * 64, "m" * 64, "e" * 64]
+    outcomes = asyncio.run(cache.get_or_compute_many_async(keys, compute_many))
+
+    assert requested == [[0, 3]]
+    assert outcomes[0] == ({"text": "new"}, False)
+    assert outcomes[1] == ({"text": "hit"}, True)
+    assert outcomes[2] == ({"text": "new"}, False)
+    assert isinstance(outcomes[3][0], ValueError)
+    assert cache._in_flight == {}
+    assert cache.get("e" * 64) is None
+
+
+def test_results_rejected_by_cacheable_are_returned_but_not_stored(tmp_path):
+    cache = ResultCache(disk_dir=tmp_path)
+    from_fallback = {"text": "fallback", "model_type": "original_whisper_small"}
+    only_finetuned = lambda result: result["model_type"] == "whisper_small_finetuned_config"
+
+    assert cache.get_or_compute("f" * 64, lambda: from_fallback, only_finetuned) == (from_fallback, False)
+    assert cache.get("f" * 64) is None
+
+    async def compute():
+        return from_fallback
+
+    assert asyncio.run(cache.get_or_compute_async("g" * 64, compute, only_finetuned)) == (from_fallback, False)
+    assert cache.get("g" * 64) is None
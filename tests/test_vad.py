@@ -0,0 +1,39 @@
+import numpy as np
+
+from app.core.config import SAMPLING_RATE, VAD_MIN_ENERGY_DB
+from app.core.vad import detect_speech, peak_energy_db
+
+
+def _tone(seconds, freq=200.0, amplitude=0.3):
+    t = np.arange(int(seconds * SAMPLING_RATE), dtype=np.float32) / SAMPLING_RATE
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def test_steady_tone_without_quiet_reference_is_one_region():
+    audio = _tone(5.0)
+    # 没有安静帧时噪声底等于信号本身，不能用自适应阈值裁剪，整段作为一个区间
+    assert detect_speech(audio) == [(0, len(audio))]
+    assert peak_energy_db(audio) > VAD_MIN_ENERGY_DB
+
+
+def test_continuous_audio_with_louder_burst_is_not_trimmed_to_the_burst():
+    t = np.arange(60 * SAMPLING_RATE, dtype=np.float32) / SAMPLING_RATE
+    audio = (0.1 * (0.8 + 0.2 * np.sin(2 * np.pi * 3 * t)) * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+    audio[30 * SAMPLING_RATE:31 * SAMPLING_RATE] *= 4
+    assert detect_speech(audio) == [(0, len(audio))]
+
+
+def test_silence_is_below_the_energy_floor():
+    audio = np.zeros(5 * SAMPLING_RATE, dtype=np.float32)
+    assert detect_speech(audio) == []
+    assert peak_energy_db(audio) < VAD_MIN_ENERGY_DB
+    assert peak_energy_db(audio[:10]) < VAD_MIN_ENERGY_DB
+
+
+def test_tone_between_silences_is_detected():
+    silence = np.zeros(3 * SAMPLING_RATE, dtype=np.float32)
+    audio = np.concatenate([silence, _tone(2.0), silence])
+    regions = detect_speech(audio)
+    assert len(regions) == 1
+    start, end = regions[0]
+    assert start <= 3 * SAMPLING_RATE < 5 * SAMPLING_RATE <= end
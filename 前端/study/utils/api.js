@@ -5,10 +5,11 @@ const BASE_URL = 'http://localhost:8000'
  * @param {string} file - 音频文件路径
  * @param {string} [scene] - 应用场景 ("课堂", "会议", "备忘录", "通用", "auto")
  * @param {string} [returnType='json'] - 返回类型 ('json' 或 'text')
- * @param {string} [language='zh'] - 音频语言 ('zh': 中文, 'en': 英文, 'ja': 日语, 'ko': 韩语)
+ * @param {string} [language='zh'] - 音频语言 ('zh': 中文, 'en': 英文, 'ja': 日语, 'ko': 韩语, 'auto': 自动检测)
+ * @param {string} [preset] - 解码预设 ('fast': 最快, 'balanced': 均衡, 'accurate': 最准确)，不传时使用服务端默认
  * @returns {Promise} 上传结果
  */
-export const transcribeAudio = (file, scene = null, returnType = 'json', language = 'zh') => {
+export const transcribeAudio = (file, scene = null, returnType = 'json', language = 'zh', preset = null) => {
     const formData = {
         file,
         return_type: returnType,
@@ -18,6 +19,10 @@ export const transcribeAudio = (file, scene = null, returnType = 'json', languag
     if (scene) {
         formData.scene = scene
     }
+
+    if (preset) {
+        formData.preset = preset
+    }
     
     return uni.uploadFile({
         url: `${BASE_URL}/api/v1/transcribe/`,
@@ -27,6 +32,21 @@ export const transcribeAudio = (file, scene = null, returnType = 'json', languag
     })
 }
 
+/**
+ * 服务端导出地址: 由已缓存的转录结果直接生成文件，不需要把完整结果传回服务端
+ * @param {string} cacheId - 转录响应中的 cache_id
+ * @param {string} format - 导出格式 ('srt', 'vtt', 'txt', 'docx')
+ * @param {string} [fileName] - 下载文件名 (不含扩展名)
+ * @returns {string} 下载地址
+ */
+export const exportUrl = (cacheId, format, fileName = '') => {
+    let url = `${BASE_URL}/api/v1/transcribe/${cacheId}/export?format=${format}`
+    if (fileName) {
+        url += `&filename=${encodeURIComponent(fileName)}`
+    }
+    return url
+}
+
 /**
  * 检查API服务是否可用
  * @returns {Promise} 检查结果